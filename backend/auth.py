@@ -1,3 +1,4 @@
+import env  # noqa: F401  (loads .env before the settings below are read)
 from datetime import datetime, timedelta
 from typing import Optional
 import os
@@ -0,0 +1,138 @@
+"""
+Conditional GET and compression on the polled read endpoints. For each endpoint
+and data scale, three kinds of request against the real app:
+  * full:   no validator, no compression (what every poll cost before);
+  * gzip:   no validator, Accept-Encoding: gzip;
+  * 304:    If-None-Match with the ETag from the previous response.
+Reported per kind: latency, bytes on the wire, and SQL statements and SQL time
+per request (from the metrics middleware's per-request DB stats).
+
+Like bench_endpoints.py, each scale runs in a fresh process pointed at a seeded
+database (cached in --data-dir).
+
+Run from backend/:
+    python benchmarks/bench_conditional_get.py [--scales 10000 100000] [--requests 30]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import latency_summary, print_table, write_results
+from bench_endpoints import ensure_dataset
+
+ENDPOINTS = (
+    ("therapist", "/analytics"),
+    ("therapist", "/appointments/all"),
+    ("therapist", "/notifications/therapist"),
+    ("user", "/notifications"),
+    ("user", "/dashboard/user/summary"),
+    ("user", "/dashboard/user/emotions"),
+    ("user", "/dashboard/user/therapists"),
+    ("user", "/appointments/{appointment_id}/messages"),
+)
+KINDS = ("full", "gzip", "304")
+
+
+def db_totals(registry) -> tuple:
+    return (registry.get_sample_value("db_queries_per_request_sum") or 0.0,
+            registry.get_sample_value("db_query_seconds_per_request_sum") or 0.0)
+
+
+def run_scale(requests: int, warmup: int) -> dict:
+    """Runs inside the per-scale process: DATABASE_URL is already set."""
+    from fastapi.testclient import TestClient
+    from prometheus_client import REGISTRY
+
+    from auth import create_access_token
+    from database import ReadSessionLocal
+    from models import Message
+    import main
+
+    db = ReadSessionLocal()
+    appointment_id = db.query(Message.appointment_id).first()[0]
+    db.close()
+    tokens = {
+        "user": create_access_token({"sub": "bench-user-0", "role": "user"}),
+        "therapist": create_access_token({"sub": "bench-therapist-0", "role": "therapist"}),
+    }
+    results = {}
+    with TestClient(main.app) as client:
+        for role, template in ENDPOINTS:
+            path = template.format(appointment_id=appointment_id)
+            auth = {"Authorization": f"Bearer {tokens[role]}"}
+            etag = client.get(path, headers=auth).headers["etag"]
+            results[template] = {}
+            for kind in KINDS:
+                headers = {**auth, "Accept-Encoding": "gzip" if kind == "gzip" else "identity"}
+                if kind == "304":
+                    headers["If-None-Match"] = etag
+                samples, wire_bytes = [], 0
+                for i in range(warmup + requests):
+                    queries, sql_seconds = db_totals(REGISTRY)
+                    started = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    elapsed = time.perf_counter() - started
+                    if response.status_code != (304 if kind == "304" else 200):
+                        raise RuntimeError(f"{path} ({kind}) returned {response.status_code}")
+                    if i == warmup:
+                        start_totals = (queries, sql_seconds)
+                    if i >= warmup:
+                        samples.append(elapsed)
+                        wire_bytes = response.num_bytes_downloaded
+                end_totals = db_totals(REGISTRY)
+                results[template][kind] = {
+                    **latency_summary(samples),
+                    "wire_bytes": wire_bytes,
+                    "queries_per_request": round((end_totals[0] - start_totals[0]) / requests, 1),
+                    "sql_ms_per_request": round((end_totals[1] - start_totals[1]) / requests * 1000, 3),
+                }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "neurosupport-bench"))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)  # internal: result file for one scale
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_scale(args.requests, args.warmup)
+        with open(args.worker, "w") as f:
+            json.dump(results, f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    all_results = {}
+    rows = []
+    for scale in args.scales:
+        db_path = ensure_dataset(args.data_dir, scale, args.seed)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+            result_file = out.name
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "LOG_LEVEL": "WARNING"}
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", result_file,
+             "--requests", str(args.requests), "--warmup", str(args.warmup)],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(result_file) as f:
+            all_results[str(scale)] = json.load(f)
+        os.remove(result_file)
+        for path, kinds in all_results[str(scale)].items():
+            rows += [{"rows": scale, "endpoint": path, "kind": kind, "p50_ms": s["p50_ms"], "bytes": s["wire_bytes"],
+                      "queries": s["queries_per_request"], "sql_ms": s["sql_ms_per_request"]}
+                     for kind, s in kinds.items()]
+
+    print_table(rows, ("rows", "endpoint", "kind", "p50_ms", "bytes", "queries", "sql_ms"))
+    write_results("conditional_get", {k: v for k, v in vars(args).items() if k != "worker"}, all_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+REST endpoint latency at several data scales: /analytics and /dashboard/user/*.
+For each scale a seeded database is generated (see datagen.py, cached in
+--data-dir) and the app is loaded in a fresh process pointed at it, so every
+scale starts cold and runs against its own engine.
+
+Run from backend/:
+    python benchmarks/bench_endpoints.py [--scales 10000 100000 1000000] [--requests 30]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import latency_summary, print_table, write_results
+
+ENDPOINTS = (
+    ("therapist", "/analytics"),
+    ("user", "/dashboard/user/summary"),
+    ("user", "/dashboard/user/emotions"),
+    ("user", "/dashboard/user/sessions"),
+    ("user", "/dashboard/user/therapists"),
+)
+
+
+def ensure_dataset(data_dir: str, scale: int, seed: int) -> str:
+    path = os.path.join(data_dir, f"bench-{scale}-seed{seed}.db")
+    if not os.path.exists(path):
+        from datagen import generate
+
+        started = time.perf_counter()
+        counts = generate(path, scale, seed)
+        print(f"generated {counts} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def run_scale(db_path: str, requests: int, warmup: int) -> dict:
+    """Runs inside the per-scale process: DATABASE_URL is already set."""
+    from fastapi.testclient import TestClient
+
+    from auth import create_access_token
+    import main
+
+    tokens = {
+        "user": create_access_token({"sub": "bench-user-0", "role": "user"}),
+        "therapist": create_access_token({"sub": "bench-therapist-0", "role": "therapist"}),
+    }
+    results = {}
+    with TestClient(main.app) as client:
+        for role, path in ENDPOINTS:
+            headers = {"Authorization": f"Bearer {tokens[role]}"}
+            samples = []
+            for i in range(warmup + requests):
+                started = time.perf_counter()
+                response = client.get(path, headers=headers)
+                elapsed = time.perf_counter() - started
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+                if i >= warmup:
+                    samples.append(elapsed)
+            results[path] = {**latency_summary(samples), "response_bytes": len(response.content)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "neurosupport-bench"))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)  # internal: result file for one scale
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_scale(os.environ["DATABASE_URL"], args.requests, args.warmup)
+        with open(args.worker, "w") as f:
+            json.dump(results, f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    all_results = {}
+    rows = []
+    for scale in args.scales:
+        db_path = ensure_dataset(args.data_dir, scale, args.seed)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+            result_file = out.name
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "LOG_LEVEL": "WARNING"}
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", result_file,
+             "--requests", str(args.requests), "--warmup", str(args.warmup)],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(result_file) as f:
+            all_results[str(scale)] = json.load(f)
+        os.remove(result_file)
+        rows += [{"rows": scale, "endpoint": path, **stats} for path, stats in all_results[str(scale)].items()]
+
+    print_table(rows, ("rows", "endpoint", "mean_ms", "p50_ms", "p95_ms", "max_ms"))
+    write_results("endpoints", {k: v for k, v in vars(args).items() if k != "worker"}, all_results)
+
+
+if __name__ == "__main__":
+    main()
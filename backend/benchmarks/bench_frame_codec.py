@@ -0,0 +1,65 @@
+"""
+Chat frame size and encode time per WebSocket encoding.
+Sizes are shown raw and after raw DEFLATE, which approximates what
+permessage-deflate puts on the wire (per frame, no context takeover).
+
+Run from backend/:  python benchmarks/bench_frame_codec.py [--iterations 20000]
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.frame_codec import CODECS
+
+SAMPLE_FRAMES = {
+    "message": {
+        "type": "message", "seq": 1842, "sender": "therapist",
+        "content": "That sounds really hard. What usually helps you wind down in the evening?",
+        "timestamp": datetime(2025, 3, 14, 18, 22, 7, 123456),
+    },
+    "ack": {
+        "type": "ack", "client_id": "c-1711", "message_id": "0b9f1c5e-8d1e-4c36-9a43-7a0f7f1d2c11",
+        "seq": 1843, "timestamp": datetime(2025, 3, 14, 18, 22, 9, 654321),
+    },
+    "ai_message": {
+        "type": "ai_message",
+        "content": "I'm here for you. Could you tell me a bit more about what's on your mind?",
+        "timestamp": datetime(2025, 3, 14, 18, 22, 11, 1),
+    },
+}
+
+
+def deflated_size(payload) -> int:
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    compressor = zlib.compressobj(wbits=-15)
+    return len(compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    if "msgpack" not in CODECS:
+        print("msgpack not installed - only JSON is measured")
+
+    print(f"{'frame':<12}{'encoding':<10}{'bytes':>7}{'deflated':>10}{'encode us':>11}")
+    for frame_name, frame in SAMPLE_FRAMES.items():
+        for codec in CODECS.values():
+            payload = codec.encode(frame)
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                codec.encode(frame)
+            per_frame_us = (time.perf_counter() - start) / args.iterations * 1e6
+            size = len(payload.encode("utf-8")) if isinstance(payload, str) else len(payload)
+            print(f"{frame_name:<12}{codec.name:<10}{size:>7}{deflated_size(payload):>10}{per_frame_us:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Emotion inference micro-batching: throughput and latency of InferenceServer
+driven by many concurrent chats, for several max batch sizes. Each chat sends
+--messages messages one after another (awaiting each result, like the chat loop).
+Needs an ONNX model (see services/emotion_model.py) and onnxruntime installed.
+
+Run from backend/:
+    python benchmarks/bench_inference.py --model-path emotion.onnx [--chats 64] [--batch-sizes 1 8 32]
+"""
+import argparse
+import asyncio
+import time
+
+from common import latency_summary, print_table, write_results
+
+from datagen import THERAPIST_LINES, USER_LINES
+from services.emotion_model import OnnxEmotionModel
+from services.inference_server import InferenceServer
+
+SAMPLE_TEXTS = USER_LINES + THERAPIST_LINES
+
+
+async def drive(server: InferenceServer, chats: int, messages: int) -> dict:
+    samples = []
+
+    async def chat(index: int):
+        for i in range(messages):
+            started = time.perf_counter()
+            await server.analyze(SAMPLE_TEXTS[(index + i) % len(SAMPLE_TEXTS)])
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(i) for i in range(chats)))
+    elapsed = time.perf_counter() - started
+    await server.stop()
+
+    stats = server.stats()
+    batches = sum(s["batches"] for s in stats["by_batch_size"].values())
+    return {
+        **latency_summary(samples),
+        "messages_per_second": round(len(samples) / elapsed, 1),
+        "mean_batch_size": round(len(samples) / batches, 1) if batches else 0,
+        "fallbacks": sum(stats["fallbacks"].values()),
+        "by_batch_size": stats["by_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", required=True)
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    model = OnnxEmotionModel(args.model_path)
+    results = {}
+    for batch_size in args.batch_sizes:
+        # Generous timeout: measure the model, not the fallback
+        server = InferenceServer(model, batch_size, args.max_wait_ms, args.workers, timeout_ms=60000)
+        results[str(batch_size)] = asyncio.run(drive(server, args.chats, args.messages))
+
+    print_table([{"max_batch": size, **r} for size, r in results.items()],
+                ("max_batch", "messages_per_second", "mean_batch_size", "mean_ms", "p50_ms", "p99_ms", "fallbacks"))
+    write_results("inference", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
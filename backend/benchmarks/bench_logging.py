@@ -0,0 +1,73 @@
+"""
+Per-message logging cost in the AI chat loop: the old print() calls against the
+queue-backed structured logger (logging_config.py) with per-message debug
+events disabled, sampled, and fully enabled. Output goes to /dev/null so only
+the caller-side cost is measured, which is what the event loop pays.
+
+Run from backend/:  python benchmarks/bench_logging.py [--messages 50000]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_config
+from logging_config import configure_logging, get_logger, sampled, stop_logging
+
+SESSION_ID = "5b0c1d7e-1c1f-4a49-9a0e-0d1f6c1e8a21"
+USER_MESSAGE = "I have been feeling really anxious about work lately and can't sleep"
+AI_RESPONSE = "That sounds exhausting. What does a typical evening look like for you right now?"
+
+
+def old_prints(out):
+    # What ai_chatbot_websocket printed per message before
+    print(f"[WEBSOCKET] Received message from Ann: {USER_MESSAGE[:50]}...", file=out)
+    print(f"[WEBSOCKET] Generating AI response for session {SESSION_ID}", file=out)
+    print(f"[WEBSOCKET] AI response sent: {AI_RESPONSE[:50]}...", file=out)
+
+
+def structured(logger, rate):
+    if sampled(logger, rate):
+        logger.debug("ai_chat.message_received", extra={"session_id": SESSION_ID, "length": len(USER_MESSAGE)})
+    if sampled(logger, rate):
+        logger.debug("ai_chat.response_sent", extra={"session_id": SESSION_ID, "length": len(AI_RESPONSE)})
+
+
+def per_message_us(fn, messages: int) -> float:
+    start = time.perf_counter()
+    for _ in range(messages):
+        fn()
+    return (time.perf_counter() - start) / messages * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+    n = args.messages
+
+    devnull = open(os.devnull, "w")
+    logging_config.LOG_QUEUE_SIZE = n * 2 + 10
+    configure_logging(level="DEBUG", stream=devnull)
+    logger = get_logger("bench")
+    root = logging.getLogger(logging_config.ROOT_LOGGER)
+
+    results = {"print() x3 (before)": per_message_us(lambda: old_prints(devnull), n)}
+    root.setLevel(logging.INFO)
+    results["logger, debug disabled"] = per_message_us(lambda: structured(logger, 1.0), n)
+    root.setLevel(logging.DEBUG)
+    results["logger, debug sampled 1%"] = per_message_us(lambda: structured(logger, 0.01), n)
+    results["logger, debug 100%"] = per_message_us(lambda: structured(logger, 1.0), n)
+    stop_logging()
+    devnull.close()
+
+    print(f"{'per message':<28}{'us':>8}")
+    for name, us in results.items():
+        print(f"{name:<28}{us:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Appointment chat write throughput: one commit per message vs group commit.
+Simulates N concurrent chats, each sending messages back-to-back (a sender only
+sends its next message after the previous one is acknowledged).
+
+Run from backend/:  python benchmarks/bench_message_writer.py [--messages 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, configure_sqlite
+from models import Appointment, Message, EmotionAnalysis
+from services.emotion_analysis import analyze
+from services.chat_shards import ChatShard, ChatShards
+from services.db_writer import DatabaseWriter
+from services.message_writer import MessageWriter
+
+CONCURRENCY = (1, 50, 500)
+
+
+def make_engine(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    configure_sqlite(engine)
+    return engine
+
+
+def seed_appointments(engine, count: int):
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    db.add_all(Appointment(id=i, user_name=f"user-{n}", status="active", created_from="manual") for n, i in enumerate(ids))
+    db.commit()
+    db.close()
+    return ids
+
+
+def build_pair(appointment_id: str, content: str):
+    message = Message(
+        id=str(uuid.uuid4()), appointment_id=appointment_id, sender="user",
+        content=content, timestamp=datetime.utcnow(),
+    )
+    label, confidence, risk_level, risk_score, version = analyze(content)
+    emotion = EmotionAnalysis(
+        analysis_id=str(uuid.uuid4()), message_id=message.id, emotion_label=label,
+        confidence_score=confidence, risk_level=risk_level, risk_score=risk_score,
+        model_version=version, analyzed_at=datetime.utcnow(),
+    )
+    return message, emotion
+
+
+async def run_per_message(engine, appointment_ids, per_chat: int):
+    """Baseline: what appointment_chat_websocket used to do, commit inline per message."""
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    async def chat(appointment_id):
+        db = Session()
+        try:
+            for n in range(per_chat):
+                message, emotion = build_pair(appointment_id, f"I feel stressed today {n}")
+                db.add(message)
+                db.add(emotion)
+                db.commit()
+                await asyncio.sleep(0)
+        finally:
+            db.close()
+
+    await asyncio.gather(*(chat(a) for a in appointment_ids))
+
+
+async def run_group_commit(engine, appointment_ids, per_chat: int):
+    db_writer = DatabaseWriter(engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    writer = MessageWriter(ChatShards([ChatShard(0, str(engine.url), db_writer, sessions, sessions)]))
+
+    async def chat(appointment_id):
+        for n in range(per_chat):
+            message, emotion = build_pair(appointment_id, f"I feel stressed today {n}")
+            await writer.submit(message, emotion)
+
+    await asyncio.gather(*(chat(a) for a in appointment_ids))
+    await writer.stop()
+    db_writer.stop()
+
+
+def measure(mode, runner, chats: int, total_messages: int) -> dict:
+    per_chat = max(1, total_messages // chats)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"))
+        Base.metadata.create_all(bind=engine)
+        appointment_ids = seed_appointments(engine, chats)
+        start = time.perf_counter()
+        asyncio.run(runner(engine, appointment_ids, per_chat))
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    sent = per_chat * chats
+    return {"mode": mode, "chats": chats, "messages": sent, "seconds": round(elapsed, 3),
+            "messages_per_second": round(sent / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000, help="total messages per run")
+    args = parser.parse_args()
+
+    print(f"{'mode':<14}{'chats':>7}{'messages':>10}{'msg/s':>12}")
+    for chats in CONCURRENCY:
+        for mode, runner in (("per-message", run_per_message), ("group-commit", run_group_commit)):
+            r = measure(mode, runner, chats, args.messages)
+            print(f"{r['mode']:<14}{r['chats']:>7}{r['messages']:>10}{r['messages_per_second']:>12}")
+
+
+if __name__ == "__main__":
+    main()
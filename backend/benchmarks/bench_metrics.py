@@ -0,0 +1,71 @@
+"""
+Per-event cost of the metrics instrumentation (services/metrics.py).
+Measures each kind of hot-path event against a bare loop, plus the
+cost the engine event hooks add to a trivial SQLite query.
+
+Run from backend/:  python benchmarks/bench_metrics.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from services.metrics import (
+    ANALYZE_SECONDS, GROQ_ERRORS, HTTP_REQUEST_SECONDS, RequestDbStats,
+    _request_db_stats, instrument_engine,
+)
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    baseline = per_call_us(lambda: None, n)
+    child = HTTP_REQUEST_SECONDS.labels("GET", "/bench", "200")
+
+    def timed_observe():
+        started = time.perf_counter()
+        ANALYZE_SECONDS.observe(time.perf_counter() - started)
+
+    events = {
+        "counter.inc()": GROQ_ERRORS.inc,
+        "histogram.observe()": lambda: ANALYZE_SECONDS.observe(0.0012),
+        "perf_counter + observe": timed_observe,
+        "labels().observe()": lambda: HTTP_REQUEST_SECONDS.labels("GET", "/bench", "200").observe(0.0012),
+        "cached child.observe()": lambda: child.observe(0.0012),
+    }
+    print(f"{'event':<26}{'us/event':>10}")
+    for name, fn in events.items():
+        print(f"{name:<26}{per_call_us(fn, n) - baseline:>10.3f}")
+
+    # Engine hooks: same query with and without instrumentation
+    queries = max(n // 10, 1000)
+    plain = create_engine("sqlite://")
+    hooked = create_engine("sqlite://")
+    instrument_engine(hooked)
+    _request_db_stats.set(RequestDbStats())
+    results = {}
+    for label, engine in (("plain", plain), ("instrumented", hooked)):
+        with engine.connect() as conn:
+            stmt = text("SELECT 1")
+            conn.execute(stmt)
+            results[label] = min(per_call_us(lambda: conn.execute(stmt), queries) for _ in range(5))
+    print(f"{'db query hooks':<26}{results['instrumented'] - results['plain']:>10.3f}"
+          f"   (SELECT 1: {results['plain']:.2f} us plain, {results['instrumented']:.2f} us instrumented)")
+
+
+if __name__ == "__main__":
+    main()
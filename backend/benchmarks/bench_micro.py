@@ -0,0 +1,53 @@
+"""
+Microbenchmarks for emotion analysis and auth primitives.
+
+Run from backend/:  python benchmarks/bench_micro.py [--iterations 20000]
+"""
+import argparse
+import time
+
+from common import latency_summary, print_table, write_results
+
+from auth import create_access_token, get_password_hash, verify_password, verify_token
+from datagen import THERAPIST_LINES, USER_LINES
+from services.emotion_analysis import analyze, analyze_batch
+
+SAMPLE_TEXTS = USER_LINES + THERAPIST_LINES
+
+
+def timed(fn, iterations: int) -> dict:
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--bcrypt-iterations", type=int, default=20)
+    args = parser.parse_args()
+    n = args.iterations
+
+    batch = list(SAMPLE_TEXTS) * 8
+    password_hash = get_password_hash("bench-password")
+    token = create_access_token({"sub": "bench-user-0", "role": "user"})
+
+    results = {
+        "analyze": timed(lambda i: analyze(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]), n),
+        f"analyze_batch[{len(batch)}]": timed(lambda i: analyze_batch(batch), max(n // len(batch), 10)),
+        "create_access_token": timed(lambda i: create_access_token({"sub": "bench-user-0", "role": "user"}), n),
+        "verify_token": timed(lambda i: verify_token(token), n),
+        "get_password_hash": timed(lambda i: get_password_hash("bench-password"), args.bcrypt_iterations),
+        "verify_password": timed(lambda i: verify_password("bench-password", password_hash), args.bcrypt_iterations),
+    }
+
+    print_table([{"operation": name, **stats} for name, stats in results.items()],
+                ("operation", "count", "mean_ms", "p50_ms", "p99_ms"))
+    write_results("micro", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Mixed read/write load against SQLite: the old shared engine (rollback journal,
+every handler commits on its own pooled connection) vs the single writer
+(services/db_writer.py: one write connection, batched transactions) plus a
+read-only WAL connection pool.
+
+Writer threads cycle through the server's write kinds (chat message + analysis,
+notification, appointment status flip, session note save); reader threads
+cycle through GET-style queries (notification list, appointment transcript,
+per-user risk histogram). Both run concurrently for --seconds per mode on a
+copy of the same seeded database.
+
+Run from backend/:
+    python benchmarks/bench_mixed_load.py [--writers 8] [--readers 8] [--seconds 10]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from common import latency_summary, print_table, write_results
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import configure_sqlite
+from datagen import USER_LINES, generate
+from models import Appointment, EmotionAnalysis, Message, Notification, SessionNote
+from services.db_writer import DatabaseWriter
+from services.emotion_analysis import analyze
+
+MODES = ("shared", "single-writer")
+
+
+# -- operations --------------------------------------------------------------
+
+def write_chat(db, rng, appointment_ids, user_ids):
+    appointment_id = rng.choice(appointment_ids)
+    content = rng.choice(USER_LINES)
+    seq = (db.query(func.max(Message.seq)).filter(Message.appointment_id == appointment_id).scalar() or 0) + 1
+    message = Message(id=str(uuid.uuid4()), appointment_id=appointment_id, seq=seq, sender="user",
+                      content=content, timestamp=datetime.utcnow())
+    label, confidence, risk_level, risk_score, version = analyze(content)
+    db.add(message)
+    db.add(EmotionAnalysis(analysis_id=str(uuid.uuid4()), message_id=message.id, emotion_label=label,
+                           confidence_score=confidence, risk_level=risk_level, risk_score=risk_score,
+                           model_version=version, analyzed_at=datetime.utcnow()))
+
+
+def write_notification(db, rng, appointment_ids, user_ids):
+    db.add(Notification(id=str(uuid.uuid4()), recipient_role="user", recipient_id=rng.choice(user_ids),
+                        recipient_name="Bench User", title="Therapist Joined", message="Your therapist has joined"))
+
+
+def write_status(db, rng, appointment_ids, user_ids):
+    db.query(Appointment).filter(Appointment.id == rng.choice(appointment_ids)).update(
+        {Appointment.status: rng.choice(("scheduled", "active"))}, synchronize_session=False
+    )
+
+
+def write_note(db, rng, appointment_ids, user_ids):
+    appointment_id = rng.choice(appointment_ids)
+    note = db.query(SessionNote).filter(SessionNote.appointment_id == appointment_id).first()
+    if note is None:
+        db.add(SessionNote(id=str(uuid.uuid4()), appointment_id=appointment_id, therapist_name="Dr Bench 0",
+                           notes="Discussed coping strategies."))
+    else:
+        note.notes = "Discussed coping strategies; follow up next week."
+        note.updated_at = datetime.utcnow()
+
+
+def read_notifications(db, rng, appointment_ids, user_ids):
+    db.query(Notification).filter(
+        Notification.recipient_role == "user", Notification.recipient_id == rng.choice(user_ids)
+    ).order_by(Notification.created_at.desc()).all()
+
+
+def read_transcript(db, rng, appointment_ids, user_ids):
+    db.query(Message).filter(Message.appointment_id == rng.choice(appointment_ids)).order_by(Message.seq).all()
+
+
+def read_risk_histogram(db, rng, appointment_ids, user_ids):
+    db.query(EmotionAnalysis.risk_level, func.count(EmotionAnalysis.analysis_id)).join(
+        Message, Message.id == EmotionAnalysis.message_id
+    ).join(Appointment, Appointment.id == Message.appointment_id).filter(
+        Appointment.user_id == rng.choice(user_ids), Message.sender == "user"
+    ).group_by(EmotionAnalysis.risk_level).all()
+
+
+WRITES = (write_chat, write_notification, write_status, write_note)
+READS = (read_notifications, read_transcript, read_risk_histogram)
+
+
+# -- modes ---------------------------------------------------------------------
+
+class SharedEngine:
+    """Before: one engine for everything, each write commits on its own connection."""
+
+    def __init__(self, path: str):
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                                    pool_size=20, max_overflow=20)
+
+        @event.listens_for(self.engine, "connect")
+        def _pragmas(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+            dbapi_connection.execute("PRAGMA journal_mode=DELETE")
+
+        self.sessions = sessionmaker(bind=self.engine, autoflush=False)
+
+    def write(self, op, *args):
+        db = self.sessions()
+        try:
+            op(db, *args)
+            db.commit()
+        finally:
+            db.close()
+
+    def read(self, op, *args):
+        db = self.sessions()
+        try:
+            op(db, *args)
+        finally:
+            db.close()
+
+    def close(self):
+        self.engine.dispose()
+
+
+class SingleWriter:
+    """After: write units queued to the single writer, reads on query_only WAL connections."""
+
+    def __init__(self, path: str):
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                                    pool_size=1, max_overflow=0)
+        configure_sqlite(self.engine)
+        self.read_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                                         pool_size=20, max_overflow=20)
+        configure_sqlite(self.read_engine, read_only=True)
+        self.writer = DatabaseWriter(self.engine)
+        self.sessions = sessionmaker(bind=self.read_engine, autoflush=False)
+
+    def write(self, op, *args):
+        self.writer.run(lambda db: op(db, *args))
+
+    def read(self, op, *args):
+        db = self.sessions()
+        try:
+            op(db, *args)
+        finally:
+            db.close()
+
+    def close(self):
+        self.writer.stop()
+        self.engine.dispose()
+        self.read_engine.dispose()
+
+
+def make_workers(target, ops, kind: str, workers: int, seconds: float, seed: int, appointment_ids, user_ids) -> tuple:
+    # "database is locked" timeouts, and any other failure by exception type
+    samples, errors = [], {"locked": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        call = target.write if kind == "write" else target.read
+        local, n = [], index
+        while time.perf_counter() < deadline:
+            op = ops[n % len(ops)]
+            n += 1
+            started = time.perf_counter()
+            try:
+                call(op, rng, appointment_ids, user_ids)
+                local.append(time.perf_counter() - started)
+            except Exception as e:
+                key = "locked" if isinstance(e, OperationalError) and "locked" in str(e) else type(e).__name__
+                with lock:
+                    errors[key] = errors.get(key, 0) + 1
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    return threads, samples, errors
+
+
+def run_mode(mode: str, source: str, tmp: str, args) -> dict:
+    path = os.path.join(tmp, f"{mode}.db")
+    shutil.copyfile(source, path)
+    target = SharedEngine(path) if mode == "shared" else SingleWriter(path)
+    try:
+        db = target.sessions()
+        appointment_ids = [row.id for row in db.query(Appointment.id).order_by(Appointment.id).limit(500)]
+        user_ids = sorted({row.user_id for row in db.query(Appointment.user_id).limit(2000)})
+        db.close()
+
+        write_threads, write_samples, write_errors = make_workers(
+            target, WRITES, "write", args.writers, args.seconds, args.seed, appointment_ids, user_ids)
+        read_threads, read_samples, read_errors = make_workers(
+            target, READS, "read", args.readers, args.seconds, args.seed + 1, appointment_ids, user_ids)
+        started = time.perf_counter()
+        for thread in write_threads + read_threads:
+            thread.start()
+        for thread in write_threads + read_threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        target.close()
+
+    result = {
+        "writes": {**latency_summary(write_samples), "per_second": round(len(write_samples) / elapsed, 1),
+                   "errors": write_errors},
+        "reads": {**latency_summary(read_samples), "per_second": round(len(read_samples) / elapsed, 1),
+                  "errors": read_errors},
+    }
+    if mode == "single-writer":
+        result["writer"] = target.writer.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50000, help="seeded dataset size")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "seed.db")
+        generate(source, args.messages, args.seed)
+        for mode in MODES:
+            results[mode] = run_mode(mode, source, tmp, args)
+
+    rows = []
+    for mode, r in results.items():
+        for kind in ("writes", "reads"):
+            s = r[kind]
+            rows.append({"mode": mode, "kind": kind, "per_second": s["per_second"], "p50_ms": s.get("p50_ms"),
+                         "p99_ms": s.get("p99_ms"), "max_ms": s.get("max_ms"),
+                         "locked": s["errors"]["locked"],
+                         "other_errors": sum(n for key, n in s["errors"].items() if key != "locked")})
+    print_table(rows, ("mode", "kind", "per_second", "p50_ms", "p99_ms", "max_ms", "locked", "other_errors"))
+    write_results("mixed_load", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
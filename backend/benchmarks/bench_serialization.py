@@ -0,0 +1,134 @@
+"""
+List endpoint serialization: 10k-row responses for appointments, messages and
+notifications, served two ways by the same FastAPI app on the same database:
+  * orm:  ORM objects through `response_model=List[...]` (Pydantic validation of
+          every row with from_attributes, then FastAPI's JSON encoding);
+  * fast: the schema's columns selected as tuples and encoded with orjson
+          (services/fast_json.py), as the list endpoints in main.py do.
+Both bodies are checked to decode to the same JSON before timing.
+
+Run from backend/:
+    python benchmarks/bench_serialization.py [--rows 10000] [--requests 30]
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from common import latency_summary, print_table, write_results
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, configure_sqlite
+from models import Appointment, Message, Notification, User
+from schemas import AppointmentResponse, MessageResponse, NotificationResponse
+from services import fast_json
+from services.fast_json import rows_response, schema_columns
+
+KINDS = (
+    ("appointments", Appointment, AppointmentResponse, Appointment.created_at.desc()),
+    ("messages", Message, MessageResponse, Message.timestamp),
+    ("notifications", Notification, NotificationResponse, Notification.created_at.desc()),
+)
+
+
+def seed(sessions, rows: int):
+    db = sessions()
+    started = datetime(2024, 1, 1)
+    appointment_ids = [str(uuid.uuid4()) for _ in range(rows)]
+    db.add(User(id="bench-user-0", username="bench-user-0", email="bench-user-0@example.com",
+                password_hash="x", full_name="Bench User"))
+    db.flush()
+    db.bulk_insert_mappings(Appointment, [
+        {"id": a, "user_id": "bench-user-0", "user_name": "Bench User", "therapist_name": "Dr Bench",
+         "status": "completed", "created_from": "manual", "created_at": started + timedelta(seconds=i)}
+        for i, a in enumerate(appointment_ids)
+    ])
+    db.bulk_insert_mappings(Message, [
+        {"id": str(uuid.uuid4()), "appointment_id": appointment_ids[0], "seq": i + 1,
+         "sender": "user" if i % 2 == 0 else "therapist", "content": f"Message {i}: how has your week been?",
+         "timestamp": started + timedelta(seconds=i, microseconds=i)}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(Notification, [
+        {"id": str(uuid.uuid4()), "recipient_role": "user", "recipient_id": "bench-user-0",
+         "recipient_name": "Bench User", "title": "Therapist Joined", "message": "Your therapist has joined",
+         "is_read": i % 3 == 0, "created_at": started + timedelta(seconds=i)}
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def build_app(sessions) -> FastAPI:
+    app = FastAPI()
+
+    def add_routes(name, model, schema, order):
+        @app.get(f"/orm/{name}", response_model=List[schema])
+        def orm_route():
+            db = sessions()
+            try:
+                return db.query(model).order_by(order).all()
+            finally:
+                db.close()
+
+        @app.get(f"/fast/{name}", response_model=List[schema])
+        def fast_route():
+            db = sessions()
+            try:
+                return rows_response(db.query(*schema_columns(model, schema)).order_by(order).all(), schema)
+            finally:
+                db.close()
+
+    for kind in KINDS:
+        add_routes(*kind)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        configure_sqlite(engine)
+        Base.metadata.create_all(bind=engine)
+        sessions = sessionmaker(bind=engine)
+        seed(sessions, args.rows)
+
+        with TestClient(build_app(sessions)) as client:
+            for name, *_ in KINDS:
+                bodies = {path: client.get(f"/{path}/{name}") for path in ("orm", "fast")}
+                if bodies["orm"].json() != bodies["fast"].json():
+                    raise RuntimeError(f"{name}: fast path response differs from the ORM path")
+                results[name] = {}
+                for path in ("orm", "fast"):
+                    samples = []
+                    for i in range(args.warmup + args.requests):
+                        started = time.perf_counter()
+                        response = client.get(f"/{path}/{name}")
+                        if i >= args.warmup:
+                            samples.append(time.perf_counter() - started)
+                    results[name][path] = {**latency_summary(samples), "response_bytes": len(response.content)}
+        engine.dispose()
+
+    print_table([
+        {"endpoint": name, "orm_p50_ms": r["orm"]["p50_ms"], "fast_p50_ms": r["fast"]["p50_ms"],
+         "speedup": round(r["orm"]["p50_ms"] / r["fast"]["p50_ms"], 1), "bytes": r["fast"]["response_bytes"]}
+        for name, r in results.items()
+    ], ("endpoint", "orm_p50_ms", "fast_p50_ms", "speedup", "bytes"))
+    write_results("serialization", {**vars(args), "orjson": fast_json.orjson is not None}, results)
+
+
+if __name__ == "__main__":
+    main()
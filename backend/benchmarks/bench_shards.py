@@ -0,0 +1,145 @@
+"""
+Chat sharding scale-out: the same seeded database rebalanced into 1, 2, 4 and 8
+chat shards (services/chat_shards.py), then measured for
+  * chat write throughput: --chats concurrent chats sending back-to-back through
+    the group-commit MessageWriter, which splits each batch by shard and commits
+    the parts on the shards' writers in parallel;
+  * dashboard scatter-gather: user_session_stats() over a user's appointments,
+    aggregated on every shard in parallel (p50 / p99 over --repeats);
+  * the rebalance from the unsharded seed itself.
+
+Run from backend/:
+    python benchmarks/bench_shards.py [--messages 100000] [--chats 64] [--shards 1 2 4 8]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from common import latency_summary, print_table, write_results
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from database import configure_sqlite
+from datagen import generate
+from models import Appointment, EmotionAnalysis, Message
+from services.chat_shards import ChatShard, ChatShards, open_shard, rebalance
+from services.db_writer import DatabaseWriter
+from services.emotion_analysis import analyze
+from services.message_writer import MessageWriter
+from services.session_summary import user_session_stats
+
+CONTENT = "I have been feeling anxious about work lately"
+
+
+def primary_as_shard(url: str) -> ChatShards:
+    """The unsharded seed database seen as a single chat shard (the rebalance source)."""
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0)
+    configure_sqlite(engine)
+    read_engine = create_engine(url, connect_args={"check_same_thread": False})
+    configure_sqlite(read_engine, read_only=True)
+    return ChatShards([ChatShard(0, url, DatabaseWriter(engine), sessionmaker(bind=engine),
+                                 sessionmaker(bind=read_engine))])
+
+
+async def write_load(shards: ChatShards, appointment_ids, per_chat: int) -> float:
+    writer = MessageWriter(shards)
+    label, confidence, risk_level, risk_score, version = analyze(CONTENT)
+
+    async def chat(appointment_id):
+        for _ in range(per_chat):
+            message = Message(id=str(uuid.uuid4()), appointment_id=appointment_id, sender="user",
+                              content=CONTENT, timestamp=datetime.utcnow())
+            emotion = EmotionAnalysis(analysis_id=str(uuid.uuid4()), message_id=message.id, emotion_label=label,
+                                      confidence_score=confidence, risk_level=risk_level, risk_score=risk_score,
+                                      model_version=version, analyzed_at=datetime.utcnow())
+            await writer.submit(message, emotion)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(a) for a in appointment_ids))
+    await writer.stop()
+    return time.perf_counter() - started
+
+
+def run_shards(count: int, seed_path: str, tmp: str, args) -> dict:
+    workdir = os.path.join(tmp, f"shards-{count}")
+    os.makedirs(workdir)
+    primary_path = os.path.join(workdir, "primary.db")
+    shutil.copyfile(seed_path, primary_path)
+    primary_url = f"sqlite:///{primary_path}"
+
+    source = primary_as_shard(primary_url)
+    target = ChatShards([open_shard(i, f"sqlite:///{os.path.join(workdir, f'chat-{i}.db')}", primary_url)
+                         for i in range(count)])
+    started = time.perf_counter()
+    moved = rebalance(source, target)["moved"]
+    rebalance_seconds = time.perf_counter() - started
+
+    db = source.shards[0].read_session_factory()
+    try:
+        appointment_ids = [row.id for row in db.query(Appointment.id).order_by(Appointment.id).limit(args.chats)]
+        user_id = db.query(Appointment.user_id).group_by(Appointment.user_id).order_by(
+            func.count(Appointment.id).desc()).first()[0]
+        user_appointments = [row.id for row in db.query(Appointment.id).filter(Appointment.user_id == user_id)]
+
+        per_chat = max(1, args.writes // len(appointment_ids))
+        elapsed = asyncio.run(write_load(target, appointment_ids, per_chat))
+        writes = per_chat * len(appointment_ids)
+
+        samples = []
+        for _ in range(args.repeats):
+            t = time.perf_counter()
+            user_session_stats(db, user_appointments, target)
+            samples.append(time.perf_counter() - t)
+    finally:
+        db.close()
+        target.stop()
+        source.stop()
+
+    return {
+        "shards": count,
+        "rebalance": {"seconds": round(rebalance_seconds, 3), **moved},
+        "writes": {"messages": writes, "seconds": round(elapsed, 3),
+                   "per_second": round(writes / elapsed, 1),
+                   "mean_batch_size": [shard.writer.stats()["mean_batch_size"] for shard in target.shards]},
+        "dashboard": {"appointments": len(user_appointments), **latency_summary(samples)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000, help="seeded dataset size")
+    parser.add_argument("--users", type=int, default=20, help="fewer users = more appointments per dashboard")
+    parser.add_argument("--chats", type=int, default=64, help="concurrent chats in the write test")
+    parser.add_argument("--writes", type=int, default=5000, help="messages written per shard count")
+    parser.add_argument("--repeats", type=int, default=30, help="dashboard aggregations per shard count")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dir", default=None, help="where to put the databases (default: system temp dir)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        seed_path = os.path.join(tmp, "seed.db")
+        generate(seed_path, args.messages, args.seed, users=args.users)
+        for count in args.shards:
+            results.append(run_shards(count, seed_path, tmp, args))
+
+    base = results[0]["writes"]["per_second"]
+    print_table([
+        {"shards": r["shards"], "writes_per_s": r["writes"]["per_second"],
+         "speedup": round(r["writes"]["per_second"] / base, 2),
+         "dashboard_p50_ms": r["dashboard"].get("p50_ms"), "dashboard_p99_ms": r["dashboard"].get("p99_ms"),
+         "rebalance_s": r["rebalance"]["seconds"]}
+        for r in results
+    ], ("shards", "writes_per_s", "speedup", "dashboard_p50_ms", "dashboard_p99_ms", "rebalance_s"))
+    write_results("shards", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
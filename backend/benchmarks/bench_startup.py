@@ -0,0 +1,112 @@
+"""
+Cold start: every run is a fresh Python process that imports main and serves
+its first requests through the app's lifespan. Reported per run:
+  * import_ms:         `import main` (module imports and whatever runs at import);
+  * first_request_ms:  from the start of the import to the first response of GET /
+                       (includes startup: migrations, background services);
+  * ready_ms:          from the start of the import until /health/ready answers 200
+                       (emotion model and Groq client warmed up); not measured on
+                       trees without the endpoint;
+  * process_ms:        the whole process, interpreter start to exit.
+Two databases: "fresh" (an empty file each run, so the schema is created) and
+"existing" (already migrated, the usual restart). GROQ_API_KEY is set to a dummy
+value so the Groq client is created as in production; no request is sent to it.
+
+To compare with another checkout (e.g. the commit before a change):
+    git worktree add /tmp/neurosupport-base HEAD~1
+    python benchmarks/bench_startup.py --app-dir /tmp/neurosupport-base/backend
+
+Run from backend/:
+    python benchmarks/bench_startup.py [--runs 10] [--app-dir DIR]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, latency_summary, print_table, write_results
+
+DATABASES = ("fresh", "existing")
+HEAVY_MODULES = ("groq", "onnxruntime", "numpy", "pyarrow")
+
+
+def run_once(app_dir: str, out: str):
+    """Runs inside the per-run process: DATABASE_URL is already set."""
+    # The test client's own imports (httpx) are harness cost, not the app's: load them first
+    from fastapi.testclient import TestClient
+
+    sys.path.insert(0, app_dir)
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    result = {"import_ms": (imported - started) * 1000, "loaded_at_import": loaded}
+    with TestClient(main.app) as client:
+        if client.get("/").status_code != 200:
+            raise RuntimeError("GET / failed")
+        result["first_request_ms"] = (time.perf_counter() - started) * 1000
+        if client.get("/health/ready").status_code != 404:
+            while client.get("/health/ready").status_code != 200:
+                time.sleep(0.005)
+            result["ready_ms"] = (time.perf_counter() - started) * 1000
+    with open(out, "w") as f:
+        json.dump(result, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="backend/ directory of the tree to measure")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)  # internal: result file for one run
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    if args.worker:
+        run_once(app_dir, args.worker)
+        return
+
+    results = {}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        existing = os.path.join(tmp, "existing.db")
+        for database in DATABASES:
+            runs = []
+            # One untimed run: creates the "existing" database and warms the OS file cache
+            for i in range(args.runs + 1):
+                db_path = existing if database == "existing" else os.path.join(tmp, f"fresh-{i}.db")
+                out = os.path.join(tmp, f"{database}-{i}.json")
+                env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "LOG_LEVEL": "WARNING",
+                       "GROQ_API_KEY": "bench-dummy-key", "CHAT_SHARDS": "0"}
+                started = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", out, "--app-dir", app_dir],
+                    env=env, cwd=tmp, check=True, stdout=subprocess.DEVNULL,
+                )
+                elapsed = time.perf_counter() - started
+                if i == 0:
+                    continue
+                with open(out) as f:
+                    runs.append({**json.load(f), "process_ms": elapsed * 1000})
+
+            summary = {"loaded_at_import": runs[0]["loaded_at_import"]}
+            for metric in ("import_ms", "first_request_ms", "ready_ms", "process_ms"):
+                if metric in runs[0]:
+                    summary[metric] = latency_summary([run[metric] / 1000 for run in runs])
+            results[database] = summary
+            rows.append({
+                "database": database,
+                **{metric: summary[metric]["p50_ms"] if metric in summary else "-"
+                   for metric in ("import_ms", "first_request_ms", "ready_ms", "process_ms")},
+                "heavy_at_import": ",".join(summary["loaded_at_import"]) or "-",
+            })
+
+    print_table(rows, ("database", "import_ms", "first_request_ms", "ready_ms", "process_ms", "heavy_at_import"))
+    write_results("startup", {"runs": args.runs, "app_dir": app_dir}, results)
+
+
+if __name__ == "__main__":
+    main()
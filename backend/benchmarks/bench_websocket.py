@@ -0,0 +1,168 @@
+"""
+WebSocket load driver for /ws/appointment-chat and /ws/ai-chat.
+Starts the app under uvicorn on a local port against a fresh seeded database
+and drives it with real WebSocket clients. The Groq client is replaced by a
+stub that sleeps --groq-latency-ms and returns a fixed reply, so the run is
+offline and repeatable.
+
+- appointment chat: --chats appointments, each with a user and a therapist
+  socket; the user sends --messages messages and relay latency is measured
+  from send until the therapist receives the frame.
+- AI chat: --ai-sessions sessions each send --messages messages; latency is
+  send -> ai_message reply.
+
+Run from backend/:
+    python benchmarks/bench_websocket.py [--chats 50] [--ai-sessions 10] [--messages 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from common import latency_summary, print_table, write_results
+
+BENCH_DB = os.path.join(tempfile.gettempdir(), "neurosupport-bench-ws.db")
+
+
+class StubCompletions:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)  # the real client is synchronous too
+        message = type("Message", (), {"content": "Thanks for sharing. How does that usually make you feel?"})
+        return type("Completion", (), {"choices": [type("Choice", (), {"message": message})]})
+
+
+class StubGroq:
+    def __init__(self, latency: float):
+        self.chat = type("Chat", (), {"completions": StubCompletions(latency)})()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def appointment_chat(base: str, appointment_id: str, messages: int, samples: list):
+    import websockets
+
+    url = f"{base}/ws/appointment-chat/{appointment_id}"
+    async with websockets.connect(f"{url}?role=therapist") as therapist, \
+            websockets.connect(f"{url}?role=user") as user:
+        sent_at = {}
+
+        async def receive_all():
+            received = 0
+            while received < messages:
+                frame = json.loads(await therapist.recv())
+                if frame.get("type") == "message" and frame["sender"] == "user":
+                    samples.append(time.perf_counter() - sent_at.pop(frame["content"]))
+                    received += 1
+
+        receiver = asyncio.create_task(receive_all())
+        for i in range(messages):
+            content = f"{appointment_id[:8]} message {i}: I feel anxious about tomorrow"
+            sent_at[content] = time.perf_counter()
+            await user.send(json.dumps({"content": content, "client_id": str(i)}))
+            # Wait for the durable ack before the next message, like the frontend
+            while json.loads(await user.recv()).get("type") != "ack":
+                pass
+        await receiver
+
+
+async def ai_chat(base: str, session_id: str, messages: int, samples: list):
+    import websockets
+
+    async with websockets.connect(f"{base}/ws/ai-chat/{session_id}") as ws:
+        await ws.recv()  # welcome
+        for i in range(messages):
+            started = time.perf_counter()
+            await ws.send(json.dumps({"content": f"How can I sleep better? ({i})", "user_name": "Bench"}))
+            while json.loads(await ws.recv()).get("type") != "ai_message":
+                pass
+            samples.append(time.perf_counter() - started)
+
+
+async def drive(port: int, appointment_ids, ai_sessions: int, messages: int) -> dict:
+    base = f"ws://127.0.0.1:{port}"
+    results = {}
+
+    relay = []
+    started = time.perf_counter()
+    await asyncio.gather(*(appointment_chat(base, a, messages, relay) for a in appointment_ids))
+    elapsed = time.perf_counter() - started
+    results["appointment_chat"] = {
+        **latency_summary(relay), "messages_per_second": round(len(relay) / elapsed, 1),
+    }
+
+    replies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(ai_chat(base, f"bench-ai-{i}", messages, replies) for i in range(ai_sessions)))
+    elapsed = time.perf_counter() - started
+    results["ai_chat"] = {
+        **latency_summary(replies), "messages_per_second": round(len(replies) / elapsed, 1),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--ai-sessions", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--groq-latency-ms", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Both are read at import time by database.py / logging_config.py
+    os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DB}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from datagen import generate
+
+    generate(BENCH_DB, messages=args.chats * 2, seed=args.seed, messages_per_appointment=2)
+    import main as app_main
+    from database import SessionLocal
+    from models import Appointment
+
+    app_main.ai_chat_manager.client = StubGroq(args.groq_latency_ms / 1000)
+    app_main.ai_chat_manager.use_groq = True
+
+    db = SessionLocal()
+    appointment_ids = [a.id for a in db.query(Appointment.id).order_by(Appointment.id).limit(args.chats)]
+    db.query(Appointment).update({"status": "active"})
+    db.commit()
+    db.close()
+
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        results = asyncio.run(drive(port, appointment_ids, args.ai_sessions, args.messages))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    print_table([{"chat": name, **stats} for name, stats in results.items()],
+                ("chat", "count", "messages_per_second", "mean_ms", "p50_ms", "p95_ms", "p99_ms"))
+    write_results("websocket", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
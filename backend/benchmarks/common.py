@@ -0,0 +1,80 @@
+"""
+Shared helpers for the benchmark suite: latency summaries and JSON result files.
+Every result file records the git commit and environment, so runs can be
+compared with benchmarks/compare.py.
+"""
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    """Summary of durations given in seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "git_commit": commit or "unknown",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpu_count": str(os.cpu_count()),
+    }
+
+
+def write_results(name: str, params: dict, results, out_dir: str = RESULTS_DIR) -> str:
+    """Write <out_dir>/<name>-<UTC timestamp>.json and return its path."""
+    os.makedirs(out_dir, exist_ok=True)
+    started = datetime.utcnow()
+    path = os.path.join(out_dir, f"{name}-{started:%Y%m%dT%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "benchmark": name,
+            "created_at": started.isoformat(),
+            "environment": environment(),
+            "params": params,
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {path}")
+    return path
+
+
+def print_table(rows: List[Dict], columns: Sequence[str]):
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in rows)) + 2 for c in columns]
+    print("".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
@@ -0,0 +1,46 @@
+"""
+Compare two benchmark result files (from benchmarks/results/).
+Prints every numeric metric present in both, with the relative change.
+
+Run from backend/:  python benchmarks/compare.py OLD.json NEW.json [--threshold 10]
+"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, inner in value.items():
+            flat.update(flatten(inner, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="flag changes above this percentage")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{old['benchmark']}: {old['environment']['git_commit']} -> {new['environment']['git_commit']}")
+
+    old_metrics, new_metrics = flatten(old["results"]), flatten(new["results"])
+    width = max((len(k) for k in old_metrics), default=10) + 2
+    for key in sorted(old_metrics.keys() & new_metrics.keys()):
+        before, after = old_metrics[key], new_metrics[key]
+        change = (after - before) / before * 100 if before else 0.0
+        flag = "  <--" if abs(change) >= args.threshold else ""
+        print(f"{key:<{width}}{before:>12.3f}{after:>12.3f}{change:>+9.1f}%{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Seeded synthetic data for benchmarks: users, therapists, appointments, messages
+with their emotion_analysis rows, and session notes. The same seed and scale
+always produce the same rows, ids included.
+
+Run from backend/:
+    python benchmarks/datagen.py --messages 100000 --out /tmp/bench-100k.db [--seed 42]
+
+The first user and therapist are "bench-user-0" / "bench-therapist-0", which the
+endpoint benchmarks log in as.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from auth import get_password_hash
+from migrations import migrate
+from models import Appointment, EmotionAnalysis, Message, SessionNote, Therapist, User
+from services.emotion_analysis import analyze
+
+BENCH_PASSWORD = "bench-password"
+INSERT_CHUNK = 10000
+
+USER_LINES = (
+    "I've been feeling pretty good this week, work is going well",
+    "I feel so anxious before every meeting, my heart races",
+    "Honestly I'm exhausted, the pressure at work is too much",
+    "I keep crying at night and I don't know why",
+    "I'm so angry at my brother, he never listens",
+    "Things feel hopeless lately, nothing I do matters",
+    "I'm scared something bad is going to happen",
+    "I was surprised how much the breathing exercise helped",
+    "Some days I feel like I don't want to live",
+    "I've been sleeping better and I'm glad about that",
+    "Everything is overwhelming and I can't focus",
+    "I feel lonely since moving to the new city",
+    "I had a panic attack on the train yesterday",
+    "Thanks, talking about it really helps",
+    "I'm stressed about exams and can't stop worrying",
+    "Sometimes I think I might hurt myself",
+)
+THERAPIST_LINES = (
+    "That sounds really hard. Can you tell me more about when it started?",
+    "What usually helps you wind down in the evening?",
+    "It makes sense that you feel that way given everything going on.",
+    "Let's try a short grounding exercise together.",
+    "How have you been sleeping this week?",
+    "I'm glad you shared that with me.",
+    "What would you like to focus on in our next session?",
+    "Have you been able to use the techniques we discussed?",
+)
+
+
+class SeededIds:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def next(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+
+def _chunks(rows: Iterator[dict], size: int = INSERT_CHUNK) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(
+    path: str,
+    messages: int,
+    seed: int = 42,
+    messages_per_appointment: int = 20,
+    users: int = 0,
+    therapists: int = 0,
+) -> Dict[str, int]:
+    """Create a fresh SQLite database at `path` with `messages` chat messages. Returns row counts."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    ids = SeededIds(rng)
+    appointment_count = max(1, math.ceil(messages / messages_per_appointment))
+    users = users or max(10, appointment_count // 10)
+    therapists = therapists or max(3, appointment_count // 200)
+    now = datetime(2025, 6, 1)
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    # analyze() is deterministic per text, so score each line once
+    scored = {line: analyze(line) for line in USER_LINES + THERAPIST_LINES}
+
+    user_rows = [
+        {"id": ids.next(), "username": f"bench-user-{i}", "email": f"bench-user-{i}@example.com",
+         "password_hash": password_hash, "full_name": f"Bench User {i}", "created_at": now - timedelta(days=400)}
+        for i in range(users)
+    ]
+    therapist_rows = [
+        {"id": ids.next(), "username": f"bench-therapist-{i}", "email": f"bench-therapist-{i}@example.com",
+         "password_hash": password_hash, "full_name": f"Dr Bench {i}", "license_number": f"LIC-{i:05d}",
+         "created_at": now - timedelta(days=400)}
+        for i in range(therapists)
+    ]
+
+    appointment_rows = []
+    for _ in range(appointment_count):
+        user = rng.choice(user_rows)
+        therapist = rng.choice(therapist_rows) if rng.random() < 0.8 else None
+        status = rng.choices(("completed", "active", "scheduled"), weights=(70, 10, 20))[0]
+        appointment_rows.append({
+            "id": ids.next(),
+            "user_id": user["id"],
+            "therapist_id": therapist["id"] if therapist else None,
+            "user_name": user["full_name"],
+            "therapist_name": therapist["full_name"] if therapist else None,
+            "status": status,
+            "created_from": "ai" if rng.random() < 0.4 else "manual",
+            "created_at": now - timedelta(minutes=rng.randrange(365 * 24 * 60)),
+        })
+
+    analyses: List[dict] = []
+
+    def message_rows() -> Iterator[dict]:
+        remaining = messages
+        for appointment in appointment_rows:
+            count = min(messages_per_appointment, remaining)
+            remaining -= count
+            timestamp = appointment["created_at"]
+            for seq in range(1, count + 1):
+                sender = "user" if seq % 2 else "therapist"
+                content = rng.choice(USER_LINES if sender == "user" else THERAPIST_LINES)
+                timestamp += timedelta(seconds=rng.randrange(5, 240))
+                message_id = ids.next()
+                label, confidence, risk_level, risk_score, model_version = scored[content]
+                analyses.append({
+                    "analysis_id": ids.next(), "message_id": message_id, "emotion_label": label,
+                    "confidence_score": confidence, "risk_level": risk_level, "risk_score": risk_score,
+                    "model_version": model_version, "analyzed_at": timestamp,
+                })
+                yield {"id": message_id, "appointment_id": appointment["id"], "seq": seq,
+                       "sender": sender, "content": content, "timestamp": timestamp}
+
+    note_rows = [
+        {"id": ids.next(), "appointment_id": a["id"], "therapist_name": a["therapist_name"],
+         "notes": "Discussed coping strategies; follow up on sleep.", "created_at": a["created_at"],
+         "updated_at": a["created_at"]}
+        for a in appointment_rows
+        if a["status"] == "completed" and a["therapist_name"] and rng.random() < 0.3
+    ]
+
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), user_rows)
+        conn.execute(Therapist.__table__.insert(), therapist_rows)
+        for chunk in _chunks(iter(appointment_rows)):
+            conn.execute(Appointment.__table__.insert(), chunk)
+        for chunk in _chunks(message_rows()):
+            conn.execute(Message.__table__.insert(), chunk)
+            conn.execute(EmotionAnalysis.__table__.insert(), analyses)
+            analyses.clear()
+        if note_rows:
+            conn.execute(SessionNote.__table__.insert(), note_rows)
+    engine.dispose()
+    return {
+        "users": len(user_rows),
+        "therapists": len(therapist_rows),
+        "appointments": len(appointment_rows),
+        "messages": messages,
+        "session_notes": len(note_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--out", required=True, help="SQLite file to create (overwritten)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--messages-per-appointment", type=int, default=20)
+    parser.add_argument("--users", type=int, default=0, help="default: one per 10 appointments")
+    parser.add_argument("--therapists", type=int, default=0, help="default: one per 200 appointments")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.out, args.messages, args.seed, args.messages_per_appointment, args.users, args.therapists)
+    print(f"{counts} in {time.perf_counter() - started:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
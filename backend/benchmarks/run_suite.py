@@ -0,0 +1,40 @@
+"""
+Run the offline benchmark suite; each benchmark writes its own JSON file to
+benchmarks/results/.
+
+Run from backend/:  python benchmarks/run_suite.py [--quick]
+--quick uses the 10k-row scale only and smaller WebSocket loads.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+
+    if args.quick:
+        runs = [
+            ["bench_micro.py", "--iterations", "5000", "--bcrypt-iterations", "5"],
+            ["bench_endpoints.py", "--scales", "10000", "--requests", "10"],
+            ["bench_websocket.py", "--chats", "10", "--ai-sessions", "5", "--messages", "10"],
+        ]
+    else:
+        runs = [
+            ["bench_micro.py"],
+            ["bench_endpoints.py"],
+            ["bench_websocket.py"],
+        ]
+    env = {**os.environ, "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")}
+    for script, *script_args in runs:
+        print(f"== {script} {' '.join(script_args)}", flush=True)
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, script), *script_args], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
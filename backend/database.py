@@ -1,27 +1,74 @@
+import env  # noqa: F401  (loads .env before the settings below are read)
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import event
+import os
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./neurosupport.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./neurosupport.db")
+# Read-only connections for request handlers; writes go through the single writer connection
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+DB_READ_POOL_OVERFLOW = int(os.getenv("DB_READ_POOL_OVERFLOW", "20"))
 
+
+def is_sqlite_file(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def configure_sqlite(engine, read_only: bool = False):
+    """Connection setup for SQLite engines.
+
+    Every connection enforces foreign keys (so ON DELETE CASCADE works). The
+    write connection switches the file to WAL, so readers never wait for the
+    writer, and starts each transaction with BEGIN IMMEDIATE under SQLAlchemy's
+    control (pysqlite's implicit BEGIN breaks SAVEPOINTs). Read connections are
+    query_only.
+    """
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        elif is_sqlite_file(engine.url):
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+        if not read_only:
+            dbapi_connection.isolation_level = None
+
+    if not read_only:
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+# The only write connection: owned by services/db_writer.py in the server, or by a CLI run
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+    pool_size=1, max_overflow=0,
 )
+configure_sqlite(engine)
 
-# Enable foreign keys for SQLite so ON DELETE CASCADE works
-@event.listens_for(engine, "connect")
-def _set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+if is_sqlite_file(SQLALCHEMY_DATABASE_URL):
+    read_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+        pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_POOL_OVERFLOW,
+    )
+    configure_sqlite(read_engine, read_only=True)
+else:
+    # An in-memory database exists only on its own connection
+    read_engine = engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
 def get_db():
-    db = SessionLocal()
+    """Request-scoped read-only session; writes are submitted to db_writer."""
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
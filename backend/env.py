@@ -0,0 +1,14 @@
+"""
+Environment loading. Settings are read with os.getenv when their module is
+imported (database, auth, logging_config, services/*), so .env has to be loaded
+before any of them: each of those modules imports this one first.
+backend/.env is loaded, then ./.env; variables already set in the environment win.
+"""
+import os
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+load_dotenv()  # also allow project root .env
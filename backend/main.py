@@ -1,83 +1,99 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, UploadFile, File, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from sqlalchemy import and_, func, or_, text
 from sqlalchemy.orm import Session
-from typing import Dict, List, Optional
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 import json
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 import os
-from groq import Groq
-from dotenv import load_dotenv
-
-# Load .env from backend directory so GROQ_API_KEY is always found
-_backend_dir = os.path.dirname(os.path.abspath(__file__))
-load_dotenv(os.path.join(_backend_dir, ".env"))
-load_dotenv()  # also allow project root .env
-
-from database import engine, get_db, Base
-from models import Appointment, Message, EmotionAnalysis, Notification, SessionNote, User, Therapist
-from services.emotion_analysis import analyze as analyze_emotion
+import asyncio
+import time
+from collections import defaultdict, deque
+
+from database import engine, read_engine, get_db, ReadSessionLocal
+from logging_config import configure_logging, get_logger, sampled
+from migrations import migrate
+from models import (
+    Appointment, Message, EmotionAnalysis, Notification, SessionNote, SessionSummary, User, Therapist,
+    EMOTION_LABELS, RISK_LEVELS
+)
+from services.inference_server import InferenceServer
+from services.db_writer import DatabaseWriter
+from services.chat_shards import open_chat_shards
+from services.message_writer import MessageWriter
+from services.frame_codec import negotiate as negotiate_codec
+from services.message_search import archived_in_scope, search_available, search_shards
+from services.risk_alerts import RiskAlertPipeline, ALERT_RISK_LEVELS
+from services.risk_trajectory import RiskTrajectoryTracker
+from services.transcript_export import EXPORT_FORMATS, export_query, iter_export, parquet_available
+from services.bulk_import import import_ndjson
+from services.archive import read_archived_messages
+from services.session_summary import summarize_session_job, user_session_stats
+from services.appointment_queue import (
+    InvalidCursor, QUEUE_MAX_LIMIT, QUEUE_MAX_WAIT_SECONDS, QUEUE_RECHECK_SECONDS,
+    encode_cursor, newer_items, older_page, queue_query, queue_signal
+)
+from services.assignment import AssignmentScheduler, claim_appointment
+from services.profiling import ProfilingMiddleware, profiler
+from services.metrics import (
+    MetricsMiddleware, instrument_engine, render_metrics, WEBSOCKET_CONNECTIONS,
+    MESSAGE_RELAY_SECONDS, ANALYZE_SECONDS, GROQ_REQUEST_SECONDS, GROQ_ERRORS,
+    ASSIGNMENT_QUEUE_DEPTH, ASSIGNMENT_CLAIM_CONFLICTS
+)
+from services.fast_json import record_rows, rows_response, schema_columns
+from services.http_cache import GZIP_LEVEL, GZIP_MIN_BYTES, etag_headers, make_etag, not_modified, scope_versions
+from services.ws_connection import ChatConnection, CLOSE_IDLE, CLOSE_REPLACED
 from schemas import (
-    AppointmentCreate, AppointmentResponse, MessageResponse,
+    AppointmentCreate, AppointmentResponse, AppointmentQueuePage, MessageResponse, RiskTrajectoryResponse,
     NotificationCreate, NotificationResponse,
     SessionNoteCreate, SessionNoteUpdate, SessionNoteResponse,
     UserRegister, TherapistRegister, UserLogin, TherapistLogin,
-    Token, UserResponse, TherapistResponse, AnalyticsResponse
+    Token, UserResponse, TherapistResponse, AnalyticsResponse,
+    MessageSearchResponse, ImportReport, ProfilingUpdate
 )
 import uuid
 from auth import (
-    verify_password, get_password_hash, create_access_token,
+    verify_password, get_password_hash, create_access_token, verify_token,
     get_current_user, get_current_therapist
 )
-from datetime import timedelta
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="NeuroSupport-V2 Backend")
-
-# CORS – allow common dev ports so register/login work from any frontend port
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", "http://localhost:3001", "http://localhost:3002",
-        "http://localhost:3003", "http://localhost:3004", "http://localhost:3005",
-        "http://127.0.0.1:3000", "http://127.0.0.1:3001", "http://127.0.0.1:3002",
-        "http://127.0.0.1:3003", "http://127.0.0.1:3004", "http://127.0.0.1:3005",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-@app.get("/api/status")
+configure_logging()
+logger = get_logger("main")
+
+# Run schema migrations on startup (set 0 when they are run once per deploy: python -m migrations)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+instrument_engine(engine)
+if read_engine is not engine:
+    instrument_engine(read_engine)
+
+# Owns the only write connection: every write below is a unit submitted to it
+db_writer = DatabaseWriter(engine)
+# Messages, emotion analysis and session notes: the primary alone unless CHAT_SHARDS is set
+chat_shards = open_chat_shards(db_writer)
+
+router = APIRouter()
+
+@router.get("/api/status")
 def get_system_status():
     """Check if GROQ AI is enabled"""
     api_key = os.getenv("GROQ_API_KEY", "")
     return {
         "groq_enabled": bool(api_key and api_key.strip()),
         "api_key_present": bool(api_key),
-        "use_groq": ai_chat_manager.use_groq if 'ai_chat_manager' in globals() else False
+        "use_groq": ai_chat_manager.use_groq
     }
 
-@app.on_event("startup")
-async def startup_event():
-    """Log system status on startup"""
-    api_key = os.getenv("GROQ_API_KEY", "")
-    if api_key and api_key.strip():
-        print("=" * 60)
-        print("[STARTUP] GROQ AI: ENABLED")
-        print(f"[STARTUP] API Key: {api_key[:20]}...")
-        print("=" * 60)
-    else:
-        print("=" * 60)
-        print("[STARTUP] GROQ AI: DISABLED (using fallback)")
-        print("=" * 60)
-
 # ====================================================
 # AUTHENTICATION ENDPOINTS
 # ====================================================
 
-@app.post("/auth/user/register", response_model=UserResponse)
+@router.post("/auth/user/register", response_model=UserResponse)
 def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if username already exists
@@ -96,13 +112,11 @@ def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
         password_hash=hashed_password,
         full_name=user_data.full_name
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db_writer.run(lambda w: w.add(db_user))
     
     return db_user
 
-@app.post("/auth/user/login", response_model=Token)
+@router.post("/auth/user/login", response_model=Token)
 def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
     """Login as user"""
     user = db.query(User).filter(User.username == credentials.username).first()
@@ -125,7 +139,7 @@ def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
         "username": user.username
     }
 
-@app.post("/auth/therapist/register", response_model=TherapistResponse)
+@router.post("/auth/therapist/register", response_model=TherapistResponse)
 def register_therapist(therapist_data: TherapistRegister, db: Session = Depends(get_db)):
     """Register a new therapist"""
     # Check if username already exists
@@ -145,13 +159,11 @@ def register_therapist(therapist_data: TherapistRegister, db: Session = Depends(
         full_name=therapist_data.full_name,
         license_number=therapist_data.license_number
     )
-    db.add(db_therapist)
-    db.commit()
-    db.refresh(db_therapist)
+    db_writer.run(lambda w: w.add(db_therapist))
     
     return db_therapist
 
-@app.post("/auth/therapist/login", response_model=Token)
+@router.post("/auth/therapist/login", response_model=Token)
 def login_therapist(credentials: TherapistLogin, db: Session = Depends(get_db)):
     """Login as therapist"""
     therapist = db.query(Therapist).filter(Therapist.username == credentials.username).first()
@@ -174,7 +186,7 @@ def login_therapist(credentials: TherapistLogin, db: Session = Depends(get_db)):
         "username": therapist.username
     }
 
-@app.get("/auth/me", response_model=dict)
+@router.get("/auth/me", response_model=dict)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return {
@@ -185,7 +197,7 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
         "role": "user"
     }
 
-@app.get("/auth/therapist/me", response_model=dict)
+@router.get("/auth/therapist/me", response_model=dict)
 def get_current_therapist_info(current_therapist: Therapist = Depends(get_current_therapist)):
     """Get current therapist information"""
     return {
@@ -201,7 +213,7 @@ def get_current_therapist_info(current_therapist: Therapist = Depends(get_curren
 # REST API ENDPOINTS
 # ====================================================
 
-@app.post("/appointments", response_model=AppointmentResponse)
+@router.post("/appointments", response_model=AppointmentResponse)
 def create_appointment(
     appointment: AppointmentCreate,
     current_user: User = Depends(get_current_user),
@@ -210,51 +222,109 @@ def create_appointment(
     """Create a new appointment manually (requires user authentication)"""
     db_appointment = Appointment(
         id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        therapist_id=_resolve_account_id(db, Therapist, appointment.therapist_name),
         user_name=current_user.full_name,  # Use authenticated user's name
         therapist_name=appointment.therapist_name,
         status="scheduled",
         created_from=appointment.created_from
     )
-    db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
-    
-    # Send notifications
-    create_notification(
-        db, "user", current_user.full_name,
-        "Appointment Scheduled",
-        f"Your appointment has been scheduled successfully. ID: {db_appointment.id[:8]}"
-    )
-    create_notification(
-        db, "therapist", "All Therapists",
-        "New Appointment",
-        f"New appointment from {current_user.full_name}"
-    )
+
+    def _create(w: Session):
+        w.add(db_appointment)
+        # Send notifications (same transaction)
+        create_notification(
+            w, "user", current_user.full_name,
+            "Appointment Scheduled",
+            f"Your appointment has been scheduled successfully. ID: {db_appointment.id[:8]}",
+            recipient_id=current_user.id
+        )
+        create_notification(
+            w, "therapist", "All Therapists",
+            "New Appointment",
+            f"New appointment from {current_user.full_name}"
+        )
+
+    db_writer.run(_create)
+    queue_signal.notify()
+    assignment_scheduler.enqueue(db_appointment)
     
     return db_appointment
 
-@app.get("/appointments", response_model=List[AppointmentResponse])
+@router.get("/appointments", response_model=List[AppointmentResponse])
 def get_appointments(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all appointments for the current user"""
-    # Filter appointments by user's name
-    appointments = db.query(Appointment).filter(
-        Appointment.user_name == current_user.full_name
+    scopes = _user_scopes(current_user)
+    etag = make_etag(*scopes, scope_versions(db, scopes))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = _user_appointments(db, current_user).with_entities(
+        *schema_columns(Appointment, AppointmentResponse)
     ).order_by(Appointment.created_at.desc()).all()
-    return appointments
+    return rows_response(rows, AppointmentResponse, headers=etag_headers(etag))
 
-@app.get("/appointments/all", response_model=List[AppointmentResponse])
+@router.get("/appointments/all", response_model=List[AppointmentResponse])
 def get_all_appointments(
+    request: Request,
     current_therapist: Therapist = Depends(get_current_therapist),
     db: Session = Depends(get_db)
 ):
     """Get all appointments (THERAPIST ONLY)"""
-    appointments = db.query(Appointment).order_by(Appointment.created_at.desc()).all()
-    return appointments
+    etag = make_etag("appointments", scope_versions(db, ["appointments"]))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = db.query(*schema_columns(Appointment, AppointmentResponse)).order_by(Appointment.created_at.desc()).all()
+    return rows_response(rows, AppointmentResponse, headers=etag_headers(etag))
+
+@router.get("/appointments/queue", response_model=AppointmentQueuePage)
+async def get_appointment_queue(
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    unassigned: bool = False,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    newer_than: Optional[str] = None,
+    wait: float = Query(0, ge=0, le=QUEUE_MAX_WAIT_SECONDS),
+    limit: int = Query(50, ge=1, le=QUEUE_MAX_LIMIT),
+    current_therapist: Therapist = Depends(get_current_therapist),
+    db: Session = Depends(get_db)
+):
+    """Filtered appointment queue, newest first, one keyset page at a time (THERAPIST ONLY).
 
-@app.get("/appointments/{appointment_id}", response_model=AppointmentResponse)
+    With `newer_than` only items created after that cursor are returned; add `wait`
+    to long-poll until at least one arrives. Only the wait runs on the event loop;
+    the queries go to the threadpool, like a sync endpoint's.
+    """
+    query = queue_query(db, status, created_from, unassigned, date_from, date_to)
+    try:
+        if newer_than:
+            deadline = time.monotonic() + wait
+            while True:
+                items = await run_in_threadpool(newer_items, query, newer_than, limit)
+                remaining = deadline - time.monotonic()
+                if items or remaining <= 0:
+                    break
+                # Hand the connection back to the pool while waiting
+                await run_in_threadpool(db.rollback)
+                await queue_signal.wait(min(remaining, QUEUE_RECHECK_SECONDS))
+            head_cursor = encode_cursor(items[-1]) if items else newer_than
+            return {"items": items[::-1], "next_cursor": None, "head_cursor": head_cursor}
+
+        items, next_cursor = await run_in_threadpool(older_page, query, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Only the first page starts at the newest item
+    head_cursor = encode_cursor(items[0]) if items and not cursor else None
+    return {"items": items, "next_cursor": next_cursor, "head_cursor": head_cursor}
+
+@router.get("/appointments/{appointment_id}", response_model=AppointmentResponse)
 def get_appointment(
     appointment_id: str,
     current_user: User = Depends(get_current_user),
@@ -266,20 +336,49 @@ def get_appointment(
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Verify user owns this appointment
-    if appointment.user_name != current_user.full_name:
+    if not _owns_appointment(appointment, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to view this appointment")
     
     return appointment
 
-@app.get("/appointments/{appointment_id}/messages", response_model=List[MessageResponse])
-def get_appointment_messages(appointment_id: str, db: Session = Depends(get_db)):
-    """Get messages for an appointment"""
-    messages = db.query(Message).filter(Message.appointment_id == appointment_id).order_by(Message.timestamp).all()
-    return messages
-
-@app.post("/appointments/{appointment_id}/end-session")
+@router.get("/appointments/{appointment_id}/messages", response_model=List[MessageResponse])
+def get_appointment_messages(
+    appointment_id: str,
+    request: Request,
+    after_seq: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get messages for an appointment (only those after `after_seq` when given).
+    Messages of archived appointments are read from cold storage."""
+    columns = schema_columns(Message, MessageResponse)
+    with chat_shards.read_session(appointment_id) as chat_db:
+        # Archiving deletes the hot rows, which bumps this scope too
+        scope = "appointment:" + appointment_id
+        etag = make_etag(scope, scope_versions(chat_db, [scope]), chat_shards.count)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        archived = read_archived_messages(db, appointment_id)
+        if after_seq is not None:
+            archived = [m for m in archived if m["seq"] is not None and m["seq"] > after_seq]
+            rows = _messages_after_seq(chat_db, appointment_id, after_seq).with_entities(*columns).all()
+        else:
+            rows = chat_db.query(*columns).filter(
+                Message.appointment_id == appointment_id
+            ).order_by(Message.timestamp).all()
+    return rows_response(record_rows(archived, MessageResponse) + rows, MessageResponse, headers=etag_headers(etag))
+
+def _messages_after_seq(db: Session, appointment_id: str, after_seq: int):
+    """Index range scan on (appointment_id, seq)"""
+    return db.query(Message).filter(
+        Message.appointment_id == appointment_id,
+        Message.seq > after_seq
+    ).order_by(Message.seq)
+
+@router.post("/appointments/{appointment_id}/end-session")
 def end_appointment_session(
     appointment_id: str,
+    background_tasks: BackgroundTasks,
     current_therapist: Therapist = Depends(get_current_therapist),
     db: Session = Depends(get_db)
 ):
@@ -289,16 +388,21 @@ def end_appointment_session(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    # Mark as completed
-    appointment.status = "completed"
-    db.commit()
-    
-    # Send notification to user
-    create_notification(
-        db, "user", appointment.user_name,
-        "Session Ended",
-        "Your therapist has ended the session."
-    )
+    def _end(w: Session):
+        # Mark as completed
+        _set_appointment_status(w, appointment_id, "completed")
+        # Send notification to user
+        create_notification(
+            w, "user", appointment.user_name,
+            "Session Ended",
+            "Your therapist has ended the session.",
+            recipient_id=appointment.user_id
+        )
+
+    db_writer.run(_end)
+    appointment_chat_manager.set_status(appointment_id, "completed")
+    # Materialize the session summary after the response is sent
+    background_tasks.add_task(_run_session_summary, appointment_id)
     
     return {
         "status": "success",
@@ -306,49 +410,91 @@ def end_appointment_session(
         "appointment_id": appointment_id
     }
 
+@router.get("/appointments/{appointment_id}/risk", response_model=RiskTrajectoryResponse)
+def get_appointment_risk(
+    appointment_id: str,
+    current_therapist: Therapist = Depends(get_current_therapist),
+    db: Session = Depends(get_db)
+):
+    """Rolling risk trajectory of the user's messages in this appointment (THERAPIST ONLY)"""
+    if not db.query(Appointment.id).filter(Appointment.id == appointment_id).first():
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    with chat_shards.read_session(appointment_id) as chat_db:
+        trajectory = risk_tracker.load(chat_db, appointment_id)
+    return {"appointment_id": appointment_id, **trajectory.to_dict()}
+
 # ====================================================
 # NOTIFICATION SERVICE
 # ====================================================
 
-def create_notification(db: Session, role: str, recipient: str, title: str, message: str) -> Notification:
-    """Helper function to create notifications"""
+def create_notification(
+    db: Session, role: str, recipient: str, title: str, message: str,
+    recipient_id: Optional[str] = None
+) -> Notification:
+    """Add a notification inside a write unit (recipient_id is None for broadcasts like "All Therapists")"""
     notification = Notification(
         id=str(uuid.uuid4()),
         recipient_role=role,
+        recipient_id=recipient_id,
         recipient_name=recipient,
         title=title,
         message=message
     )
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
     return notification
 
-@app.get("/notifications", response_model=List[NotificationResponse])
+def _set_appointment_status(db: Session, appointment_id: str, status: str):
+    """Write unit helper"""
+    db.query(Appointment).filter(Appointment.id == appointment_id).update(
+        {Appointment.status: status}, synchronize_session=False
+    )
+
+def _mark_notification_read(db: Session, notification_id: str):
+    """Write unit helper"""
+    db.query(Notification).filter(Notification.id == notification_id).update(
+        {Notification.is_read: True}, synchronize_session=False
+    )
+
+@router.get("/notifications", response_model=List[NotificationResponse])
 def get_notifications(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get notifications for the current user"""
-    notifications = db.query(Notification).filter(
+    scopes = ["notifications:" + scope for scope in _user_scopes(current_user)]
+    etag = make_etag(*scopes, scope_versions(db, scopes))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = db.query(*schema_columns(Notification, NotificationResponse)).filter(
         Notification.recipient_role == "user",
-        Notification.recipient_name == current_user.full_name
+        or_(
+            Notification.recipient_id == current_user.id,
+            and_(Notification.recipient_id.is_(None), Notification.recipient_name == current_user.full_name)
+        )
     ).order_by(Notification.created_at.desc()).all()
-    return notifications
+    return rows_response(rows, NotificationResponse, headers=etag_headers(etag))
 
-@app.get("/notifications/therapist", response_model=List[NotificationResponse])
+@router.get("/notifications/therapist", response_model=List[NotificationResponse])
 def get_therapist_notifications(
+    request: Request,
     current_therapist: Therapist = Depends(get_current_therapist),
     db: Session = Depends(get_db)
 ):
     """Get notifications for the current therapist"""
-    notifications = db.query(Notification).filter(
+    scope = "notifications:therapist"
+    etag = make_etag(scope, scope_versions(db, [scope]))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = db.query(*schema_columns(Notification, NotificationResponse)).filter(
         Notification.recipient_role == "therapist",
         Notification.recipient_name == "All Therapists"
     ).order_by(Notification.created_at.desc()).all()
-    return notifications
+    return rows_response(rows, NotificationResponse, headers=etag_headers(etag))
 
-@app.post("/notifications/{notification_id}/read")
+@router.post("/notifications/{notification_id}/read")
 def mark_notification_read(
     notification_id: str,
     current_user: User = Depends(get_current_user),
@@ -360,14 +506,14 @@ def mark_notification_read(
         raise HTTPException(status_code=404, detail="Notification not found")
     
     # Verify user owns this notification
-    if notification.recipient_name != current_user.full_name:
+    owner = (notification.recipient_id, notification.recipient_name)
+    if notification.recipient_role != "user" or not _is_owner(owner, current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    notification.is_read = True
-    db.commit()
+    db_writer.run(lambda w: _mark_notification_read(w, notification_id))
     return {"status": "success", "message": "Notification marked as read"}
 
-@app.post("/notifications/{notification_id}/read/therapist")
+@router.post("/notifications/{notification_id}/read/therapist")
 def mark_therapist_notification_read(
     notification_id: str,
     current_therapist: Therapist = Depends(get_current_therapist),
@@ -382,15 +528,14 @@ def mark_therapist_notification_read(
     if notification.recipient_role != "therapist":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    notification.is_read = True
-    db.commit()
+    db_writer.run(lambda w: _mark_notification_read(w, notification_id))
     return {"status": "success", "message": "Notification marked as read"}
 
 # ====================================================
 # SESSION NOTES APIs (THERAPIST ONLY)
 # ====================================================
 
-@app.post("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
+@router.post("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
 def create_session_note(
     appointment_id: str,
     note: SessionNoteCreate,
@@ -403,20 +548,18 @@ def create_session_note(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    # Check if notes already exist for this appointment
-    existing_note = db.query(SessionNote).filter(
-        SessionNote.appointment_id == appointment_id
-    ).first()
-    
-    if existing_note:
-        # Update existing note
-        existing_note.notes = note.notes
-        existing_note.therapist_name = current_therapist.full_name
-        existing_note.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_note)
-        return existing_note
-    else:
+    def _save(w: Session) -> SessionNote:
+        # Check if notes already exist for this appointment
+        existing_note = w.query(SessionNote).filter(
+            SessionNote.appointment_id == appointment_id
+        ).first()
+        
+        if existing_note:
+            # Update existing note
+            existing_note.notes = note.notes
+            existing_note.therapist_name = current_therapist.full_name
+            existing_note.updated_at = datetime.utcnow()
+            return existing_note
         # Create new note
         session_note = SessionNote(
             id=str(uuid.uuid4()),
@@ -424,28 +567,29 @@ def create_session_note(
             therapist_name=current_therapist.full_name,
             notes=note.notes
         )
-        db.add(session_note)
-        db.commit()
-        db.refresh(session_note)
+        w.add(session_note)
         return session_note
 
-@app.get("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
+    return chat_shards.writer(appointment_id).run(_save)
+
+@router.get("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
 def get_session_note(
     appointment_id: str,
     current_therapist: Therapist = Depends(get_current_therapist),
     db: Session = Depends(get_db)
 ):
     """Get session notes for an appointment (THERAPIST ONLY)"""
-    session_note = db.query(SessionNote).filter(
-        SessionNote.appointment_id == appointment_id
-    ).first()
+    with chat_shards.read_session(appointment_id) as chat_db:
+        session_note = chat_db.query(SessionNote).filter(
+            SessionNote.appointment_id == appointment_id
+        ).first()
     
     if not session_note:
         raise HTTPException(status_code=404, detail="Session notes not found")
     
     return session_note
 
-@app.put("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
+@router.put("/appointments/{appointment_id}/notes", response_model=SessionNoteResponse)
 def update_session_note(
     appointment_id: str,
     note_update: SessionNoteUpdate,
@@ -453,32 +597,117 @@ def update_session_note(
     db: Session = Depends(get_db)
 ):
     """Update session notes for an appointment (THERAPIST ONLY)"""
-    session_note = db.query(SessionNote).filter(
-        SessionNote.appointment_id == appointment_id
-    ).first()
+    with chat_shards.read_session(appointment_id) as chat_db:
+        session_note = chat_db.query(SessionNote).filter(
+            SessionNote.appointment_id == appointment_id
+        ).first()
     
     if not session_note:
         raise HTTPException(status_code=404, detail="Session notes not found")
     
-    session_note.notes = note_update.notes
-    session_note.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(session_note)
-    return session_note
+    def _update(w: Session) -> SessionNote:
+        note = w.get(SessionNote, session_note.id)
+        note.notes = note_update.notes
+        note.updated_at = datetime.utcnow()
+        return note
+
+    return chat_shards.writer(appointment_id).run(_update)
+
+# ====================================================
+# TRANSCRIPT SEARCH (THERAPIST ONLY)
+# ====================================================
+
+@router.get("/search/messages", response_model=MessageSearchResponse)
+def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    emotion_label: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_therapist: Therapist = Depends(get_current_therapist),
+    db: Session = Depends(get_db)
+):
+    """Ranked full-text search over session transcripts the therapist can see (THERAPIST ONLY)"""
+    if emotion_label and emotion_label not in EMOTION_LABELS:
+        raise HTTPException(status_code=400, detail=f"emotion_label must be one of {', '.join(EMOTION_LABELS)}")
+    if risk_level and risk_level not in RISK_LEVELS:
+        raise HTTPException(status_code=400, detail=f"risk_level must be one of {', '.join(RISK_LEVELS)}")
+    if not all(chat_shards.gather(search_available)):
+        raise HTTPException(status_code=503, detail="Message search is not available on this database")
+
+    hits = search_shards(chat_shards, current_therapist.id, q, emotion_label, risk_level, limit, offset)
+    return {
+        "query": q,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(hits) > limit,
+        "results": hits[:limit],
+        "archived_not_searched": archived_in_scope(db, current_therapist.id),
+    }
+
+# ====================================================
+# TRANSCRIPT EXPORT (THERAPIST ONLY)
+# ====================================================
+
+@router.get("/export/transcripts")
+def export_transcripts(
+    format: str = "csv",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    appointment_id: Optional[List[str]] = Query(None),
+    current_therapist: Therapist = Depends(get_current_therapist)
+):
+    """Stream messages joined with emotion_analysis and appointments as CSV or Parquet (THERAPIST ONLY)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server")
+
+    query = export_query(date_from, date_to, appointment_id)
+    filename = f"transcripts-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/vnd.apache.parquet"
+    return StreamingResponse(
+        # Own sessions, opened once streaming starts: the request-scoped one is closed by then
+        iter_export(chat_shards, format, query),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# ====================================================
+# BULK IMPORT (THERAPIST ONLY)
+# ====================================================
+
+@router.post("/import/ndjson", response_model=ImportReport)
+def import_history(
+    file: UploadFile = File(...),
+    current_therapist: Therapist = Depends(get_current_therapist),
+    db: Session = Depends(get_db)
+):
+    """Import historical appointments and messages from an NDJSON upload (THERAPIST ONLY).
+    Safe to rerun: records whose id already exists are skipped."""
+    return import_ndjson(db, file.file, chat_shards, writer=db_writer)
 
 # ====================================================
 # ANALYTICS ENDPOINTS (THERAPIST ONLY)
 # ====================================================
 
-@app.get("/analytics", response_model=AnalyticsResponse)
+@router.get("/analytics", response_model=AnalyticsResponse)
 def get_analytics(
+    request: Request,
+    response: Response,
     current_therapist: Therapist = Depends(get_current_therapist),
     db: Session = Depends(get_db)
 ):
     """Get comprehensive analytics for therapist"""
-    from collections import defaultdict
-    from datetime import timedelta
-    
+    # The 30-day window moves daily, so the date is part of the version
+    notes_version = sum(chat_shards.gather(lambda chat_db: scope_versions(chat_db, ["session_notes"])))
+    etag = make_etag("appointments", scope_versions(db, ["appointments"]), "session_notes", notes_version,
+                     chat_shards.count, datetime.utcnow().date().isoformat())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
+
     # Get all appointments
     all_appointments = db.query(Appointment).all()
     
@@ -496,7 +725,7 @@ def get_analytics(
     unique_patients = len(set([a.user_name for a in all_appointments]))
     
     # Session notes count
-    total_session_notes = db.query(SessionNote).count()
+    total_session_notes = sum(chat_shards.gather(lambda chat_db: chat_db.query(SessionNote).count()))
     
     # Appointments by day (last 30 days)
     appointments_by_day = defaultdict(int)
@@ -535,22 +764,68 @@ def get_analytics(
 # DASHBOARD ENDPOINTS (USER ONLY - scoped to current user)
 # ====================================================
 
-def _user_appointments(db: Session, user_name: str):
-    """Appointments for the given user (by full_name)."""
-    return db.query(Appointment).filter(Appointment.user_name == user_name)
+def _is_owner(owner, user: User) -> bool:
+    """owner is a row's (account id, display name); rows with no account id belong to their name."""
+    owner_id, owner_name = owner
+    return owner_id == user.id if owner_id is not None else owner_name == user.full_name
+
+
+def _owns_appointment(appointment: Appointment, user: User) -> bool:
+    """Whether the user may see the appointment (by account id, or by name if it has none)."""
+    return _is_owner((appointment.user_id, appointment.user_name), user)
 
 
-@app.get("/dashboard/user/summary")
+def _user_scopes(user: User) -> List[str]:
+    """cache_versions scopes of the user's rows: by account id, and by name for rows with no account id."""
+    return ["user:" + user.id, "user_name:" + user.full_name]
+
+
+def _user_appointments(db: Session, user: User):
+    """Appointments for the given user: ix_appointments_user_created serves the user_id branch,
+    ix_appointments_user_name_created the name fallback.
+
+    Appointments booked under an ambiguous name have no user_id (see _resolve_account_id);
+    they stay visible to the users with that name.
+    """
+    return db.query(Appointment).filter(or_(
+        Appointment.user_id == user.id,
+        and_(Appointment.user_id.is_(None), Appointment.user_name == user.full_name)
+    ))
+
+
+def _user_dashboard_etag(db: Session, user: User) -> str:
+    """Changes with the user's appointments and summaries and with the messages of any of their appointments."""
+    appointment_ids = [row.id for row in _user_appointments(db, user).with_entities(Appointment.id)]
+    message_versions = sum(chat_shards.gather_by_appointment(
+        appointment_ids, lambda chat_db, ids: scope_versions(chat_db, ["appointment:" + a for a in ids])
+    ))
+    scopes = _user_scopes(user)
+    return make_etag(*scopes, scope_versions(db, scopes), message_versions, chat_shards.count)
+
+
+def _resolve_account_id(db: Session, model, full_name: Optional[str]) -> Optional[str]:
+    """Account id for a display name, only if exactly one account has that name."""
+    if not full_name:
+        return None
+    ids = [row.id for row in db.query(model.id).filter(model.full_name == full_name).limit(2)]
+    return ids[0] if len(ids) == 1 else None
+
+
+@router.get("/dashboard/user/summary")
 def get_dashboard_summary(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """User dashboard overview: sessions, therapists, appointments, high-risk count, monthly growth, risk distribution."""
-    from collections import defaultdict
-    from datetime import timedelta
-    from sqlalchemy import func
+    etag = _user_dashboard_etag(db, current_user)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
 
-    appointments = _user_appointments(db, current_user.full_name).all()
+    appointments = _user_appointments(db, current_user).all()
     appointment_ids = [a.id for a in appointments]
     if not appointment_ids:
         return {
@@ -562,22 +837,10 @@ def get_dashboard_summary(
             "risk_level_distribution": [{"name": "low", "value": 0}, {"name": "medium", "value": 0}, {"name": "high", "value": 0}],
         }
 
-    # High-risk message count (emotion_analysis.risk_level = 'high')
-    high_risk = db.query(EmotionAnalysis).join(Message).filter(
-        Message.appointment_id.in_(appointment_ids),
-        EmotionAnalysis.risk_level == "high",
-    ).count()
-
-    # Risk level distribution (from user messages only: sender='user')
-    risk_counts = db.query(EmotionAnalysis.risk_level, func.count(EmotionAnalysis.analysis_id)).join(
-        Message
-    ).filter(Message.appointment_id.in_(appointment_ids), Message.sender == "user").group_by(
-        EmotionAnalysis.risk_level
-    ).all()
-    risk_dist = {"low": 0, "medium": 0, "high": 0}
-    for level, cnt in risk_counts:
-        risk_dist[level or "low"] = cnt
-    risk_level_distribution = [{"name": k, "value": risk_dist[k]} for k in ("low", "medium", "high")]
+    # Message statistics: precomputed session summaries, plus live aggregation for open sessions
+    stats = user_session_stats(db, appointment_ids, chat_shards)
+    high_risk = stats.high_risk_count
+    risk_level_distribution = [{"name": k, "value": stats.risk_level_counts.get(k, 0)} for k in ("low", "medium", "high")]
 
     # Monthly session growth (sessions = appointments with at least one message, or all appointments)
     monthly = defaultdict(int)
@@ -599,16 +862,21 @@ def get_dashboard_summary(
     }
 
 
-@app.get("/dashboard/user/emotions")
+@router.get("/dashboard/user/emotions")
 def get_dashboard_emotions(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Emotion distribution, avg risk over time, emotion frequency per month."""
-    from collections import defaultdict
-    from sqlalchemy import func
+    etag = _user_dashboard_etag(db, current_user)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
 
-    appointments = _user_appointments(db, current_user.full_name).all()
+    appointments = _user_appointments(db, current_user).all()
     appointment_ids = [a.id for a in appointments]
     if not appointment_ids:
         return {
@@ -617,41 +885,20 @@ def get_dashboard_emotions(
             "emotion_frequency_per_month": [],
         }
 
-    # Emotion distribution (user messages only)
-    emotion_counts = db.query(EmotionAnalysis.emotion_label, func.count(EmotionAnalysis.analysis_id)).join(
-        Message
-    ).filter(Message.appointment_id.in_(appointment_ids), Message.sender == "user").group_by(
-        EmotionAnalysis.emotion_label
-    ).all()
-    emotion_distribution = [{"name": label, "value": count} for label, count in emotion_counts]
+    # User messages only: precomputed session summaries, plus live aggregation for open sessions
+    stats = user_session_stats(db, appointment_ids, chat_shards)
+    emotion_distribution = [{"name": label, "value": count} for label, count in sorted(stats.emotion_counts.items())]
 
     # Avg risk score over time (by month)
-    month_expr = func.strftime("%Y-%m", Message.timestamp)
-    rows = db.query(
-        month_expr.label("month"),
-        func.avg(EmotionAnalysis.risk_score).label("avg_risk"),
-    ).join(EmotionAnalysis).filter(
-        Message.appointment_id.in_(appointment_ids),
-        Message.sender == "user",
-    ).group_by(month_expr).all()
-    avg_risk_over_time = [{"month": r.month or "", "avgRiskScore": round(float(r.avg_risk or 0), 3)} for r in rows]
+    avg_risk_over_time = [
+        {"month": month, "avgRiskScore": round(stats.monthly_risk_sum[month] / count, 3) if count else 0.0}
+        for month, count in sorted(stats.monthly_messages.items())
+    ]
 
     # Emotion frequency per month
-    month_expr2 = func.strftime("%Y-%m", Message.timestamp)
-    rows2 = db.query(
-        month_expr2.label("month"),
-        EmotionAnalysis.emotion_label,
-        func.count(EmotionAnalysis.analysis_id).label("count"),
-    ).join(EmotionAnalysis).filter(
-        Message.appointment_id.in_(appointment_ids),
-        Message.sender == "user",
-    ).group_by(month_expr2, EmotionAnalysis.emotion_label).all()
-    by_month = defaultdict(lambda: defaultdict(int))
-    for r in rows2:
-        by_month[r.month or ""][r.emotion_label] = r.count
     emotion_frequency_per_month = []
-    for month in sorted(by_month.keys()):
-        for label, count in by_month[month].items():
+    for month in sorted(stats.monthly_emotions.keys()):
+        for label, count in stats.monthly_emotions[month].items():
             emotion_frequency_per_month.append({"month": month, "emotion": label, "count": count})
 
     return {
@@ -661,8 +908,10 @@ def get_dashboard_emotions(
     }
 
 
-@app.get("/dashboard/user/sessions")
+@router.get("/dashboard/user/sessions")
 def get_dashboard_sessions(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
@@ -670,19 +919,25 @@ def get_dashboard_sessions(
     db: Session = Depends(get_db)
 ):
     """Sessions (appointments) for the user with optional filters."""
-    from datetime import datetime as dt
-
-    q = _user_appointments(db, current_user.full_name).order_by(Appointment.created_at.desc())
+    etag = _user_dashboard_etag(db, current_user)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
+
+    q = _user_appointments(db, current_user).outerjoin(
+        SessionSummary, SessionSummary.appointment_id == Appointment.id
+    ).add_columns(SessionSummary.ended_at).order_by(Appointment.created_at.desc())
     if status:
         q = q.filter(Appointment.status == status)
     if date_from:
         try:
-            q = q.filter(Appointment.created_at >= dt.fromisoformat(date_from.replace("Z", "+00:00")))
+            q = q.filter(Appointment.created_at >= datetime.fromisoformat(date_from.replace("Z", "+00:00")))
         except Exception:
             pass
     if date_to:
         try:
-            q = q.filter(Appointment.created_at <= dt.fromisoformat(date_to.replace("Z", "+00:00")))
+            q = q.filter(Appointment.created_at <= datetime.fromisoformat(date_to.replace("Z", "+00:00")))
         except Exception:
             pass
     appointments = q.all()
@@ -691,22 +946,28 @@ def get_dashboard_sessions(
             "session_id": a.id,
             "status": a.status,
             "started_at": a.created_at.isoformat() if a.created_at else None,
-            "end_date": None,  # could derive from last message or session_notes
+            "end_date": ended_at.isoformat() if ended_at else None,  # from the session summary
             "therapist_assigned": a.therapist_name,
         }
-        for a in appointments
+        for a, ended_at in appointments
     ]
 
 
-@app.get("/dashboard/user/therapists")
+@router.get("/dashboard/user/therapists")
 def get_dashboard_therapists(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Unique therapists, sessions per therapist, appointments per therapist, last interaction."""
-    from sqlalchemy import func
+    etag = _user_dashboard_etag(db, current_user)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
 
-    appointments = _user_appointments(db, current_user.full_name).all()
+    appointments = _user_appointments(db, current_user).all()
     if not appointments:
         return {
             "unique_therapist_count": 0,
@@ -768,26 +1029,36 @@ class AIChat:
     GROQ_MODEL = "llama-3.1-8b-instant"
     
     def __init__(self):
-        self.active_sessions: Dict[str, WebSocket] = {}
+        self.active_sessions: Dict[str, ChatConnection] = {}
         self.session_states: Dict[str, str] = {}
         self.conversation_history: Dict[str, List] = {}
         
-        api_key = (os.getenv("GROQ_API_KEY") or "").strip()
-        if api_key:
+        self.api_key = (os.getenv("GROQ_API_KEY") or "").strip()
+        self.use_groq = bool(self.api_key)
+        self._client = None
+    
+    @property
+    def client(self):
+        """Groq client, created on first use: importing the SDK alone takes ~0.4 s."""
+        if self._client is None and self.use_groq:
             try:
-                self.client = Groq(api_key=api_key)
-                self.use_groq = True
-                print(f"[SUCCESS] GROQ AI configured (key length {len(api_key)}) – chatbot will have real conversations.")
-            except Exception as e:
-                print(f"[ERROR] GROQ init failed: {e}")
-                self.client = None
+                from groq import Groq
+
+                self._client = Groq(api_key=self.api_key)
+                logger.info("groq.configured")
+            except Exception:
+                logger.exception("groq.init_failed")
                 self.use_groq = False
-        else:
-            self.client = None
-            self.use_groq = False
-            print("[WARNING] GROQ_API_KEY not found. Check backend/.env exists and contains GROQ_API_KEY=your_key (no quotes).")
+        return self._client
     
-    def disconnect(self, session_id: str):
+    @client.setter
+    def client(self, client):
+        self._client = client
+    
+    def disconnect(self, session_id: str, conn: Optional[ChatConnection] = None):
+        # A reconnect may already own this session id; only its own socket may clear it
+        if conn is not None and self.active_sessions.get(session_id) is not conn:
+            return
         for d in (self.active_sessions, self.session_states, self.conversation_history):
             if session_id in d:
                 del d[session_id]
@@ -802,21 +1073,31 @@ class AIChat:
         lower = message.lower().strip()
         return any(k in lower for k in keywords)
     
-    def create_appointment_from_ai(self, user_name: str, db: Session) -> str:
+    async def create_appointment_from_ai(self, user_name: str, db: Session, user_id: Optional[str] = None) -> str:
+        # Without a token the socket only has the typed name: link the account when it is unambiguous
+        if user_id is None:
+            user_id = _resolve_account_id(db, User, user_name)
         appointment = Appointment(
             id=str(uuid.uuid4()),
+            user_id=user_id,
             user_name=user_name,
             therapist_name=None,
             status="scheduled",
             created_from="ai"
         )
-        db.add(appointment)
-        db.commit()
-        db.refresh(appointment)
-        create_notification(db, "user", user_name, "Appointment Created",
-            "Your appointment has been created. A therapist will join soon.")
-        create_notification(db, "therapist", "All Therapists", "New AI Appointment",
-            f"AI created appointment for {user_name}")
+
+        def _create(w: Session):
+            w.add(appointment)
+            create_notification(w, "user", user_name, "Appointment Created",
+                "Your appointment has been created. A therapist will join soon.", recipient_id=user_id)
+            create_notification(w, "therapist", "All Therapists", "New AI Appointment",
+                f"AI created appointment for {user_name}")
+
+        await db_writer.submit(_create)
+        queue_signal.notify()
+        assignment_scheduler.enqueue(appointment)
+        # End the read transaction: the socket stays open
+        db.rollback()
         return appointment.id
     
     def generate_ai_response(self, user_message: str, session_id: str, user_name: str) -> str:
@@ -831,12 +1112,19 @@ class AIChat:
                     messages.append({"role": role, "content": msg["content"]})
                 messages.append({"role": "user", "content": user_message})
                 
-                completion = self.client.chat.completions.create(
-                    messages=messages,
-                    model=self.GROQ_MODEL,
-                    max_tokens=512,
-                    temperature=0.7,
-                )
+                started = time.perf_counter()
+                try:
+                    completion = self.client.chat.completions.create(
+                        messages=messages,
+                        model=self.GROQ_MODEL,
+                        max_tokens=512,
+                        temperature=0.7,
+                    )
+                except Exception:
+                    GROQ_ERRORS.inc()
+                    raise
+                finally:
+                    GROQ_REQUEST_SECONDS.observe(time.perf_counter() - started)
                 ai_text = (completion.choices[0].message.content or "").strip()
                 if not ai_text:
                     ai_text = "I'm here for you. Could you tell me a bit more about what's on your mind?"
@@ -845,10 +1133,8 @@ class AIChat:
                 history.append({"role": "Assistant", "content": ai_text})
                 self.conversation_history[session_id] = history
                 return ai_text
-            except Exception as e:
-                import traceback
-                print(f"[ERROR] GROQ API failed: {e}")
-                traceback.print_exc()
+            except Exception:
+                logger.exception("groq.request_failed", extra={"session_id": session_id})
                 return (
                     "Sorry, I couldn't reach the AI just now. Please try again in a moment. "
                     "If it keeps happening, check your GROQ API key at https://console.groq.com and the backend terminal for the exact error."
@@ -862,104 +1148,133 @@ class AIChat:
 
 ai_chat_manager = AIChat()
 
-@app.websocket("/ws/ai-chat/{session_id}")
-async def ai_chatbot_websocket(websocket: WebSocket, session_id: str):
+@router.websocket("/ws/ai-chat/{session_id}")
+async def ai_chatbot_websocket(websocket: WebSocket, session_id: str, token: str = None,
+                               encoding: Optional[str] = None):
     """
     AI CHATBOT WEBSOCKET - AI ONLY
     NO ACCESS TO APPOINTMENT CHAT
     NO THERAPIST COMMUNICATION
+    Optional user access token (/ws/ai-chat/{session_id}?token=<JWT>): appointments it books
+    belong to that account instead of the name sent with each message.
     """
-    print(f"[WEBSOCKET] Connection attempt for session {session_id}")
-    print(f"[WEBSOCKET] Client: {websocket.client}")
-    
+    account = None
+    if token:
+        payload = verify_token(token)
+        if not payload or payload.get("role") != "user":
+            await websocket.close(code=1008, reason="Invalid user token")
+            return
+        db = ReadSessionLocal()
+        try:
+            account = db.query(User.id, User.full_name).filter(User.username == payload.get("sub")).first()
+        finally:
+            db.close()
+        if account is None:
+            await websocket.close(code=1008, reason="User not found")
+            return
+
     try:
         # Accept WebSocket connection first
         await websocket.accept()
-        print(f"[WEBSOCKET] Connection accepted for session {session_id}")
+        negotiate_codec(websocket, encoding)
         
-        # Now register the session
-        ai_chat_manager.active_sessions[session_id] = websocket
+        # Now register the session (replacing a stale socket for the same session)
+        conn = ChatConnection(websocket)
+        previous = ai_chat_manager.active_sessions.get(session_id)
+        if previous is not None:
+            previous.evict(CLOSE_REPLACED, "Session opened on another connection")
+        ai_chat_manager.active_sessions[session_id] = conn
         ai_chat_manager.session_states[session_id] = "IDLE"
         ai_chat_manager.conversation_history[session_id] = []
-        print(f"[WEBSOCKET] Session {session_id} registered")
+        logger.info("ai_chat.connected", extra={"session_id": session_id})
         
         # Get DB session
         db = next(get_db())
         
         try:
             # Send welcome message
-            await websocket.send_json({
+            conn.send({
                 "type": "ai_message",
                 "content": "Hello! I'm your AI mental health support assistant. How can I help you today?",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
-            print(f"[WEBSOCKET] Welcome message sent to session {session_id}")
             
             while True:
-                data = await websocket.receive_json()
-                user_message = data.get("content", "")
-                user_name = data.get("user_name", "Anonymous")
+                data = await conn.receive()
+                with profiler.profile("ws_ai_chat", session_id=session_id):
+                    user_message = data.get("content", "")
+                    user_name = data.get("user_name", "Anonymous")
                 
-                print(f"[WEBSOCKET] Received message from {user_name}: {user_message[:50]}...")
+                    if sampled(logger):
+                        logger.debug("ai_chat.message_received", extra={
+                            "session_id": session_id, "length": len(user_message)
+                        })
                 
-                # Get current session state
-                current_state = ai_chat_manager.session_states.get(session_id, "IDLE")
+                    # Get current session state
+                    current_state = ai_chat_manager.session_states.get(session_id, "IDLE")
                 
-                # Check if user wants to book appointment AND hasn't already booked
-                if ai_chat_manager.detect_appointment_request(user_message) and current_state == "IDLE":
-                    print(f"[WEBSOCKET] Booking appointment for {user_name}")
-                    # AI creates appointment internally
-                    appointment_id = ai_chat_manager.create_appointment_from_ai(user_name, db)
+                    # Check if user wants to book appointment AND hasn't already booked
+                    if ai_chat_manager.detect_appointment_request(user_message) and current_state == "IDLE":
+                        # AI creates appointment internally
+                        if account is not None:
+                            appointment_id = await ai_chat_manager.create_appointment_from_ai(
+                                account.full_name, db, user_id=account.id
+                            )
+                        else:
+                            appointment_id = await ai_chat_manager.create_appointment_from_ai(user_name, db)
                     
-                    # Update session state to BOOKED
-                    ai_chat_manager.session_states[session_id] = "BOOKED"
+                        # Update session state to BOOKED
+                        ai_chat_manager.session_states[session_id] = "BOOKED"
                     
-                    # AI responds with confirmation - APPOINTMENT_BOOKED event
-                    await websocket.send_json({
-                        "type": "APPOINTMENT_BOOKED",
-                        "content": f"Perfect! I've scheduled an appointment for you. A therapist will be available soon.",
-                        "appointment_id": appointment_id,
-                        "timestamp": datetime.utcnow().isoformat()
-                    })
-                    print(f"[WEBSOCKET] Appointment created: {appointment_id}")
+                        # AI responds with confirmation - APPOINTMENT_BOOKED event
+                        conn.send({
+                            "type": "APPOINTMENT_BOOKED",
+                            "content": f"Perfect! I've scheduled an appointment for you. A therapist will be available soon.",
+                            "appointment_id": appointment_id,
+                            "timestamp": datetime.utcnow()
+                        })
+                        logger.info("ai_chat.appointment_booked", extra={
+                            "session_id": session_id, "appointment_id": appointment_id
+                        })
                     
-                    # RETURN immediately - don't continue processing
-                    continue
+                        # RETURN immediately - don't continue processing
+                        continue
                 
-                # If already booked, don't offer to book again
-                if current_state == "BOOKED":
-                    await websocket.send_json({
+                    # If already booked, don't offer to book again
+                    if current_state == "BOOKED":
+                        conn.send({
+                            "type": "ai_message",
+                            "content": "Your appointment has already been scheduled. You can close this chat and go to your appointments to connect with a therapist.",
+                            "timestamp": datetime.utcnow()
+                        })
+                        continue
+                
+                    # Normal AI response (only if not booked)
+                    ai_response = ai_chat_manager.generate_ai_response(user_message, session_id, user_name)
+                    conn.send({
                         "type": "ai_message",
-                        "content": "Your appointment has already been scheduled. You can close this chat and go to your appointments to connect with a therapist.",
-                        "timestamp": datetime.utcnow().isoformat()
+                        "content": ai_response,
+                        "timestamp": datetime.utcnow()
                     })
-                    continue
-                
-                # Normal AI response (only if not booked)
-                print(f"[WEBSOCKET] Generating AI response for session {session_id}")
-                ai_response = ai_chat_manager.generate_ai_response(user_message, session_id, user_name)
-                await websocket.send_json({
-                    "type": "ai_message",
-                    "content": ai_response,
-                    "timestamp": datetime.utcnow().isoformat()
-                })
-                print(f"[WEBSOCKET] AI response sent: {ai_response[:50]}...")
+                    if sampled(logger):
+                        logger.debug("ai_chat.response_sent", extra={
+                            "session_id": session_id, "length": len(ai_response)
+                        })
         
         except WebSocketDisconnect:
-            print(f"[WEBSOCKET] Client disconnected for session {session_id}")
-            ai_chat_manager.disconnect(session_id)
-        except Exception as e:
-            print(f"[WEBSOCKET ERROR] Error in message loop: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.info("ai_chat.disconnected", extra={"session_id": session_id})
+        except asyncio.TimeoutError:
+            logger.info("ai_chat.idle_timeout", extra={"session_id": session_id})
+            await conn.close(CLOSE_IDLE, "Idle timeout")
+        except Exception:
+            logger.exception("ai_chat.loop_failed", extra={"session_id": session_id})
         finally:
             db.close()
-            ai_chat_manager.disconnect(session_id)
+            conn.stop()
+            ai_chat_manager.disconnect(session_id, conn)
         
     except Exception as e:
-        print(f"[WEBSOCKET ERROR] Failed to accept connection: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ai_chat.accept_failed", extra={"session_id": session_id})
         try:
             await websocket.close(code=1011, reason=str(e))
         except:
@@ -970,6 +1285,43 @@ async def ai_chatbot_websocket(websocket: WebSocket, session_id: str):
 # APPOINTMENT CHAT WEBSOCKET (HUMAN ONLY - COMPLETELY ISOLATED)
 # ====================================================
 
+# How often each worker re-reads the status of appointments it has open sockets for,
+# so a session ended in another worker process is picked up (0 disables)
+APPOINTMENT_STATE_SYNC_SECONDS = float(os.getenv("APPOINTMENT_STATE_SYNC_SECONDS", "2"))
+# Recent message frames kept per open appointment for reconnect catch-up
+APPOINTMENT_REPLAY_BUFFER = int(os.getenv("APPOINTMENT_REPLAY_BUFFER", "200"))
+
+
+class AppointmentState:
+    """In-memory view of an appointment, shared by its user and therapist sockets."""
+
+    __slots__ = ("status", "user_id", "user_name", "therapist_name", "participants", "recent", "seq_floor")
+
+    def __init__(self, appointment: Appointment, last_seq: int):
+        self.status = appointment.status
+        self.user_id = appointment.user_id
+        self.user_name = appointment.user_name
+        self.therapist_name = appointment.therapist_name
+        self.participants: set = set()
+        # Ring buffer of recent message frames; it holds every message with seq > seq_floor
+        self.recent: deque = deque(maxlen=APPOINTMENT_REPLAY_BUFFER)
+        self.seq_floor = last_seq
+
+    def remember(self, frame: dict):
+        if self.recent.maxlen == 0:
+            self.seq_floor = frame["seq"]
+            return
+        if len(self.recent) == self.recent.maxlen:
+            self.seq_floor = self.recent[0]["seq"]
+        self.recent.append(frame)
+
+    def missed_since(self, last_seq: int) -> Optional[List[dict]]:
+        """Frames after last_seq from the ring buffer, or None if the buffer no longer covers that gap"""
+        if last_seq < self.seq_floor:
+            return None
+        return [frame for frame in self.recent if frame["seq"] > last_seq]
+
+
 class AppointmentChat:
     """
     HUMAN-ONLY APPOINTMENT CHAT MANAGER
@@ -981,25 +1333,146 @@ class AppointmentChat:
     
     def __init__(self):
         # Store one user and one therapist socket per appointment
-        self.connections: Dict[str, Dict[str, WebSocket]] = {}
+        self.connections: Dict[str, Dict[str, ChatConnection]] = {}
+        # Cached appointment state while at least one socket is open
+        self.states: Dict[str, AppointmentState] = {}
+        # Sockets still replaying in connect(): their state must survive the other party leaving
+        self._connecting: Dict[str, int] = {}
+        self._sync_task: Optional[asyncio.Task] = None
     
-    async def connect(self, appointment_id: str, role: str, websocket: WebSocket):
+    async def connect(
+        self, appointment_id: str, role: str, websocket: WebSocket,
+        appointment: Appointment, db: Session, last_seq: Optional[int] = None
+    ) -> Tuple[ChatConnection, AppointmentState]:
         await websocket.accept()
-        
+        conn = ChatConnection(websocket, on_evict=lambda c: self.disconnect(appointment_id, role, c))
+
+        # Refresh from the row the caller just loaded; both sockets share this object
+        state = self.states.get(appointment_id)
+        if state is None:
+            max_seq = db.query(func.max(Message.seq)).filter(Message.appointment_id == appointment_id).scalar()
+            state = self.states[appointment_id] = AppointmentState(appointment, max_seq or 0)
+        else:
+            state.status = appointment.status
+            state.therapist_name = appointment.therapist_name
+        state.participants.add(role)
+
+        # Reconnect: replay what was missed before going live. Repeat until nothing new
+        # arrived while we were sending, then register without awaiting in between so
+        # no live message can slip through the gap.
+        self._connecting[appointment_id] = self._connecting.get(appointment_id, 0) + 1
+        try:
+            if last_seq is not None:
+                while True:
+                    missed = state.missed_since(last_seq)
+                    if missed is None:
+                        missed = [
+                            self.message_frame(m) for m in _messages_after_seq(db, appointment_id, last_seq)
+                        ]
+                    if not missed:
+                        break
+                    for frame in missed:
+                        await conn.send_wait(frame)
+                    last_seq = missed[-1]["seq"]
+        except BaseException:
+            self._unpin(appointment_id)
+            state.participants.discard(role)
+            self._drop_state_if_unused(appointment_id)
+            raise
+        self._unpin(appointment_id)
+        # A same-role socket that closed during the replay removed the role
+        state.participants.add(role)
+
         if appointment_id not in self.connections:
             self.connections[appointment_id] = {}
-        
-        self.connections[appointment_id][role] = websocket
+
+        previous = self.connections[appointment_id].get(role)
+        self.connections[appointment_id][role] = conn
+        if previous is not None:
+            previous.evict(CLOSE_REPLACED, f"{role} reconnected on another socket")
+
+        self.start_state_sync()
+        return conn, state
+
+    @staticmethod
+    def message_frame(message: Message) -> dict:
+        return {
+            "type": "message",
+            "seq": message.seq,
+            "sender": message.sender,
+            "content": message.content,
+            "timestamp": message.timestamp
+        }
     
-    def disconnect(self, appointment_id: str, role: str):
+    def disconnect(self, appointment_id: str, role: str, conn: Optional[ChatConnection] = None):
+        # A reconnect may already have replaced this socket; only its own socket may remove it
+        if conn is not None and self.connections.get(appointment_id, {}).get(role) is not conn:
+            return
         if appointment_id in self.connections:
             if role in self.connections[appointment_id]:
                 del self.connections[appointment_id][role]
             if not self.connections[appointment_id]:
                 del self.connections[appointment_id]
+        state = self.states.get(appointment_id)
+        if state is not None:
+            state.participants.discard(role)
+        self._drop_state_if_unused(appointment_id)
+
+    def _unpin(self, appointment_id: str):
+        remaining = self._connecting.pop(appointment_id, 1) - 1
+        if remaining:
+            self._connecting[appointment_id] = remaining
+
+    def _drop_state_if_unused(self, appointment_id: str):
+        """Forget the cached state once no socket is open or still connecting"""
+        if appointment_id not in self.connections and appointment_id not in self._connecting:
+            self.states.pop(appointment_id, None)
+
+    def set_status(self, appointment_id: str, status: str):
+        """Update the cached status after this process changed it in the DB"""
+        state = self.states.get(appointment_id)
+        if state is not None:
+            state.status = status
+
+    def start_state_sync(self):
+        if APPOINTMENT_STATE_SYNC_SECONDS <= 0:
+            return
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_states())
+
+    async def stop_state_sync(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+    async def _sync_states(self):
+        """Pick up status changes made by other worker processes (one query per interval, not per message)"""
+        while True:
+            await asyncio.sleep(APPOINTMENT_STATE_SYNC_SECONDS)
+            if not self.states:
+                continue
+            db = ReadSessionLocal()
+            try:
+                rows = db.query(Appointment.id, Appointment.status, Appointment.therapist_name).filter(
+                    Appointment.id.in_(list(self.states.keys()))
+                ).all()
+            except Exception as e:
+                logger.warning("appointment_chat.state_sync_failed", extra={"error": str(e)})
+                continue
+            finally:
+                db.close()
+            for appointment_id, status, therapist_name in rows:
+                state = self.states.get(appointment_id)
+                if state is not None:
+                    state.status = status
+                    state.therapist_name = therapist_name
     
     async def broadcast_to_appointment(self, appointment_id: str, message: dict, sender_role: str):
-        """Send message to the other party in the appointment"""
+        """Send message to the other party in the appointment (queued; never waits on a slow client)"""
         if appointment_id not in self.connections:
             return
         
@@ -1007,16 +1480,107 @@ class AppointmentChat:
         target_role = "therapist" if sender_role == "user" else "user"
         
         if target_role in self.connections[appointment_id]:
-            await self.connections[appointment_id][target_role].send_json(message)
+            self.connections[appointment_id][target_role].send(message)
 
 appointment_chat_manager = AppointmentChat()
 
-@app.websocket("/ws/appointment-chat/{appointment_id}")
-async def appointment_chat_websocket(websocket: WebSocket, appointment_id: str, role: str = None):
+WEBSOCKET_CONNECTIONS.labels("ai_chat").set_function(lambda: len(ai_chat_manager.active_sessions))
+WEBSOCKET_CONNECTIONS.labels("appointment_chat").set_function(
+    lambda: sum(len(conns) for conns in appointment_chat_manager.connections.values())
+)
+message_writer = MessageWriter(chat_shards)
+# The emotion model is loaded on first use (or by the startup warm-up), not at import
+inference_server = InferenceServer()
+# appointment_id -> its latest session summary task (see _start_session_summary)
+session_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _summarize_session(appointment_id: str, ended_at: datetime, after: Optional[asyncio.Task]):
+    """Summarize once the appointment's messages still in the group-commit writer have landed.
+    Runs after the appointment's previous summary task, so the newest aggregate is the one saved."""
+    if after is not None:
+        await asyncio.wait([after])
+    await message_writer.flush(appointment_id)
+    await run_in_threadpool(summarize_session_job, chat_shards, db_writer, appointment_id, ended_at)
+
+
+def _session_summary_done(appointment_id: str, task: asyncio.Task):
+    if session_summary_tasks.get(appointment_id) is task:
+        del session_summary_tasks[appointment_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("session_summary.task_failed", exc_info=task.exception(),
+                     extra={"appointment_id": appointment_id})
+
+
+def _start_session_summary(appointment_id: str) -> asyncio.Task:
+    """(Re)compute the appointment's session summary in the background; the task is kept until done."""
+    task = asyncio.get_running_loop().create_task(_summarize_session(
+        appointment_id, datetime.utcnow(), session_summary_tasks.get(appointment_id)
+    ))
+    session_summary_tasks[appointment_id] = task
+    task.add_done_callback(partial(_session_summary_done, appointment_id))
+    return task
+
+
+async def _run_session_summary(appointment_id: str):
+    """BackgroundTasks entry point for the REST end-session path."""
+    await _start_session_summary(appointment_id)
+
+risk_tracker = RiskTrajectoryTracker(db_writer, in_use=lambda appointment_id: appointment_id in appointment_chat_manager.states)
+
+
+def _write_risk_notifications(alerts: List[dict]):
+    """Persist one therapist notification per (debounced) risk alert, in one write unit"""
+    def _write(w: Session):
+        for alert in alerts:
+            create_notification(
+                w, "therapist", "All Therapists",
+                f"{alert['risk_level'].capitalize()}-risk message",
+                f"Appointment {alert['appointment_id'][:8]}: {alert['risk_level']} risk detected ({alert['emotion_label']})"
+            )
+    db_writer.run(_write)
+
+risk_alert_pipeline = RiskAlertPipeline(notify=_write_risk_notifications)
+
+
+def _notify_assignment(db: Session, appointment: Appointment):
+    create_notification(
+        db, "user", appointment.user_name,
+        "Therapist Assigned",
+        f"{appointment.therapist_name} will join your session soon.",
+        recipient_id=appointment.user_id
+    )
+
+assignment_scheduler = AssignmentScheduler(ReadSessionLocal, db_writer, chat_shards, notify=_notify_assignment)
+ASSIGNMENT_QUEUE_DEPTH.set_function(assignment_scheduler.depth)
+
+async def shutdown_services():
+    """Flush chat messages still waiting for a group commit and stop background tasks"""
+    if session_summary_tasks:
+        await asyncio.wait(list(session_summary_tasks.values()))
+    await message_writer.stop()
+    await risk_tracker.stop()
+    await appointment_chat_manager.stop_state_sync()
+    await risk_alert_pipeline.stop()
+    await assignment_scheduler.stop()
+    await inference_server.stop()
+    # Last: the services above flush through them
+    await asyncio.get_running_loop().run_in_executor(None, chat_shards.stop)
+    await asyncio.get_running_loop().run_in_executor(None, db_writer.stop)
+
+@router.websocket("/ws/appointment-chat/{appointment_id}")
+async def appointment_chat_websocket(
+    websocket: WebSocket, appointment_id: str, role: str = None,
+    last_seq: Optional[int] = None, encoding: Optional[str] = None
+):
     """
     HUMAN-ONLY APPOINTMENT CHAT WEBSOCKET
     NO AI - PHYSICALLY IMPOSSIBLE
     ONLY RELAY BETWEEN USER AND THERAPIST
+
+    Reconnecting clients pass ?last_seq=N (highest seq they have seen) and get
+    every message after it replayed before live relay resumes.
+    ?encoding=msgpack selects compact binary frames (JSON by default).
     """
     
     # Validate role
@@ -1024,8 +1588,8 @@ async def appointment_chat_websocket(websocket: WebSocket, appointment_id: str,
         await websocket.close(code=1008, reason="Invalid or missing role parameter")
         return
     
-    # Get DB session
-    db = next(get_db())
+    # Read session on the appointment's chat shard (it sees the primary's tables too)
+    db = chat_shards.read_session(appointment_id)
     
     # Check if appointment exists
     appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
@@ -1034,133 +1598,435 @@ async def appointment_chat_websocket(websocket: WebSocket, appointment_id: str,
         db.close()
         return
     
-    await appointment_chat_manager.connect(appointment_id, role, websocket)
+    codec = negotiate_codec(websocket, encoding)
+    conn, state = await appointment_chat_manager.connect(appointment_id, role, websocket, appointment, db, last_seq)
+    trajectory = risk_tracker.load(db, appointment_id)
     
-    # Update appointment status to active
-    if appointment.status == "scheduled":
-        appointment.status = "active"
-        db.commit()
+    # End the setup transaction: an idle socket must not pin a pooled connection
+    db.rollback()
     
-    # Send notification when therapist joins
-    if role == "therapist":
-        create_notification(
-            db, "user", appointment.user_name,
-            "Therapist Joined",
-            "Your therapist has joined the session"
-        )
+    activate = appointment.status == "scheduled"
+    if activate or role == "therapist":
+        def _join(w: Session):
+            # Update appointment status to active
+            if activate:
+                _set_appointment_status(w, appointment_id, "active")
+            # Send notification when therapist joins
+            if role == "therapist":
+                create_notification(
+                    w, "user", state.user_name,
+                    "Therapist Joined",
+                    "Your therapist has joined the session",
+                    recipient_id=state.user_id
+                )
+
+        await db_writer.submit(_join)
+        if activate:
+            appointment_chat_manager.set_status(appointment_id, "active")
     
     try:
         # Send connection confirmation
-        await websocket.send_json({
+        conn.send({
             "type": "system",
             "content": f"Connected as {role}",
-            "timestamp": datetime.utcnow().isoformat()
+            "encoding": codec.name,
+            "timestamp": datetime.utcnow()
         })
+        if role == "therapist":
+            conn.send({"type": "risk_trend", "appointment_id": appointment_id, **trajectory.to_dict()})
         
         while True:
-            data = await websocket.receive_json()
-            
-            # Check for special commands
-            if data.get("type") == "END_SESSION":
-                # Therapist is ending the session
-                if role == "therapist":
-                    # Mark appointment as completed
-                    appointment.status = "completed"
-                    db.commit()
+            data = await conn.receive()
+            received_at = time.perf_counter()
+            with profiler.profile("ws_appointment_chat", appointment_id=appointment_id, role=role):
+                # Check for special commands
+                if data.get("type") == "END_SESSION":
+                    # Therapist is ending the session
+                    if role == "therapist":
+                        # Mark appointment as completed
+                        await db_writer.submit(lambda w: _set_appointment_status(w, appointment_id, "completed"))
+                        appointment_chat_manager.set_status(appointment_id, "completed")
+                        _start_session_summary(appointment_id)
                     
-                    # Broadcast SESSION_ENDED to both parties
-                    session_ended_event = {
-                        "type": "SESSION_ENDED",
-                        "message": "The therapist has ended the session.",
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
+                        # Broadcast SESSION_ENDED to both parties
+                        session_ended_event = {
+                            "type": "SESSION_ENDED",
+                            "message": "The therapist has ended the session.",
+                            "timestamp": datetime.utcnow()
+                        }
                     
-                    # Send to therapist
-                    await websocket.send_json(session_ended_event)
+                        # Send to therapist
+                        conn.send(session_ended_event)
                     
-                    # Send to user
-                    await appointment_chat_manager.broadcast_to_appointment(
-                        appointment_id,
-                        session_ended_event,
-                        role
-                    )
-                continue
+                        # Send to user
+                        await appointment_chat_manager.broadcast_to_appointment(
+                            appointment_id,
+                            session_ended_event,
+                            role
+                        )
+                    continue
             
-            content = data.get("content", "")
+                content = data.get("content", "")
             
-            if not content:
-                continue
+                if not content:
+                    continue
             
-            # SAFETY CHECK: Ignore messages if session is completed
-            current_appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
-            if current_appointment and current_appointment.status == "completed":
-                # Session ended - ignore message
-                await websocket.send_json({
-                    "type": "error",
-                    "message": "Cannot send messages - session has ended"
-                })
-                continue
+                # SAFETY CHECK: Ignore messages if session is completed (cached state, no DB read)
+                if state.status == "completed":
+                    # Session ended - ignore message
+                    conn.send({
+                        "type": "error",
+                        "message": "Cannot send messages - session has ended"
+                    })
+                    continue
             
-            # Save message + emotion_analysis in one transaction (mandatory)
-            message = Message(
-                id=str(uuid.uuid4()),
-                appointment_id=appointment_id,
-                sender=role,
-                content=content,
-                timestamp=datetime.utcnow()
-            )
-            db.add(message)
-            db.flush()  # get message.id before commit
+                # Save message + emotion_analysis in one transaction (mandatory).
+                # The group-commit writer batches pairs across appointments; submit()
+                # returns only once this pair is durable.
+                message = Message(
+                    id=str(uuid.uuid4()),
+                    appointment_id=appointment_id,
+                    sender=role,
+                    content=content,
+                    timestamp=datetime.utcnow()
+                )
 
-            try:
-                emotion_label, confidence_score, risk_level, risk_score, model_version = analyze_emotion(content)
-            except (ValueError, Exception) as e:
-                db.rollback()
-                await websocket.send_json({
-                    "type": "error",
-                    "message": "Message could not be processed. Please try again."
-                })
-                continue
+                try:
+                    analyze_started = time.perf_counter()
+                    emotion_label, confidence_score, risk_level, risk_score, model_version = (
+                        await inference_server.analyze(content)
+                    )
+                    ANALYZE_SECONDS.observe(time.perf_counter() - analyze_started)
+                except (ValueError, Exception) as e:
+                    conn.send({
+                        "type": "error",
+                        "message": "Message could not be processed. Please try again."
+                    })
+                    continue
 
-            emotion = EmotionAnalysis(
-                analysis_id=str(uuid.uuid4()),
-                message_id=message.id,
-                emotion_label=emotion_label,
-                confidence_score=confidence_score,
-                risk_level=risk_level,
-                risk_score=risk_score,
-                model_version=model_version,
-                analyzed_at=datetime.utcnow(),
-            )
-            db.add(emotion)
-            try:
-                db.commit()
-            except Exception:
-                db.rollback()
-                await websocket.send_json({
-                    "type": "error",
-                    "message": "Message could not be saved. Please try again."
-                })
-                continue
+                emotion = EmotionAnalysis(
+                    analysis_id=str(uuid.uuid4()),
+                    message_id=message.id,
+                    emotion_label=emotion_label,
+                    confidence_score=confidence_score,
+                    risk_level=risk_level,
+                    risk_score=risk_score,
+                    model_version=model_version,
+                    analyzed_at=datetime.utcnow(),
+                )
+                try:
+                    await message_writer.submit(message, emotion)
+                except Exception:
+                    conn.send({
+                        "type": "error",
+                        "message": "Message could not be saved. Please try again."
+                    })
+                    continue
+                if state.status == "completed":
+                    # Passed the status check before the session ended: the summary has to include it
+                    _start_session_summary(appointment_id)
+
+                # Acknowledge to the sender once durable (only if the client asked for it)
+                client_id = data.get("client_id")
+                if client_id:
+                    conn.send({
+                        "type": "ack",
+                        "client_id": client_id,
+                        "message_id": message.id,
+                        "seq": message.seq,
+                        "timestamp": message.timestamp
+                    })
 
-            # Broadcast to the other party
-            message_data = {
-                "type": "message",
-                "sender": role,
-                "content": content,
-                "timestamp": message.timestamp.isoformat()
-            }
-            await appointment_chat_manager.broadcast_to_appointment(
-                appointment_id,
-                message_data,
-                role
-            )
+                # Broadcast to the other party (and keep it for reconnect catch-up)
+                message_data = appointment_chat_manager.message_frame(message)
+                state.remember(message_data)
+                if role == "user":
+                    # The therapist's copy carries the updated trajectory; the replay buffer doesn't
+                    trajectory = risk_tracker.record(appointment_id, emotion_label, risk_level, risk_score, message.timestamp)
+                    if trajectory is not None:
+                        message_data = {**message_data, "risk_trend": trajectory.to_dict()}
+                await appointment_chat_manager.broadcast_to_appointment(
+                    appointment_id,
+                    message_data,
+                    role
+                )
+                MESSAGE_RELAY_SECONDS.observe(time.perf_counter() - received_at)
+
+                # Hand risky user messages to the alert pipeline (non-blocking, after the relay)
+                if role == "user" and risk_level in ALERT_RISK_LEVELS:
+                    assignment_scheduler.update_risk(appointment_id, risk_level)
+                    risk_alert_pipeline.publish({
+                        "appointment_id": appointment_id,
+                        "message_id": message.id,
+                        "seq": message.seq,
+                        "emotion_label": emotion_label,
+                        "risk_level": risk_level,
+                        "risk_score": risk_score,
+                        "timestamp": message.timestamp
+                    })
     
     except WebSocketDisconnect:
-        appointment_chat_manager.disconnect(appointment_id, role)
+        pass
+    except asyncio.TimeoutError:
+        await conn.close(CLOSE_IDLE, "Idle timeout")
     finally:
+        conn.stop()
+        appointment_chat_manager.disconnect(appointment_id, role, conn)
         db.close()
 
-@app.get("/")
+# ====================================================
+# RISK ALERTS (THERAPIST ONLY)
+# ====================================================
+
+@router.websocket("/ws/therapist-alerts")
+async def therapist_alerts_websocket(websocket: WebSocket, token: str = None, encoding: Optional[str] = None):
+    """
+    Live RISK_ALERT frames for medium/high-risk user messages.
+    Requires a therapist access token: /ws/therapist-alerts?token=<JWT>
+    """
+    payload = verify_token(token) if token else None
+    if not payload or payload.get("role") != "therapist":
+        await websocket.close(code=1008, reason="Therapist token required")
+        return
+
+    await websocket.accept()
+    negotiate_codec(websocket, encoding)
+    conn = ChatConnection(websocket, on_evict=risk_alert_pipeline.unsubscribe)
+    risk_alert_pipeline.subscribe(conn)
+    try:
+        conn.send({
+            "type": "system",
+            "content": "Subscribed to risk alerts",
+            "timestamp": datetime.utcnow()
+        })
+        # Nothing to process from the client besides heartbeats
+        while True:
+            await conn.receive()
+    except WebSocketDisconnect:
+        pass
+    except asyncio.TimeoutError:
+        await conn.close(CLOSE_IDLE, "Idle timeout")
+    finally:
+        conn.stop()
+        risk_alert_pipeline.unsubscribe(conn)
+
+@router.get("/alerts/stats")
+def get_alert_stats(current_therapist: Therapist = Depends(get_current_therapist)):
+    """Risk alert pipeline counters and commit-to-push latency (THERAPIST ONLY)"""
+    return risk_alert_pipeline.latency_stats()
+
+@router.get("/analysis/stats")
+def get_analysis_stats(current_therapist: Therapist = Depends(get_current_therapist)):
+    """Emotion model, micro-batch throughput / latency per batch size and fallbacks (THERAPIST ONLY)"""
+    return inference_server.stats()
+
+# ====================================================
+# THERAPIST ASSIGNMENT (THERAPIST ONLY)
+# ====================================================
+
+@router.websocket("/ws/therapist-assignments")
+async def therapist_assignments_websocket(websocket: WebSocket, token: str = None, encoding: Optional[str] = None):
+    """
+    Marks the therapist available to the assignment scheduler while connected and
+    pushes an ASSIGNMENT frame for every appointment it gives them.
+    Requires a therapist access token: /ws/therapist-assignments?token=<JWT>
+    """
+    payload = verify_token(token) if token else None
+    if not payload or payload.get("role") != "therapist":
+        await websocket.close(code=1008, reason="Therapist token required")
+        return
+    db = ReadSessionLocal()
+    try:
+        therapist = db.query(Therapist).filter(Therapist.username == payload.get("sub")).first()
+    finally:
+        db.close()
+    if therapist is None:
+        await websocket.close(code=1008, reason="Therapist not found")
+        return
+
+    await websocket.accept()
+    negotiate_codec(websocket, encoding)
+    conn = ChatConnection(websocket, on_evict=lambda c: assignment_scheduler.remove_therapist(therapist.id, c))
+    try:
+        conn.send({
+            "type": "system",
+            "content": "Available for new appointments",
+            "timestamp": datetime.utcnow()
+        })
+        assignment_scheduler.add_therapist(therapist.id, therapist.full_name, conn)
+        # Nothing to process from the client besides heartbeats
+        while True:
+            await conn.receive()
+    except WebSocketDisconnect:
+        pass
+    except asyncio.TimeoutError:
+        await conn.close(CLOSE_IDLE, "Idle timeout")
+    finally:
+        conn.stop()
+        assignment_scheduler.remove_therapist(therapist.id, conn)
+
+@router.post("/appointments/{appointment_id}/claim", response_model=AppointmentResponse)
+def claim_appointment_endpoint(
+    appointment_id: str,
+    current_therapist: Therapist = Depends(get_current_therapist),
+    db: Session = Depends(get_db)
+):
+    """Take an unassigned appointment; 409 if another therapist already has it (THERAPIST ONLY)"""
+    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+
+    def _claim(w: Session) -> Optional[Appointment]:
+        if not claim_appointment(w, appointment_id, current_therapist.id, current_therapist.full_name):
+            return None
+        claimed = w.query(Appointment).filter(Appointment.id == appointment_id).first()
+        _notify_assignment(w, claimed)
+        return claimed
+
+    claimed = db_writer.run(_claim)
+    if claimed is None:
+        ASSIGNMENT_CLAIM_CONFLICTS.labels("manual").inc()
+        raise HTTPException(status_code=409, detail="Appointment is already assigned or closed")
+    assignment_scheduler.discard(appointment_id)
+    return claimed
+
+@router.get("/assignments/stats")
+def get_assignment_stats(current_therapist: Therapist = Depends(get_current_therapist)):
+    """Assignment queue depth, available therapists and claim counters (THERAPIST ONLY)"""
+    return assignment_scheduler.stats()
+
+# ====================================================
+# PROFILING (THERAPIST ONLY)
+# ====================================================
+
+@router.get("/admin/profiling")
+def get_profiling(current_therapist: Therapist = Depends(get_current_therapist)):
+    """Profiling settings and counters (THERAPIST ONLY)"""
+    return profiler.settings()
+
+@router.put("/admin/profiling")
+def update_profiling(
+    update: ProfilingUpdate,
+    current_therapist: Therapist = Depends(get_current_therapist)
+):
+    """Turn request profiling on/off or change sampling at runtime (THERAPIST ONLY)"""
+    profiler.update(update.enabled, update.sample_rate, update.slow_ms)
+    return profiler.settings()
+
+# ====================================================
+# METRICS
+# ====================================================
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@router.get("/")
 def read_root():
     return {"message": "NeuroSupport-V2 Backend API", "status": "running"}
+
+# ====================================================
+# HEALTH CHECKS
+# ====================================================
+
+@router.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The process is up and its event loop is answering (runs on the loop, not the threadpool)"""
+    return {"status": "alive"}
+
+def _ping(db: Session) -> bool:
+    return db.execute(text("SELECT 1")).scalar() == 1
+
+@router.get("/health/ready", include_in_schema=False)
+def readiness(request: Request):
+    """503 until startup (migrations, model and Groq client warm-up) is done, while shutting down,
+    or when the primary database or a chat shard does not answer"""
+    checks = {"startup": request.app.state.ready}
+    try:
+        with ReadSessionLocal() as db:
+            checks["database"] = _ping(db)
+    except Exception:
+        logger.exception("health.database_failed")
+        checks["database"] = False
+    try:
+        checks["chat_shards"] = all(chat_shards.gather(_ping))
+    except Exception:
+        logger.exception("health.chat_shards_failed")
+        checks["chat_shards"] = False
+    ready = all(checks.values())
+    return JSONResponse({"status": "ready" if ready else "not_ready", "checks": checks},
+                        status_code=200 if ready else 503)
+
+# ====================================================
+# APPLICATION
+# ====================================================
+
+def migrate_databases():
+    """The schema step, as `python -m migrations` runs it: the primary, then the chat shard files"""
+    migrate(engine)
+    chat_shards.migrate()
+
+async def _warm_up(app: FastAPI):
+    """Load the emotion model and create the Groq client off the event loop, then report ready"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    model = await loop.run_in_executor(None, lambda: inference_server.model)
+    await loop.run_in_executor(None, lambda: ai_chat_manager.client)
+    app.state.ready = True
+    logger.info("startup.ready", extra={
+        "model_version": model.model_version, "warm_up_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: migrations (unless DB_AUTO_MIGRATE=0), background services, then the warm-up
+    in the background; requests are served meanwhile. Shutdown: drain and stop the services."""
+    if DB_AUTO_MIGRATE:
+        await asyncio.get_running_loop().run_in_executor(None, migrate_databases)
+    assignment_scheduler.start()
+    logger.info("startup", extra={"groq_enabled": ai_chat_manager.use_groq})
+    if not ai_chat_manager.use_groq:
+        logger.warning("groq.disabled", extra={
+            "hint": "GROQ_API_KEY not found; add it to backend/.env (no quotes)"
+        })
+    warm_up = asyncio.create_task(_warm_up(app))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        warm_up.cancel()
+        await shutdown_services()
+
+def create_app() -> FastAPI:
+    """The ASGI application: `uvicorn main:app`, or `uvicorn main:create_app --factory`.
+
+    Building it does no I/O; everything slow happens in the lifespan, and
+    /health/ready turns 200 once it has. The services it uses are module-level
+    singletons, so create one app per process.
+    """
+    app = FastAPI(title="NeuroSupport-V2 Backend", lifespan=lifespan)
+    app.state.ready = False
+    # Innermost, so the metrics and profiles include compression time
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(MetricsMiddleware)  # outermost of the two: profiling reads its per-request DB stats
+
+    # CORS – allow common dev ports so register/login work from any frontend port
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000", "http://localhost:3001", "http://localhost:3002",
+            "http://localhost:3003", "http://localhost:3004", "http://localhost:3005",
+            "http://127.0.0.1:3000", "http://127.0.0.1:3001", "http://127.0.0.1:3002",
+            "http://127.0.0.1:3003", "http://127.0.0.1:3004", "http://127.0.0.1:3005",
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
+
+app = create_app()
@@ -0,0 +1,257 @@
+"""
+Lightweight schema migrations for existing SQLite databases.
+Base.metadata.create_all() only creates missing tables; columns and indexes
+added to existing tables afterwards are applied here. Every step is idempotent.
+
+Schema changes are an explicit step, not a side effect of importing the app.
+Run from backend/ before starting (or upgrading) the server:
+    python -m migrations
+The server also runs it on startup unless DB_AUTO_MIGRATE=0; with several
+workers set that and run the command once, so they don't race on the DDL.
+"""
+import argparse
+import json
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from logging_config import get_logger
+
+logger = get_logger("migrations")
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def add_message_seq(conn):
+    """messages.seq: per-appointment monotonic sequence number used for resumable delivery."""
+    if not _has_column(conn, "messages", "seq"):
+        conn.execute(text("ALTER TABLE messages ADD COLUMN seq INTEGER"))
+        # Backfill existing history in timestamp order
+        conn.execute(text("""
+            UPDATE messages SET seq = (
+                SELECT r.rn FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY appointment_id ORDER BY timestamp, id
+                    ) AS rn FROM messages
+                ) AS r WHERE r.id = messages.id
+            )
+        """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_messages_appointment_seq ON messages (appointment_id, seq)"
+    ))
+
+
+def add_appointment_owner_ids(conn):
+    """appointments.user_id / therapist_id and notifications.recipient_id, backfilled from display names.
+
+    A name is only resolved when exactly one account has it; ambiguous rows stay NULL
+    rather than being handed to the wrong person.
+    """
+    if not _has_column(conn, "appointments", "user_id"):
+        conn.execute(text("ALTER TABLE appointments ADD COLUMN user_id VARCHAR REFERENCES users(id)"))
+        conn.execute(text("""
+            UPDATE appointments SET user_id = (
+                SELECT u.id FROM users u WHERE u.full_name = appointments.user_name
+            )
+            WHERE (SELECT COUNT(*) FROM users u WHERE u.full_name = appointments.user_name) = 1
+        """))
+        unresolved = conn.execute(text(
+            "SELECT COUNT(*) FROM appointments WHERE user_id IS NULL"
+        )).scalar()
+        if unresolved:
+            logger.warning("migration.unresolved_appointment_owners", extra={"appointments": unresolved})
+    if not _has_column(conn, "appointments", "therapist_id"):
+        conn.execute(text("ALTER TABLE appointments ADD COLUMN therapist_id VARCHAR REFERENCES therapists(id)"))
+        conn.execute(text("""
+            UPDATE appointments SET therapist_id = (
+                SELECT t.id FROM therapists t WHERE t.full_name = appointments.therapist_name
+            )
+            WHERE therapist_name IS NOT NULL
+              AND (SELECT COUNT(*) FROM therapists t WHERE t.full_name = appointments.therapist_name) = 1
+        """))
+    if not _has_column(conn, "notifications", "recipient_id"):
+        conn.execute(text("ALTER TABLE notifications ADD COLUMN recipient_id VARCHAR"))
+        conn.execute(text("""
+            UPDATE notifications SET recipient_id = (
+                SELECT u.id FROM users u WHERE u.full_name = notifications.recipient_name
+            )
+            WHERE recipient_role = 'user'
+              AND (SELECT COUNT(*) FROM users u WHERE u.full_name = notifications.recipient_name) = 1
+        """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_user_created ON appointments (user_id, created_at)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_therapist_created ON appointments (therapist_id, created_at)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_recipient_created "
+        "ON notifications (recipient_role, recipient_id, created_at)"
+    ))
+
+
+def add_message_search_index(conn):
+    """messages_fts: FTS5 index over messages.content, kept in sync by triggers.
+
+    External-content table keyed by the messages rowid, so the text is not stored twice.
+    Skipped (search disabled) if this SQLite build has no FTS5.
+    """
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    )).first()
+    if not exists:
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE messages_fts USING fts5("
+                "content, content='messages', content_rowid='rowid', tokenize='porter unicode61')"
+            ))
+        except OperationalError as e:
+            logger.warning("migration.fts5_unavailable", extra={"error": str(e)})
+            return
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+        END
+    """))
+
+
+def add_appointment_queue_indexes(conn):
+    """Indexes behind the therapist appointment queue's keyset pages."""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_queue_status "
+        "ON appointments (status, created_at, id, created_from, therapist_name)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_queue_created "
+        "ON appointments (created_at, id, status, created_from, therapist_name)"
+    ))
+
+
+def _cache_version_triggers(conn, table: str, scopes, name: Optional[str] = None):
+    """AFTER INSERT / UPDATE / DELETE triggers on `table` bumping each scope (SQL over NEW / OLD).
+
+    `name` tells a later set of triggers on the same table apart from the first one.
+    """
+    prefix = f"cache_versions_{table}_{name}" if name else f"cache_versions_{table}"
+    for suffix, event, rows in (("ai", "INSERT", ("NEW",)), ("au", "UPDATE", ("OLD", "NEW")),
+                                ("ad", "DELETE", ("OLD",))):
+        bumps = "".join(
+            f"""
+            INSERT INTO cache_versions (scope, version)
+                SELECT scope, 1 FROM (SELECT {scope.format(row=row)} AS scope) WHERE scope IS NOT NULL
+                ON CONFLICT (scope) DO UPDATE SET version = version + 1;"""
+            for row in rows for scope in scopes
+        )
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {prefix}_{suffix} AFTER {event} ON {table} BEGIN{bumps}\nEND"
+        ))
+
+
+def add_chat_cache_versions(conn):
+    """cache_versions: per-scope change counters behind the read endpoints' ETags (services/http_cache.py).
+
+    Triggers bump them in the same transaction as the write, whoever makes it
+    (server, CLI jobs, other workers). Chat tables only, so it also runs on chat shards.
+    """
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS cache_versions (scope VARCHAR PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID"
+    ))
+    _cache_version_triggers(conn, "messages", ("'appointment:' || {row}.appointment_id",))
+    _cache_version_triggers(conn, "emotion_analysis", (
+        "'appointment:' || (SELECT appointment_id FROM messages WHERE id = {row}.message_id)",
+    ))
+    _cache_version_triggers(conn, "session_notes", ("'session_notes'",))
+
+
+def add_cache_versions(conn):
+    """cache_versions for the primary database: chat tables plus appointments, summaries and notifications."""
+    add_chat_cache_versions(conn)
+    _cache_version_triggers(conn, "appointments", ("'user:' || {row}.user_id", "'appointments'"))
+    _cache_version_triggers(conn, "session_summaries", (
+        "'user:' || (SELECT user_id FROM appointments WHERE id = {row}.appointment_id)",
+    ))
+    _cache_version_triggers(conn, "notifications", (
+        "'notifications:' || CASE {row}.recipient_role WHEN 'user' THEN 'user:' || {row}.recipient_id "
+        "ELSE {row}.recipient_role END",
+    ))
+
+
+def add_unowned_cache_versions(conn):
+    """Scopes by display name for rows with no owning account (name ambiguous when they were written),
+    and the index that lists those appointments by name.
+
+    Users still see those rows by name (main._user_appointments, main._is_owner),
+    so their ETags have to change with them.
+    """
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_user_name_created ON appointments (user_name, created_at)"
+    ))
+    _cache_version_triggers(conn, "appointments", (
+        "CASE WHEN {row}.user_id IS NULL THEN 'user_name:' || {row}.user_name END",
+    ), name="unowned")
+    _cache_version_triggers(conn, "session_summaries", (
+        "(SELECT 'user_name:' || user_name FROM appointments WHERE id = {row}.appointment_id AND user_id IS NULL)",
+    ), name="unowned")
+    _cache_version_triggers(conn, "notifications", (
+        "CASE WHEN {row}.recipient_role = 'user' AND {row}.recipient_id IS NULL "
+        "THEN 'notifications:user_name:' || {row}.recipient_name END",
+    ), name="unowned")
+
+
+MIGRATIONS = [
+    add_message_seq,
+    add_appointment_owner_ids,
+    add_message_search_index,
+    add_appointment_queue_indexes,
+    add_cache_versions,
+    add_unowned_cache_versions,
+]
+
+
+def run_migrations(engine):
+    """Apply all migrations in order, in one transaction."""
+    with engine.begin() as conn:
+        for migration in MIGRATIONS:
+            migration(conn)
+
+
+def migrate(engine):
+    """Create missing tables, then apply MIGRATIONS: the whole schema step for the primary database."""
+    from database import Base
+    import models  # noqa: F401  (registers the tables on Base.metadata)
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def main(argv: Optional[List[str]] = None):
+    from database import SQLALCHEMY_DATABASE_URL, engine
+    from logging_config import configure_logging
+    from services.chat_shards import open_chat_shards
+
+    configure_logging()
+    argparse.ArgumentParser(description="Create and migrate the primary database and the chat shards").parse_args(argv)
+
+    migrate(engine)
+    shards = open_chat_shards()
+    shards.migrate()
+    print(json.dumps({"database": SQLALCHEMY_DATABASE_URL, "chat_shards": [shard.url for shard in shards.shards]}))
+
+
+if __name__ == "__main__":
+    main()
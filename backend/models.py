@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Text, Float, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Text, Float, Integer, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -16,10 +16,23 @@ RISK_LEVELS = ("low", "medium", "high")
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Per-user / per-therapist listings ordered by creation time
+        Index("ix_appointments_user_created", "user_id", "created_at"),
+        Index("ix_appointments_therapist_created", "therapist_id", "created_at"),
+        # Unowned appointments listed by display name (main._user_appointments)
+        Index("ix_appointments_user_name_created", "user_name", "created_at"),
+        # Therapist queue (services/appointment_queue.py): keyset order first, the other
+        # filter columns trailing so they are checked in the index before any row lookup
+        Index("ix_appointments_queue_status", "status", "created_at", "id", "created_from", "therapist_name"),
+        Index("ix_appointments_queue_created", "created_at", "id", "status", "created_from", "therapist_name"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    user_name = Column(String, nullable=False)
-    therapist_name = Column(String, nullable=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    therapist_id = Column(String, ForeignKey("therapists.id"), nullable=True)
+    user_name = Column(String, nullable=False)  # display name
+    therapist_name = Column(String, nullable=True)  # display name
     status = Column(String, default="scheduled")  # scheduled | active | completed
     created_from = Column(String, nullable=False)  # "ai" | "manual"
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -29,9 +42,14 @@ class Appointment(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Range lookups for missed-message catch-up: WHERE appointment_id = ? AND seq > ?
+        Index("ix_messages_appointment_seq", "appointment_id", "seq", unique=True),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     appointment_id = Column(String, ForeignKey("appointments.id"), nullable=False)
+    seq = Column(Integer, nullable=True)  # per-appointment, monotonic; assigned at commit
     sender = Column(String, nullable=False)  # "user" | "therapist"
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -70,11 +88,59 @@ class EmotionAnalysis(Base):
     message = relationship("Message", back_populates="emotion_analysis")
 
 
+class ArchivedAppointment(Base):
+    """Offset index into the message archive (services/archive.py): one frame per archived appointment."""
+    __tablename__ = "archived_appointments"
+
+    appointment_id = Column(String, ForeignKey("appointments.id"), primary_key=True)
+    segment = Column(String, nullable=False)  # segment file name inside ARCHIVE_DIR
+    byte_offset = Column(Integer, nullable=False)
+    byte_length = Column(Integer, nullable=False)
+    codec = Column(String(8), nullable=False)  # "zstd" | "zlib"
+    checksum = Column(Integer, nullable=False)  # crc32 of the compressed frame
+    message_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AppointmentRiskState(Base):
+    """Rolling risk trajectory of an appointment's user messages (services/risk_trajectory.py)."""
+    __tablename__ = "appointment_risk_state"
+
+    appointment_id = Column(String, ForeignKey("appointments.id"), primary_key=True)
+    ewma_risk = Column(Float, nullable=False)  # exponentially weighted risk_score
+    message_count = Column(Integer, nullable=False)
+    emotion_counts = Column(JSON, nullable=False)  # {"anxiety": 3, ...}
+    last_high_risk_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SessionSummary(Base):
+    """Materialized at session end (services/session_summary.py); dashboards read these instead of messages."""
+    __tablename__ = "session_summaries"
+
+    appointment_id = Column(String, ForeignKey("appointments.id"), primary_key=True)
+    started_at = Column(DateTime, nullable=False)  # first message (appointment creation if none)
+    ended_at = Column(DateTime, nullable=False)
+    user_message_count = Column(Integer, nullable=False)
+    therapist_message_count = Column(Integer, nullable=False)
+    emotion_counts = Column(JSON, nullable=False)  # user messages: {"anxiety": 3, ...}
+    risk_level_counts = Column(JSON, nullable=False)  # user messages: {"low": 5, "medium": 2, "high": 0}
+    high_risk_count = Column(Integer, nullable=False)  # high-risk messages from either sender
+    avg_risk_score = Column(Float, nullable=False)  # user messages
+    peak_risk_score = Column(Float, nullable=False)
+    peak_risk_level = Column(String(16), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_recipient_created", "recipient_role", "recipient_id", "created_at"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     recipient_role = Column(String, nullable=False)  # "user" | "therapist"
+    recipient_id = Column(String, nullable=True)  # users.id / therapists.id; NULL for broadcasts
     recipient_name = Column(String, nullable=False)
     title = Column(String, nullable=False)
     message = Column(String, nullable=False)
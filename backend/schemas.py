@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime, timezone
+from typing import Dict, Optional, List, Literal
 
 class AppointmentCreate(BaseModel):
     user_name: str
@@ -9,6 +9,8 @@ class AppointmentCreate(BaseModel):
 
 class AppointmentResponse(BaseModel):
     id: str
+    user_id: Optional[str] = None
+    therapist_id: Optional[str] = None
     user_name: str
     therapist_name: Optional[str]
     status: str
@@ -21,6 +23,7 @@ class AppointmentResponse(BaseModel):
 class MessageResponse(BaseModel):
     id: str
     appointment_id: str
+    seq: Optional[int] = None
     sender: str
     content: str
     timestamp: datetime
@@ -63,6 +66,22 @@ class SessionNoteResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AppointmentQueuePage(BaseModel):
+    items: List[AppointmentResponse]
+    # Pass as `cursor` for the next (older) page; null on the last page
+    next_cursor: Optional[str]
+    # Newest item seen so far; pass as `newer_than` to poll for new items
+    head_cursor: Optional[str]
+
+class RiskTrajectoryResponse(BaseModel):
+    appointment_id: str
+    ewma_risk: float
+    trend: Literal["rising", "falling", "steady"]
+    message_count: int
+    emotion_counts: Dict[str, int]
+    last_high_risk_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
 # Authentication Schemas
 class UserRegister(BaseModel):
     username: str
@@ -125,3 +144,74 @@ class AnalyticsResponse(BaseModel):
     total_session_notes: int
     appointments_by_day: List[dict]
     recent_appointments: List[AppointmentResponse]
+
+# Bulk Import Schemas (one NDJSON record per line)
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC (datetime.utcnow()): convert ones with an offset."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class AppointmentImport(BaseModel):
+    type: Literal["appointment"]
+    id: str
+    user_name: str
+    user_id: Optional[str] = None
+    therapist_name: Optional[str] = None
+    therapist_id: Optional[str] = None
+    status: Literal["scheduled", "active", "completed"] = "completed"
+    created_from: Literal["ai", "manual"] = "manual"
+    created_at: Optional[datetime] = None
+
+    _created_at_utc = field_validator("created_at")(naive_utc)
+
+class MessageImport(BaseModel):
+    type: Literal["message"]
+    id: str
+    appointment_id: str
+    sender: Literal["user", "therapist"]
+    content: str = Field(..., min_length=1)
+    timestamp: datetime
+
+    _timestamp_utc = field_validator("timestamp")(naive_utc)
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    appointments_inserted: int
+    appointments_skipped: int
+    messages_inserted: int
+    messages_skipped: int
+    rejected: int
+    errors: List[ImportRowError]
+    seconds: float
+    rows_per_second: float
+
+# Search Schemas
+class MessageSearchHit(BaseModel):
+    message_id: str
+    appointment_id: str
+    seq: Optional[int]
+    sender: str
+    timestamp: datetime
+    highlight: str
+    score: float
+    emotion_label: Optional[str]
+    risk_level: Optional[str]
+
+class MessageSearchResponse(BaseModel):
+    query: str
+    limit: int
+    offset: int
+    has_more: bool
+    results: List[MessageSearchHit]
+    # Archived appointments in scope: their messages are not indexed, so they are not searched
+    archived_not_searched: int = 0
+
+# Profiling Schemas
+class ProfilingUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_ms: Optional[float] = Field(None, ge=0)
@@ -1 +1,2 @@
 # Services package
+import env  # noqa: F401  (service settings are read from the environment at import)
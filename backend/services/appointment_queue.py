@@ -0,0 +1,122 @@
+"""
+Therapist appointment queue: newest-first keyset pages over appointments with
+server-side filters, plus a "new item" signal for long-polling clients.
+
+Pages are addressed by an opaque cursor encoding the (created_at, id) of the
+last row returned, so every page is an index range scan of `limit` rows no
+matter how much history precedes it (see ix_appointments_queue_* in models.py).
+"""
+import asyncio
+import base64
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from models import Appointment
+
+QUEUE_MAX_LIMIT = 200
+# Longest a long-poll request may wait for new items
+QUEUE_MAX_WAIT_SECONDS = float(os.getenv("QUEUE_MAX_WAIT_SECONDS", "30"))
+# Long-poll re-check interval, for appointments created by other worker processes
+QUEUE_RECHECK_SECONDS = float(os.getenv("QUEUE_RECHECK_SECONDS", "2"))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(appointment: Appointment) -> str:
+    raw = f"{appointment.created_at.isoformat()}|{appointment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, appointment_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), appointment_id
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def queue_query(
+    db: Session,
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    unassigned: bool = False,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    query = db.query(Appointment)
+    if status:
+        query = query.filter(Appointment.status == status)
+    if created_from:
+        query = query.filter(Appointment.created_from == created_from)
+    if unassigned:
+        query = query.filter(Appointment.therapist_name.is_(None))
+    if date_from:
+        query = query.filter(Appointment.created_at >= date_from)
+    if date_to:
+        query = query.filter(Appointment.created_at < date_to)
+    return query
+
+
+def older_page(query, cursor: Optional[str], limit: int) -> Tuple[List[Appointment], Optional[str]]:
+    """Up to `limit` rows older than `cursor` (newest first) and the cursor for the next page, if any."""
+    key = tuple_(Appointment.created_at, Appointment.id)
+    if cursor:
+        query = query.filter(key < decode_cursor(cursor))
+    rows = query.order_by(Appointment.created_at.desc(), Appointment.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def newer_items(query, cursor: str, limit: int) -> List[Appointment]:
+    """Up to `limit` rows created after `cursor`, oldest of them first so callers can page forward."""
+    key = tuple_(Appointment.created_at, Appointment.id)
+    return query.filter(key > decode_cursor(cursor)).order_by(
+        Appointment.created_at.asc(), Appointment.id.asc()
+    ).limit(limit).all()
+
+
+class QueueSignal:
+    """Wakes long-polling queue readers when this process creates or updates an appointment.
+
+    Other worker processes don't see the signal, so waiters also re-check the
+    database every `recheck_seconds`.
+    """
+
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def notify(self):
+        """Safe to call from sync endpoints running in the threadpool."""
+        event, loop = self._event, self._loop
+        if event is None:
+            return
+        self._event = None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            event.set()
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, timeout: float):
+        if self._event is None:
+            self._event = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+queue_signal = QueueSignal()
@@ -0,0 +1,292 @@
+"""
+Cold storage for the messages of completed appointments.
+archive_completed() moves the messages (and their emotion_analysis rows) of
+appointments completed more than ARCHIVE_AFTER_DAYS ago out of the hot tables
+into append-only segment files. Each appointment becomes one compressed NDJSON
+frame (zstd when the zstandard package is installed, zlib otherwise) and the
+archived_appointments table is the offset index into the segments. Reads
+memory-map the segment and decompress only that appointment's frame.
+Messages are read from the appointment's chat shard (services/chat_shards.py)
+and the index lives in the primary: the index row is committed before the hot
+rows are deleted, and a run first finishes any move an earlier run left half done.
+
+CLI (run from backend/, one job at a time):
+    python -m services.archive [--older-than-days 90] [--limit 500]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from models import Appointment, ArchivedAppointment, Message, EmotionAnalysis, SessionSummary
+from services.chat_shards import ChatShard, ChatShards, open_chat_shards
+from services.metrics import FSYNC_SECONDS
+from services.session_summary import save_session_summary, session_summary_values
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib is used when zstandard is not installed
+    zstandard = None
+
+logger = get_logger("archive")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", str(256 * 1024 * 1024)))
+ARCHIVE_BATCH_LIMIT = 500
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})\.seg$")
+
+ARCHIVE_FIELDS = (
+    ("id", Message.id),
+    ("seq", Message.seq),
+    ("sender", Message.sender),
+    ("content", Message.content),
+    ("timestamp", Message.timestamp),
+    ("emotion_label", EmotionAnalysis.emotion_label),
+    ("confidence_score", EmotionAnalysis.confidence_score),
+    ("risk_level", EmotionAnalysis.risk_level),
+    ("risk_score", EmotionAnalysis.risk_score),
+    ("model_version", EmotionAnalysis.model_version),
+    ("analyzed_at", EmotionAnalysis.analyzed_at),
+)
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Archive frame is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+class SegmentStore:
+    """Append-only segment files with memory-mapped reads."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, max_bytes: int = ARCHIVE_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _current_segment(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        numbers = sorted(int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if m)
+        if numbers:
+            latest = f"segment-{numbers[-1]:06d}.seg"
+            if os.path.getsize(self._path(latest)) < self.max_bytes:
+                return latest
+        return f"segment-{(numbers[-1] + 1) if numbers else 1:06d}.seg"
+
+    def append(self, frame: bytes) -> Tuple[str, int]:
+        """Write one frame durably; returns (segment, byte offset)."""
+        segment = self._current_segment()
+        with open(self._path(segment), "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(frame)
+            f.flush()
+            started = time.perf_counter()
+            os.fsync(f.fileno())
+            FSYNC_SECONDS.labels("archive").observe(time.perf_counter() - started)
+        return segment, offset
+
+    def read(self, segment: str, offset: int, length: int) -> bytes:
+        with self._lock:
+            mapped = self._maps.get(segment)
+            # The newest segment keeps growing; remap when the frame lies past the old mapping
+            if mapped is None or offset + length > len(mapped):
+                if mapped is not None:
+                    mapped.close()
+                with open(self._path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped[offset:offset + length]
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+segment_store = SegmentStore()
+
+
+def read_archived_messages(db: Session, appointment_id: str, store: SegmentStore = segment_store) -> List[dict]:
+    """Archived messages of an appointment in seq order ([] if it has not been archived)."""
+    entry = db.get(ArchivedAppointment, appointment_id)
+    if entry is None:
+        return []
+    frame = store.read(entry.segment, entry.byte_offset, entry.byte_length)
+    if zlib.crc32(frame) != entry.checksum:
+        raise RuntimeError(f"Archive frame for appointment {appointment_id} is corrupt")
+    records = []
+    for line in _decompress(entry.codec, frame).splitlines():
+        record = json.loads(line)
+        record["appointment_id"] = appointment_id
+        records.append(record)
+    return records
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+
+def archivable_appointments(db: Session, older_than_days: int, limit: int) -> List[str]:
+    """Completed, not yet archived appointments whose last message is older than the cutoff."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    last_activity = func.max(Message.timestamp)
+    stmt = (
+        select(Appointment.id)
+        .join(Message, Message.appointment_id == Appointment.id)
+        .outerjoin(ArchivedAppointment, ArchivedAppointment.appointment_id == Appointment.id)
+        .where(Appointment.status == "completed", ArchivedAppointment.appointment_id.is_(None))
+        .group_by(Appointment.id)
+        .having(last_activity < cutoff)
+        .order_by(last_activity)
+        .limit(limit)
+    )
+    return list(db.execute(stmt).scalars())
+
+
+def archive_appointment(db: Session, shard: ChatShard, appointment_id: str, store: SegmentStore = segment_store) -> int:
+    """Move one appointment's messages from its shard into the archive. Returns the number of messages moved."""
+    chat_db = shard.read_session_factory()
+    try:
+        rows = chat_db.execute(
+            select(*[column for _, column in ARCHIVE_FIELDS])
+            .select_from(Message)
+            .outerjoin(EmotionAnalysis, EmotionAnalysis.message_id == Message.id)
+            .where(Message.appointment_id == appointment_id)
+            .order_by(Message.seq, Message.timestamp)
+        ).all()
+        if not rows:
+            return 0
+        # Dashboards read the summary; after this the messages are no longer there to aggregate
+        summary = None
+        if chat_db.query(SessionSummary.appointment_id).filter(SessionSummary.appointment_id == appointment_id).first() is None:
+            summary = session_summary_values(chat_db, appointment_id)
+    finally:
+        chat_db.close()
+
+    payload = "".join(
+        json.dumps(dict(zip((name for name, _ in ARCHIVE_FIELDS), row)), default=_json_default) + "\n"
+        for row in rows
+    ).encode("utf-8")
+    codec, frame = _compress(payload)
+    # The frame is on disk before the hot rows go; if the commit fails it is just unreferenced bytes
+    segment, offset = store.append(frame)
+
+    if summary is not None:
+        save_session_summary(db, summary)
+    db.add(ArchivedAppointment(
+        appointment_id=appointment_id,
+        segment=segment,
+        byte_offset=offset,
+        byte_length=len(frame),
+        codec=codec,
+        checksum=zlib.crc32(frame),
+        message_count=len(rows),
+    ))
+    db.commit()
+    _delete_hot_rows(shard, [appointment_id])
+    return len(rows)
+
+
+def _delete_hot_rows(shard: ChatShard, appointment_ids: List[str]):
+    chat_db = shard.session_factory()
+    try:
+        message_ids = select(Message.id).where(Message.appointment_id.in_(appointment_ids))
+        chat_db.execute(delete(EmotionAnalysis).where(EmotionAnalysis.message_id.in_(message_ids)))
+        chat_db.execute(delete(Message).where(Message.appointment_id.in_(appointment_ids)))
+        chat_db.commit()
+    finally:
+        chat_db.close()
+
+
+def finish_interrupted(shard: ChatShard) -> int:
+    """Delete hot rows of appointments that are already archived (a run stopped between the two commits)."""
+    chat_db = shard.read_session_factory()
+    try:
+        leftover = list(chat_db.execute(
+            select(Message.appointment_id).distinct()
+            .join(ArchivedAppointment, ArchivedAppointment.appointment_id == Message.appointment_id)
+        ).scalars())
+    finally:
+        chat_db.close()
+    if leftover:
+        _delete_hot_rows(shard, leftover)
+    return len(leftover)
+
+
+def archive_completed(
+    db: Session,
+    shards: ChatShards,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    limit: int = ARCHIVE_BATCH_LIMIT,
+    store: SegmentStore = segment_store,
+) -> dict:
+    """Archive up to `limit` eligible appointments per shard, one move each."""
+    appointments = messages = failed = 0
+    for shard in shards.shards:
+        finish_interrupted(shard)
+        chat_db = shard.read_session_factory()
+        try:
+            candidates = archivable_appointments(chat_db, older_than_days, limit)
+        finally:
+            chat_db.close()
+        for appointment_id in candidates:
+            try:
+                messages += archive_appointment(db, shard, appointment_id, store)
+                appointments += 1
+            except Exception:
+                db.rollback()
+                failed += 1
+                logger.exception("archive.appointment_failed", extra={"appointment_id": appointment_id})
+    return {"appointments": appointments, "messages": messages, "failed": failed}
+
+
+def main(argv: Optional[List[str]] = None):
+    from database import SessionLocal
+    from logging_config import configure_logging
+
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description="Archive messages of completed appointments")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--limit", type=int, default=ARCHIVE_BATCH_LIMIT)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(archive_completed(db, open_chat_shards(), args.older_than_days, args.limit)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
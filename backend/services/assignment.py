@@ -0,0 +1,333 @@
+"""
+Therapist assignment scheduler.
+Unassigned appointments wait in an in-process priority queue ordered by the
+user's latest emotion_analysis risk level (high first), then by how long they
+have waited. Therapists connected to /ws/therapist-assignments are available; a
+background task hands the next appointment to the least-loaded of them and
+pushes an ASSIGNMENT frame to their socket.
+
+Every claim is a conditional UPDATE (... WHERE therapist_id IS NULL AND
+therapist_name IS NULL), so two therapists - or two worker processes - never
+take the same appointment; whoever loses the race moves on to the next entry.
+Claims run as write units on the single database writer (services/db_writer.py);
+queue scans and load counts use a read-only session, and risk levels are read
+from the chat shards (services/chat_shards.py).
+Appointments created by other workers are picked up by a periodic rescan.
+"""
+import asyncio
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from models import Appointment, EmotionAnalysis, Message
+from services.chat_shards import ChatShards
+from services.db_writer import DatabaseWriter
+from services.metrics import ASSIGNMENT_CLAIM_CONFLICTS, ASSIGNMENT_WAIT_SECONDS
+from services.ws_connection import ChatConnection, CLOSE_REPLACED
+
+logger = get_logger("assignment")
+
+# Most scheduled + active appointments a therapist is given by the scheduler
+ASSIGNMENT_MAX_ACTIVE = int(os.getenv("ASSIGNMENT_MAX_ACTIVE", "3"))
+# How often the backlog is re-read from the database and capacity re-checked
+ASSIGNMENT_RESCAN_SECONDS = float(os.getenv("ASSIGNMENT_RESCAN_SECONDS", "10"))
+
+# Users with no analysed messages yet queue as low risk
+RISK_PRIORITY = {"high": 0, "medium": 1, "low": 2}
+RISK_BY_PRIORITY = {v: k for k, v in RISK_PRIORITY.items()}
+OPEN_STATUSES = ("scheduled", "active")
+
+
+def latest_risk_level(shards: ChatShards, appointment_id: str, user_id: Optional[str]) -> Optional[str]:
+    """Risk level of the user's most recent analysed message, across all their appointments (and shards)."""
+    def latest(db: Session) -> Optional[Tuple[datetime, str]]:
+        query = db.query(Message.timestamp, EmotionAnalysis.risk_level).join(
+            Message, Message.id == EmotionAnalysis.message_id
+        ).filter(Message.sender == "user")
+        if user_id:
+            query = query.join(Appointment, Appointment.id == Message.appointment_id).filter(Appointment.user_id == user_id)
+        else:
+            query = query.filter(Message.appointment_id == appointment_id)
+        return query.order_by(Message.timestamp.desc()).first()
+
+    if user_id:
+        rows = [row for row in shards.gather(latest) if row is not None]
+        return max(rows, key=lambda row: row[0] or datetime.min)[1] if rows else None
+    db = shards.read_session(appointment_id)
+    try:
+        row = latest(db)
+    finally:
+        db.close()
+    return row[1] if row else None
+
+
+def claim_appointment(db: Session, appointment_id: str, therapist_id: str, therapist_name: str) -> bool:
+    """Assign the appointment if nobody has it yet (the caller commits). Returns False if someone else got there first."""
+    result = db.execute(
+        update(Appointment)
+        .where(
+            Appointment.id == appointment_id,
+            Appointment.therapist_id.is_(None),
+            Appointment.therapist_name.is_(None),
+            Appointment.status.in_(OPEN_STATUSES),
+        )
+        .values(therapist_id=therapist_id, therapist_name=therapist_name)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+class AvailableTherapist:
+    __slots__ = ("therapist_id", "full_name", "conn", "since")
+
+    def __init__(self, therapist_id: str, full_name: str, conn: ChatConnection):
+        self.therapist_id = therapist_id
+        self.full_name = full_name
+        self.conn = conn
+        # Longest-idle therapist wins ties on load
+        self.since = time.monotonic()
+
+
+class AssignmentScheduler:
+    """Priority queue of unassigned appointments plus the dispatcher task."""
+
+    def __init__(self, session_factory: Callable[[], Session], writer: DatabaseWriter, shards: ChatShards,
+                 notify: Optional[Callable[[Session, Appointment], None]] = None):
+        # Read-only sessions; claims go through the writer
+        self.session_factory = session_factory
+        self.writer = writer
+        self.shards = shards
+        # notify(db, appointment) tells the user who was assigned; runs in the claim's write unit
+        self.notify = notify
+        # Heap of (priority, created_at, appointment_id); stale entries are skipped on pop
+        self._heap: List[Tuple[int, datetime, str]] = []
+        # appointment_id -> its current heap entry
+        self._entries: Dict[str, Tuple[int, datetime, str]] = {}
+        self._lock = threading.Lock()
+        self.available: Dict[str, AvailableTherapist] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.assigned = 0
+        self.conflicts = 0
+
+    # -- queue ---------------------------------------------------------------
+
+    def depth(self) -> int:
+        return len(self._entries)
+
+    def _push(self, appointment_id: str, created_at: datetime, risk_level: Optional[str]):
+        entry = (RISK_PRIORITY.get(risk_level, RISK_PRIORITY["low"]), created_at, appointment_id)
+        with self._lock:
+            current = self._entries.get(appointment_id)
+            if current is not None and current <= entry:
+                return
+            self._entries[appointment_id] = entry
+            heapq.heappush(self._heap, entry)
+            if len(self._heap) > 2 * len(self._entries) + 1000:
+                # Drop superseded / discarded entries
+                self._heap = list(self._entries.values())
+                heapq.heapify(self._heap)
+
+    def enqueue(self, appointment: Appointment):
+        """Queue a newly created appointment; a no-op if it already has a therapist."""
+        if appointment.therapist_id or appointment.therapist_name:
+            return
+        self._push(appointment.id, appointment.created_at,
+                   latest_risk_level(self.shards, appointment.id, appointment.user_id))
+        self.wake()
+
+    def update_risk(self, appointment_id: str, risk_level: str):
+        """Raise a queued appointment's priority when its user sends a riskier message."""
+        entry = self._entries.get(appointment_id)
+        if entry is not None:
+            self._push(appointment_id, entry[1], risk_level)
+
+    def discard(self, appointment_id: str):
+        with self._lock:
+            self._entries.pop(appointment_id, None)
+
+    def _pop(self) -> Optional[Tuple[int, datetime, str]]:
+        with self._lock:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if self._entries.get(entry[2]) == entry:
+                    del self._entries[entry[2]]
+                    return entry
+        return None
+
+    def load_backlog(self):
+        """Sync the queue with the database: add unassigned appointments, drop ones claimed elsewhere."""
+        db = self.session_factory()
+        started = datetime.utcnow()
+        try:
+            rows = db.query(Appointment.id, Appointment.user_id, Appointment.created_at).filter(
+                Appointment.status == "scheduled",
+                Appointment.therapist_id.is_(None),
+                Appointment.therapist_name.is_(None),
+            ).all()
+            unassigned = {row.id for row in rows}
+            with self._lock:
+                # Keep entries queued while the query ran; the next rescan checks them
+                stale = [a for a, entry in self._entries.items() if a not in unassigned and entry[1] < started]
+                for appointment_id in stale:
+                    del self._entries[appointment_id]
+            for row in rows:
+                if row.id not in self._entries:
+                    self._push(row.id, row.created_at, latest_risk_level(self.shards, row.id, row.user_id))
+        finally:
+            db.close()
+
+    # -- therapists ----------------------------------------------------------
+
+    def add_therapist(self, therapist_id: str, full_name: str, conn: ChatConnection):
+        previous = self.available.get(therapist_id)
+        self.available[therapist_id] = AvailableTherapist(therapist_id, full_name, conn)
+        if previous is not None and previous.conn is not conn:
+            previous.conn.evict(CLOSE_REPLACED, "Therapist reconnected on another socket")
+        self.start()
+        self.wake()
+
+    def remove_therapist(self, therapist_id: str, conn: Optional[ChatConnection] = None):
+        current = self.available.get(therapist_id)
+        if current is not None and (conn is None or current.conn is conn):
+            del self.available[therapist_id]
+
+    # -- dispatcher ----------------------------------------------------------
+
+    def wake(self):
+        """Safe to call from sync endpoints running in the threadpool."""
+        if self._wakeup is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_rescan = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_rescan:
+                    await loop.run_in_executor(None, self.load_backlog)
+                    next_rescan = time.monotonic() + ASSIGNMENT_RESCAN_SECONDS
+                while self.available and self._entries:
+                    assignment = await loop.run_in_executor(None, self._assign_next)
+                    if assignment is None:
+                        break
+                    therapist, frame = assignment
+                    therapist.conn.send(frame)
+            except Exception:
+                logger.exception("assignment.dispatch_failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_rescan - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _pick_therapist(self, db: Session) -> Optional[AvailableTherapist]:
+        available = list(self.available.values())
+        if not available:
+            return None
+        loads = dict(db.query(Appointment.therapist_id, func.count(Appointment.id)).filter(
+            Appointment.therapist_id.in_([t.therapist_id for t in available]),
+            Appointment.status.in_(OPEN_STATUSES),
+        ).group_by(Appointment.therapist_id).all())
+        candidates = [t for t in available if loads.get(t.therapist_id, 0) < ASSIGNMENT_MAX_ACTIVE]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: (loads.get(t.therapist_id, 0), t.since))
+
+    def _assign_next(self) -> Optional[Tuple[AvailableTherapist, dict]]:
+        """Claim the highest-priority appointment for the least-loaded available therapist."""
+        db = self.session_factory()
+        try:
+            therapist = self._pick_therapist(db)
+        finally:
+            db.close()
+        if therapist is None:
+            return None
+        while True:
+            entry = self._pop()
+            if entry is None:
+                return None
+            priority, created_at, appointment_id = entry
+            appointment = self.writer.run(lambda w: self._claim(w, appointment_id, therapist))
+            if appointment is not None:
+                break
+            self.conflicts += 1
+            ASSIGNMENT_CLAIM_CONFLICTS.labels("scheduler").inc()
+
+        risk_level = RISK_BY_PRIORITY[priority]
+        ASSIGNMENT_WAIT_SECONDS.labels(risk_level).observe(
+            max(0.0, (datetime.utcnow() - created_at).total_seconds())
+        )
+        self.assigned += 1
+        therapist.since = time.monotonic()
+        logger.info("assignment.assigned", extra={
+            "appointment_id": appointment_id, "therapist_id": therapist.therapist_id, "risk_level": risk_level,
+        })
+        frame = {
+            "type": "ASSIGNMENT",
+            "appointment_id": appointment.id,
+            "user_name": appointment.user_name,
+            "status": appointment.status,
+            "created_from": appointment.created_from,
+            "created_at": appointment.created_at,
+            "risk_level": risk_level,
+            "timestamp": datetime.utcnow(),
+        }
+        return therapist, frame
+
+    def _claim(self, db: Session, appointment_id: str, therapist: AvailableTherapist) -> Optional[Appointment]:
+        """Write unit: claim the appointment and notify its user in the same transaction."""
+        if not claim_appointment(db, appointment_id, therapist.therapist_id, therapist.full_name):
+            return None
+        appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        if self.notify is not None:
+            try:
+                with db.begin_nested():
+                    self.notify(db, appointment)
+            except Exception:
+                logger.exception("assignment.notification_failed", extra={"appointment_id": appointment_id})
+        return appointment
+
+    def stats(self) -> dict:
+        counts = dict.fromkeys(RISK_PRIORITY, 0)
+        for priority, _, _ in list(self._entries.values()):
+            counts[RISK_BY_PRIORITY[priority]] += 1
+        return {
+            "queue_depth": self.depth(),
+            "queued_by_risk": counts,
+            "available_therapists": len(self.available),
+            "assigned": self.assigned,
+            "conflicts": self.conflicts,
+        }
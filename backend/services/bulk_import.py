@@ -0,0 +1,336 @@
+"""
+Bulk import of historical appointments and messages from NDJSON.
+One record per line, appointments before their messages:
+    {"type": "appointment", "id": "...", "user_name": "...", "status": "completed", "created_at": "..."}
+    {"type": "message", "id": "...", "appointment_id": "...", "sender": "user", "content": "...", "timestamp": "..."}
+Records are validated and written in chunks of multi-row INSERTs: a chunk's
+appointments in one transaction on the primary, then its messages in one
+transaction per chat shard (services/chat_shards.py), each shard's messages
+analysed in one batch by the configured emotion model (services/emotion_model.py)
+before that transaction, so inference never holds up the shard's writer.
+Ids come from the source system, so rerunning an import skips rows that already
+exist (and completes a chunk that failed half way).
+Invalid records are rejected with their line number; the rest still import.
+A chunk is not all-or-nothing: if its appointments commit and one shard's
+messages then fail, only those messages are reported rejected.
+In the server each of those transactions is one write unit on the database's
+single writer (services/db_writer.py), so chat writes interleave between them.
+
+CLI (run from backend/):
+    python -m services.bulk_import history.ndjson [--chunk-size 2000]
+"""
+import argparse
+import json
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Appointment, Message, EmotionAnalysis, User, Therapist
+from schemas import AppointmentImport, MessageImport
+from services.chat_shards import ChatShard, ChatShards, open_chat_shards
+from services.db_writer import DatabaseWriter
+from services.emotion_model import AnalysisResult, get_model as get_emotion_model
+
+IMPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+T = TypeVar("T")
+
+
+class ImportStats:
+    def __init__(self):
+        self.appointments_inserted = 0
+        self.appointments_skipped = 0
+        self.messages_inserted = 0
+        self.messages_skipped = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def reject(self, line: int, error: str, rows: int = 1):
+        self.rejected += rows
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def counters(self) -> tuple:
+        return (self.appointments_inserted, self.appointments_skipped,
+                self.messages_inserted, self.messages_skipped, self.rejected, len(self.errors))
+
+    def restore(self, counters: tuple):
+        """Undo what a rolled-back transaction counted (and the errors it reported)."""
+        (self.appointments_inserted, self.appointments_skipped,
+         self.messages_inserted, self.messages_skipped, self.rejected, errors) = counters
+        del self.errors[errors:]
+
+    def report(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        rows = self.appointments_inserted + self.messages_inserted
+        return {
+            "appointments_inserted": self.appointments_inserted,
+            "appointments_skipped": self.appointments_skipped,
+            "messages_inserted": self.messages_inserted,
+            "messages_skipped": self.messages_skipped,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+
+def _parse(line_no: int, line: str, stats: ImportStats):
+    try:
+        raw = json.loads(line)
+        kind = raw.get("type") if isinstance(raw, dict) else None
+        if kind == "appointment":
+            return AppointmentImport.model_validate(raw)
+        if kind == "message":
+            return MessageImport.model_validate(raw)
+        stats.reject(line_no, "type must be 'appointment' or 'message'")
+    except json.JSONDecodeError as e:
+        stats.reject(line_no, f"invalid JSON: {e.msg}")
+    except ValidationError as e:
+        stats.reject(line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    return None
+
+
+def _existing_ids(db: Session, column, ids: Iterable[str]) -> set:
+    ids = list(ids)
+    if not ids:
+        return set()
+    return set(db.execute(select(column).where(column.in_(ids))).scalars())
+
+
+def _unique_name_ids(db: Session, model, names: Iterable[str]) -> Dict[str, str]:
+    """full_name -> id for names held by exactly one account."""
+    names = {n for n in names if n}
+    if not names:
+        return {}
+    by_name: Dict[str, List[str]] = defaultdict(list)
+    for account_id, name in db.execute(select(model.id, model.full_name).where(model.full_name.in_(names))):
+        by_name[name].append(account_id)
+    return {name: ids[0] for name, ids in by_name.items() if len(ids) == 1}
+
+
+def _import_appointments(db: Session, records: List[Tuple[int, object]],
+                         stats: ImportStats) -> List[Tuple[int, MessageImport]]:
+    """Insert the chunk's new appointments; returns its messages whose appointment exists."""
+    appointments = [(n, r) for n, r in records if isinstance(r, AppointmentImport)]
+    messages = [(n, r) for n, r in records if isinstance(r, MessageImport)]
+
+    existing = _existing_ids(db, Appointment.id, (r.id for _, r in appointments))
+    new_appointments = {}
+    for _, r in appointments:
+        if r.id in existing or r.id in new_appointments:
+            stats.appointments_skipped += 1
+        else:
+            new_appointments[r.id] = r
+    user_ids = _unique_name_ids(db, User, (r.user_name for r in new_appointments.values() if not r.user_id))
+    therapist_ids = _unique_name_ids(db, Therapist, (r.therapist_name for r in new_appointments.values() if not r.therapist_id))
+    if new_appointments:
+        db.execute(sqlite_insert(Appointment.__table__).on_conflict_do_nothing(index_elements=["id"]), [
+            {
+                "id": r.id,
+                "user_id": r.user_id or user_ids.get(r.user_name),
+                "therapist_id": r.therapist_id or therapist_ids.get(r.therapist_name),
+                "user_name": r.user_name,
+                "therapist_name": r.therapist_name,
+                "status": r.status,
+                "created_from": r.created_from,
+                "created_at": r.created_at or datetime.utcnow(),
+            }
+            for r in new_appointments.values()
+        ])
+        stats.appointments_inserted += len(new_appointments)
+
+    known_appointments = set(new_appointments) | existing | _existing_ids(
+        db, Appointment.id, {r.appointment_id for _, r in messages} - set(new_appointments) - existing
+    )
+    accepted = []
+    for line_no, r in messages:
+        if r.appointment_id not in known_appointments:
+            stats.reject(line_no, f"appointment_id {r.appointment_id} not found")
+        else:
+            accepted.append((line_no, r))
+    return accepted
+
+
+def _analyse_new_messages(db: Session, messages: List[Tuple[int, MessageImport]]) -> Dict[str, AnalysisResult]:
+    """Emotion analysis of the messages not stored yet, by id; slow, so it runs before the write unit."""
+    existing = _existing_ids(db, Message.id, (r.id for _, r in messages))
+    pending: Dict[str, str] = {}
+    for _, r in messages:
+        if r.id not in existing:
+            pending.setdefault(r.id, r.content)
+    if not pending:
+        return {}
+    return dict(zip(pending, get_emotion_model().predict_batch(list(pending.values()))))
+
+
+def _import_messages(db: Session, messages: List[Tuple[int, MessageImport]],
+                     analyses: Dict[str, AnalysisResult], stats: ImportStats):
+    """Insert the new messages (all of one shard) with their precomputed emotion analysis."""
+    existing_messages = _existing_ids(db, Message.id, (r.id for _, r in messages))
+    new_messages: List[MessageImport] = []
+    seen = set()
+    for line_no, r in messages:
+        if r.id in existing_messages or r.id in seen:
+            stats.messages_skipped += 1
+        elif r.id not in analyses:
+            # Stored when it was analysed and deleted since (archived): left for a rerun
+            stats.reject(line_no, f"message {r.id} changed during the import; rerun to import it")
+        else:
+            seen.add(r.id)
+            new_messages.append(r)
+    if not new_messages:
+        return
+
+    # Continue each appointment's sequence after what is already stored
+    last_seq = dict(db.execute(
+        select(Message.appointment_id, func.max(Message.seq))
+        .where(Message.appointment_id.in_({r.appointment_id for r in new_messages}))
+        .group_by(Message.appointment_id)
+    ).all())
+    message_rows = []
+    for r in sorted(new_messages, key=lambda m: (m.appointment_id, m.timestamp)):
+        seq = (last_seq.get(r.appointment_id) or 0) + 1
+        last_seq[r.appointment_id] = seq
+        message_rows.append({
+            "id": r.id, "appointment_id": r.appointment_id, "seq": seq,
+            "sender": r.sender, "content": r.content, "timestamp": r.timestamp,
+        })
+
+    analyzed_at = datetime.utcnow()
+    db.execute(sqlite_insert(Message.__table__).on_conflict_do_nothing(index_elements=["id"]), message_rows)
+    db.execute(sqlite_insert(EmotionAnalysis.__table__).on_conflict_do_nothing(index_elements=["message_id"]), [
+        {
+            "analysis_id": str(uuid.uuid4()),
+            "message_id": row["id"],
+            "emotion_label": label,
+            "confidence_score": confidence,
+            "risk_level": risk_level,
+            "risk_score": risk_score,
+            "model_version": model_version,
+            "analyzed_at": analyzed_at,
+        }
+        for row, (label, confidence, risk_level, risk_score, model_version)
+        in zip(message_rows, (analyses[row["id"]] for row in message_rows))
+    ])
+    stats.messages_inserted += len(message_rows)
+
+
+def _write(writer: Optional[DatabaseWriter], db: Optional[Session],
+           unit: Callable[[Session], T], stats: ImportStats) -> T:
+    """Run unit as a write unit on writer, or on db and commit."""
+    before = stats.counters()
+    if writer is not None:
+        def rerunnable(w: Session) -> T:
+            stats.restore(before)  # in case the writer reruns the unit
+            return unit(w)
+
+        return writer.run(rerunnable)
+    try:
+        result = unit(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _import_shard_messages(shard: ChatShard, messages: List[Tuple[int, MessageImport]],
+                           stats: ImportStats, use_writer: bool):
+    """One shard's messages of a chunk, in one transaction (a write unit on its writer with use_writer).
+    They are analysed first, outside the transaction, so the shard's writer never waits on the model."""
+    read_db = shard.read_session_factory()
+    try:
+        analyses = _analyse_new_messages(read_db, messages)
+    finally:
+        read_db.close()
+    unit = partial(_import_messages, messages=messages, analyses=analyses, stats=stats)
+    if use_writer:
+        _write(shard.writer, None, unit, stats)
+        return
+    chat_db = shard.session_factory()
+    try:
+        _write(None, chat_db, unit, stats)
+    finally:
+        chat_db.close()
+
+
+def import_ndjson(db: Session, lines: Iterable, shards: ChatShards, chunk_size: int = IMPORT_CHUNK_SIZE,
+                  writer: Optional[DatabaseWriter] = None) -> dict:
+    """Import NDJSON lines (str or bytes); appointments go to `db` (or write units on `writer`),
+    messages to their chat shards (or those shards' writers). Returns the import report."""
+    stats = ImportStats()
+    chunk: List[Tuple[int, object]] = []
+
+    def flush():
+        if not chunk:
+            return
+        try:
+            before = stats.counters()
+            try:
+                messages = _write(writer, db, lambda w: _import_appointments(w, chunk, stats), stats)
+            except Exception as e:
+                stats.restore(before)
+                first, last = chunk[0][0], chunk[-1][0]
+                stats.reject(first, f"lines {first}-{last} not imported: {e}", rows=len(chunk))
+                return
+
+            # The appointments are committed: a failing shard only rejects its own messages
+            by_shard: Dict[int, List[Tuple[int, MessageImport]]] = defaultdict(list)
+            for line_no, r in messages:
+                by_shard[shards.shard(r.appointment_id).index].append((line_no, r))
+            for index, group in sorted(by_shard.items()):
+                before = stats.counters()
+                try:
+                    _import_shard_messages(shards.shards[index], group, stats, writer is not None)
+                except Exception as e:
+                    stats.restore(before)
+                    lines = ", ".join(str(line_no) for line_no, _ in group[:10])
+                    more = f" and {len(group) - 10} more" if len(group) > 10 else ""
+                    stats.reject(group[0][0], f"messages on lines {lines}{more} not imported: {e}", rows=len(group))
+        finally:
+            chunk.clear()
+
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        record = _parse(line_no, line, stats)
+        if record is not None:
+            chunk.append((line_no, record))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return stats.report()
+
+
+def main(argv: Optional[List[str]] = None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import appointments and messages from NDJSON")
+    parser.add_argument("path", help="NDJSON file")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            report = import_ndjson(db, f, open_chat_shards(), args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
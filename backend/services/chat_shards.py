@@ -0,0 +1,314 @@
+"""
+Optional horizontal sharding of chat data by appointment.
+With CHAT_SHARDS=N the messages, emotion_analysis and session_notes rows of an
+appointment live in one of N SQLite files (CHAT_SHARD_URL, {shard} replaced by
+0..N-1), picked by a jump consistent hash of appointment_id. Appointments,
+accounts, notifications, summaries and the other metadata stay in the primary
+database. CHAT_SHARDS=0 (the default) keeps everything in the primary, which is
+then the only shard.
+
+Each shard has its own single writer (services/db_writer.py) and read-only
+pool, so chat writes to different shards commit in parallel. Shard read
+connections ATTACH the primary read-only: the chat tables resolve to the shard
+and everything else to the primary, so queries joining messages to appointments
+run unchanged on a shard session. Reads over many appointments run on every
+shard in parallel (gather) and the caller merges the results. Writes never span
+files: a chat write goes to one shard, a metadata write to the primary.
+
+Moving to a different shard count (server stopped; resumable, run from backend/):
+    python -m services.chat_shards rebalance --from 0 --to 4
+Growing N to M moves only the appointments that jump to a new shard (~1 - N/M).
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import MetaData, create_engine, delete, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from database import DB_READ_POOL_OVERFLOW, DB_READ_POOL_SIZE, SQLALCHEMY_DATABASE_URL, configure_sqlite, is_sqlite_file
+from logging_config import get_logger
+from migrations import add_chat_cache_versions, add_message_search_index, add_message_seq
+from models import EmotionAnalysis, Message, SessionNote
+from services.db_writer import DatabaseWriter
+from services.metrics import instrument_engine
+
+logger = get_logger("chat_shards")
+
+CHAT_SHARDS = int(os.getenv("CHAT_SHARDS", "0"))
+CHAT_SHARD_URL = os.getenv("CHAT_SHARD_URL", "sqlite:///./neurosupport-chat-{shard}.db")
+REBALANCE_BATCH_APPOINTMENTS = 200
+
+# Schema name of the primary on shard read connections
+PRIMARY_SCHEMA = "primary_db"
+CHAT_TABLES = (Message.__table__, EmotionAnalysis.__table__, SessionNote.__table__)
+
+T = TypeVar("T")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): a bucket in [0, buckets) for a 64-bit key."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_index(appointment_id: str, count: int) -> int:
+    if count <= 1:
+        return 0
+    # Stable across processes (hash() is salted per process)
+    key = int.from_bytes(hashlib.blake2b(appointment_id.encode("utf-8"), digest_size=8).digest(), "big")
+    return jump_hash(key, count)
+
+
+def shard_metadata() -> MetaData:
+    """The chat tables as created in a shard: without their foreign keys to appointments (in the primary)."""
+    metadata = MetaData()
+    for table in CHAT_TABLES:
+        copy = table.to_metadata(metadata)
+        for fk in [fk for fk in copy.foreign_keys if fk.target_fullname.startswith("appointments.")]:
+            fk.parent.foreign_keys.discard(fk)
+            copy.foreign_keys.discard(fk)
+            copy.constraints.discard(fk.constraint)
+    return metadata
+
+
+class ChatShard:
+    """One chat database: its single writer, write sessions (CLI jobs) and read-only sessions."""
+
+    def __init__(self, index: int, url: str, writer: DatabaseWriter,
+                 session_factory: Callable[[], Session], read_session_factory: Callable[[], Session]):
+        self.index = index
+        self.url = url
+        self.writer = writer
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+
+
+def migrate_shard(url: str):
+    """Create a shard file's chat tables and apply the chat migrations. Idempotent."""
+    engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=NullPool)
+    configure_sqlite(engine)
+    try:
+        shard_metadata().create_all(engine)
+        with engine.begin() as conn:
+            add_message_seq(conn)
+            add_message_search_index(conn)
+            add_chat_cache_versions(conn)
+    finally:
+        engine.dispose()
+
+
+def open_shard(index: int, url: str, primary_url: str = SQLALCHEMY_DATABASE_URL) -> ChatShard:
+    """Engines for one shard file. Opening does no I/O; the schema comes from migrate_shard()."""
+    if not is_sqlite_file(url) or not is_sqlite_file(primary_url):
+        raise ValueError("chat sharding needs file-backed SQLite databases")
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0)
+    configure_sqlite(engine)
+
+    read_engine = create_engine(
+        url, connect_args={"check_same_thread": False},
+        pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_POOL_OVERFLOW,
+    )
+    configure_sqlite(read_engine, read_only=True)
+    primary_path = make_url(primary_url).database
+
+    @event.listens_for(read_engine, "connect")
+    def _attach_primary(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE ? AS {PRIMARY_SCHEMA}", (primary_path,))
+
+    instrument_engine(engine)
+    instrument_engine(read_engine)
+
+    return ChatShard(
+        index, url, DatabaseWriter(engine),
+        sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        sessionmaker(autocommit=False, autoflush=False, bind=read_engine),
+    )
+
+
+class ChatShards:
+    """Routes appointment ids to chat shards and fans reads out over all of them."""
+
+    def __init__(self, shards: List[ChatShard]):
+        self.shards = shards
+        self._pool = (ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="chat-shard")
+                      if len(shards) > 1 else None)
+
+    @property
+    def count(self) -> int:
+        return len(self.shards)
+
+    def shard(self, appointment_id: str) -> ChatShard:
+        return self.shards[shard_index(appointment_id, len(self.shards))]
+
+    def writer(self, appointment_id: str) -> DatabaseWriter:
+        return self.shard(appointment_id).writer
+
+    def read_session(self, appointment_id: str) -> Session:
+        """Read-only session on the appointment's shard (the caller closes it)."""
+        return self.shard(appointment_id).read_session_factory()
+
+    def group(self, appointment_ids: Sequence[str]) -> Dict[int, List[str]]:
+        """Shard index -> the given appointment ids that live there."""
+        groups: Dict[int, List[str]] = {}
+        for appointment_id in appointment_ids:
+            groups.setdefault(shard_index(appointment_id, len(self.shards)), []).append(appointment_id)
+        return groups
+
+    def gather(self, fn: Callable[[Session], T], indexes: Optional[Sequence[int]] = None) -> List[T]:
+        """fn(read_session) on every shard (or the given ones) in parallel; results in shard order."""
+        return self._map(lambda shard, db: fn(db), indexes)
+
+    def gather_by_appointment(self, appointment_ids: Sequence[str],
+                              fn: Callable[[Session, List[str]], T]) -> List[T]:
+        """fn(read_session, ids) on each shard holding some of the appointments, in parallel."""
+        groups = self.group(appointment_ids)
+        if not groups:
+            return []
+        return self._map(lambda shard, db: fn(db, groups[shard.index]), list(groups))
+
+    def _map(self, fn: Callable[[ChatShard, Session], T], indexes: Optional[Sequence[int]]) -> List[T]:
+        shards = self.shards if indexes is None else [self.shards[i] for i in sorted(indexes)]
+
+        def call(shard: ChatShard) -> T:
+            db = shard.read_session_factory()
+            try:
+                return fn(shard, db)
+            finally:
+                db.close()
+
+        if self._pool is None or len(shards) == 1:
+            return [call(shard) for shard in shards]
+        return list(self._pool.map(call, shards))
+
+    def migrate(self):
+        """migrate_shard() on every shard file; the primary (CHAT_SHARDS=0) is left to migrations.migrate()."""
+        for shard in self.shards:
+            if shard.url != SQLALCHEMY_DATABASE_URL:
+                migrate_shard(shard.url)
+
+    def stop(self):
+        """Stop the shard writers (after everything queued is committed)."""
+        for shard in self.shards:
+            shard.writer.stop()
+
+
+def open_chat_shards(primary_writer: Optional[DatabaseWriter] = None, count: int = CHAT_SHARDS,
+                     url: str = CHAT_SHARD_URL) -> ChatShards:
+    """The configured shards; count 0 means the primary database alone (using primary_writer)."""
+    from database import ReadSessionLocal, SessionLocal, engine
+
+    if count <= 0:
+        return ChatShards([ChatShard(0, SQLALCHEMY_DATABASE_URL, primary_writer or DatabaseWriter(engine),
+                                     SessionLocal, ReadSessionLocal)])
+    return ChatShards([open_shard(i, url.format(shard=i)) for i in range(count)])
+
+
+# -- rebalancing -----------------------------------------------------------------
+
+def _chat_appointment_ids(db: Session) -> List[str]:
+    return list(db.execute(select(Message.appointment_id).union(select(SessionNote.appointment_id))).scalars())
+
+
+def _move(source: ChatShard, target: ChatShard, appointment_ids: List[str]) -> Dict[str, int]:
+    """Copy the appointments' chat rows into target and commit, then delete them from source.
+    Rerunnable: rows already copied by an interrupted run are skipped."""
+    src = source.session_factory()
+    dst = target.session_factory()
+    try:
+        in_batch = Message.appointment_id.in_(appointment_ids)
+        messages = [dict(row) for row in src.execute(
+            select(Message.__table__).where(in_batch).order_by(Message.appointment_id, Message.seq)
+        ).mappings()]
+        analyses = [dict(row) for row in src.execute(
+            select(EmotionAnalysis.__table__).join(Message.__table__, Message.id == EmotionAnalysis.message_id)
+            .where(in_batch)
+        ).mappings()]
+        notes = [dict(row) for row in src.execute(
+            select(SessionNote.__table__).where(SessionNote.appointment_id.in_(appointment_ids))
+        ).mappings()]
+
+        if messages:
+            dst.execute(sqlite_insert(Message.__table__).on_conflict_do_nothing(index_elements=["id"]), messages)
+        if analyses:
+            dst.execute(sqlite_insert(EmotionAnalysis.__table__).on_conflict_do_nothing(
+                index_elements=["message_id"]), analyses)
+        if notes:
+            dst.execute(sqlite_insert(SessionNote.__table__).on_conflict_do_nothing(index_elements=["id"]), notes)
+        dst.commit()
+
+        src.execute(delete(EmotionAnalysis).where(
+            EmotionAnalysis.message_id.in_(select(Message.id).where(in_batch))))
+        src.execute(delete(Message).where(in_batch))
+        src.execute(delete(SessionNote).where(SessionNote.appointment_id.in_(appointment_ids)))
+        src.commit()
+        return {"appointments": len(appointment_ids), "messages": len(messages), "notes": len(notes)}
+    except Exception:
+        dst.rollback()
+        src.rollback()
+        raise
+    finally:
+        dst.close()
+        src.close()
+
+
+def rebalance(source: ChatShards, target: ChatShards, batch: int = REBALANCE_BATCH_APPOINTMENTS) -> dict:
+    """Move every appointment's chat rows from where `source` put them to where `target` puts them.
+    Run with the server stopped; safe to rerun after an interruption."""
+    target.migrate()
+    moved = {"appointments": 0, "messages": 0, "notes": 0}
+    for shard in source.shards:
+        db = shard.read_session_factory()
+        try:
+            appointment_ids = _chat_appointment_ids(db)
+        finally:
+            db.close()
+        moves: Dict[int, List[str]] = {}
+        for appointment_id in appointment_ids:
+            destination = target.shard(appointment_id)
+            if destination.url != shard.url:
+                moves.setdefault(destination.index, []).append(appointment_id)
+        for index, ids in sorted(moves.items()):
+            for start in range(0, len(ids), batch):
+                counts = _move(shard, target.shards[index], ids[start:start + batch])
+                for key, value in counts.items():
+                    moved[key] += value
+        logger.info("chat_shards.rebalanced_shard", extra={"url": shard.url, "appointments": len(appointment_ids),
+                                                          "moved": sum(len(ids) for ids in moves.values())})
+
+    messages = target.gather(lambda db: db.query(Message.id).count())
+    return {"moved": moved, "shards": [{"url": shard.url, "messages": count}
+                                       for shard, count in zip(target.shards, messages)]}
+
+
+def main(argv: Optional[List[str]] = None):
+    from logging_config import configure_logging
+
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description="Chat shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move = commands.add_parser("rebalance", help="move chat rows after changing CHAT_SHARDS (server stopped)")
+    move.add_argument("--from", dest="source", type=int, default=CHAT_SHARDS,
+                      help="shard count the data is laid out for (0 = primary only; default: CHAT_SHARDS)")
+    move.add_argument("--to", dest="target", type=int, required=True, help="new shard count (0 = primary only)")
+    move.add_argument("--batch", type=int, default=REBALANCE_BATCH_APPOINTMENTS, help="appointments per move")
+    args = parser.parse_args(argv)
+
+    source = open_chat_shards(count=args.source)
+    target = open_chat_shards(count=args.target)
+    print(json.dumps(rebalance(source, target, args.batch), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Single-writer queue for SQLite.
+Every database write in the server is a "write unit": a function that takes a
+Session, adds/updates rows and returns a result. Units are queued to one
+dedicated thread that owns the only write connection and runs them in batched
+transactions: one COMMIT per batch, with the batch's inserts flushed together.
+If anything in the batch fails it is rolled back and rerun with each unit in its
+own SAVEPOINT, so only the failing unit's caller gets the exception. Callers get
+the unit's result once the batch holding it is committed.
+
+A unit may therefore run twice: it must not depend on side effects of an
+earlier, rolled-back run (objects it adds become new again, counters do not).
+
+Request handlers read through a pool of read-only connections
+(database.ReadSessionLocal); with WAL those reads never wait for the writer.
+Units run on the writer thread: keep them to the writes and the reads that
+must be consistent with them, and do slow work before submitting.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from logging_config import get_logger
+from services.metrics import DB_WRITE_BATCH_SIZE, DB_WRITE_SECONDS
+
+logger = get_logger("db_writer")
+
+DB_WRITE_BATCH_WINDOW_MS = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", "1"))
+DB_WRITE_MAX_BATCH_SIZE = int(os.getenv("DB_WRITE_MAX_BATCH_SIZE", "200"))
+
+WriteUnit = Callable[[Session], Any]
+_Pending = Tuple[WriteUnit, Future, float]
+_STOP = object()
+
+
+class DatabaseWriter:
+    """Owns the write connection; executes queued write units in batched transactions."""
+
+    def __init__(self, bind, window_ms: float = DB_WRITE_BATCH_WINDOW_MS,
+                 max_batch_size: int = DB_WRITE_MAX_BATCH_SIZE):
+        # expire_on_commit=False so callers can read the rows a unit returns; autoflush so
+        # a unit's queries see the rows of the units before it in the same batch
+        self.session_factory = sessionmaker(bind=bind, autoflush=True, expire_on_commit=False)
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_batch_size = 0
+        self.batches = 0
+        self.units = 0
+        self.failed_units = 0
+
+    def start(self):
+        """Start the writer thread (idempotent)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Run everything already queued, then stop the thread."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def put(self, unit: WriteUnit) -> Future:
+        """Queue a unit; the future resolves to its result once committed."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("write units cannot wait on other write units")
+        self.start()
+        future: Future = Future()
+        self._queue.put((unit, future, time.perf_counter()))
+        return future
+
+    def run(self, unit: WriteUnit) -> Any:
+        """Blocking submit, for sync endpoints and worker threads."""
+        return self.put(unit).result()
+
+    async def submit(self, unit: WriteUnit) -> Any:
+        """Awaitable submit, for the event loop."""
+        return await asyncio.wrap_future(self.put(unit))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "units": self.units,
+            "failed_units": self.failed_units,
+            "mean_batch_size": round(self.units / self.batches, 2) if self.batches else 0,
+            "queued": self.depth(),
+        }
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            # Let concurrent writers join this transaction, but only when there is
+            # concurrency to gain from; a lone writer commits immediately
+            if self.window > 0 and (self._last_batch_size > 1 or not self._queue.empty()):
+                time.sleep(self.window)
+            batch: List[_Pending] = [item]
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._last_batch_size = len(batch)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[_Pending]):
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = self._commit_batch(batch)
+        if outcomes is None:
+            outcomes = self._commit_each(batch)
+
+        self.batches += 1
+        self.units += len(batch)
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        committed = time.perf_counter()
+        for (_, future, submitted), (ok, value) in zip(batch, outcomes):
+            DB_WRITE_SECONDS.observe(committed - submitted)
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed_units += 1
+                future.set_exception(value)
+
+    def _commit_batch(self, batch: List[_Pending]) -> Optional[List[Tuple[bool, Any]]]:
+        """All units in one transaction. None if it failed and the units should be retried one by one."""
+        db = self.session_factory()
+        try:
+            results = [unit(db) for unit, _, _ in batch]
+            db.commit()
+            return [(True, result) for result in results]
+        except Exception as e:
+            db.rollback()
+            if len(batch) == 1:
+                return [(False, e)]
+            return None
+        finally:
+            db.close()
+
+    def _commit_each(self, batch: List[_Pending]) -> List[Tuple[bool, Any]]:
+        """Each unit in its own savepoint, so a failing unit is rolled back alone."""
+        outcomes: List[Tuple[bool, Any]] = []
+        db = self.session_factory()
+        try:
+            for unit, _, _ in batch:
+                try:
+                    with db.begin_nested():
+                        result = unit(db)
+                        # Flush inside the savepoint so a failing INSERT is charged to this unit
+                        db.flush()
+                    outcomes.append((True, result))
+                except Exception as e:
+                    outcomes.append((False, e))
+            db.commit()
+        except Exception as e:
+            # The whole transaction is gone: nothing in this batch was saved
+            logger.warning("db_writer.commit_failed", extra={"batch_size": len(batch), "error": str(e)})
+            db.rollback()
+            outcomes = [(False, e)] * len(batch)
+        finally:
+            db.close()
+        return outcomes
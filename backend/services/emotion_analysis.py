@@ -1,10 +1,11 @@
 """
 Emotion analysis service. Mandatory for every chat message.
-Rule-based placeholder; replace with ML model later.
+Rule-based model (rule-based-v1): the default backend, and the fallback for the
+ML backends in services/emotion_model.py, which reuse assess_risk() below.
 Returns: emotion_label, confidence_score, risk_level, risk_score, model_version.
 Raises on failure so message creation can rollback.
 """
-from typing import Tuple
+from typing import List, Sequence, Tuple
 
 EMOTION_LABELS = (
     "joy", "sadness", "anger", "fear", "surprise", "neutral",
@@ -26,8 +27,6 @@ def analyze(content: str) -> Tuple[str, float, str, float, str]:
     text = content.lower().strip()
     emotion_label = "neutral"
     confidence = 0.7
-    risk_level = "low"
-    risk_score = 0.0
 
     # Rule-based keyword mapping (extensible for ML later)
     emotion_keywords = {
@@ -47,22 +46,32 @@ def analyze(content: str) -> Tuple[str, float, str, float, str]:
             confidence = 0.75
             break
 
+    if emotion_label not in EMOTION_LABELS:
+        emotion_label = "neutral"
+    risk_level, risk_score, confidence = assess_risk(text, emotion_label, confidence)
+
+    return (emotion_label, confidence, risk_level, risk_score, MODEL_VERSION)
+
+
+def assess_risk(text: str, emotion_label: str, confidence: float) -> Tuple[str, float, float]:
+    """
+    Risk from high-concern phrases and the emotion label; `text` is lower-cased content.
+    Returns (risk_level, risk_score, confidence), confidence raised for risky messages.
+    """
     # Risk escalation for high-concern phrases
     high_risk_phrases = ("kill myself", "end it", "don't want to live", "hurt myself", "suicide")
     medium_risk_phrases = ("can't go on", "give up", "no point", "hopeless", "nothing matters")
 
     if any(p in text for p in high_risk_phrases):
-        risk_level = "high"
-        risk_score = 0.85
-        confidence = max(confidence, 0.8)
-    elif any(p in text for p in medium_risk_phrases) or emotion_label in ("depression", "anxiety"):
-        risk_level = "medium"
-        risk_score = 0.5
-        confidence = max(confidence, 0.72)
+        return "high", 0.85, max(confidence, 0.8)
+    if any(p in text for p in medium_risk_phrases) or emotion_label in ("depression", "anxiety"):
+        return "medium", 0.5, max(confidence, 0.72)
+    return "low", 0.0, confidence
 
-    if emotion_label not in EMOTION_LABELS:
-        emotion_label = "neutral"
-    if risk_level not in RISK_LEVELS:
-        risk_level = "low"
 
-    return (emotion_label, confidence, risk_level, risk_score, MODEL_VERSION)
+def analyze_batch(contents: Sequence[str]) -> List[Tuple[str, float, str, float, str]]:
+    """
+    Analyze many messages at once (bulk import, backfills).
+    Same result tuple as analyze() for each item, in order; raises ValueError on the first bad item.
+    """
+    return [analyze(content) for content in contents]
@@ -0,0 +1,149 @@
+"""
+Emotion model backends behind one batch interface: predict_batch(contents) returns
+the same (emotion_label, confidence_score, risk_level, risk_score, model_version)
+tuple as emotion_analysis.analyze() for every item, in order.
+
+- rule-based: services/emotion_analysis.py (rule-based-v1). Default, and the
+  fallback whenever another backend is unavailable or too slow.
+- onnx: a small text classifier run with ONNX Runtime on CPU. The model takes
+  one string tensor input ([N] or [N, 1]) and has a float [N, num_labels]
+  probability output; label names come from the model's "labels" metadata
+  (comma-separated) or EMOTION_MODEL_LABELS. A scikit-learn TF-IDF + linear
+  classifier converted with skl2onnx (zipmap disabled) fits this contract.
+  Risk still goes through emotion_analysis.assess_risk(), so high-concern
+  phrases are flagged whatever the classifier says.
+
+Selected with EMOTION_MODEL / EMOTION_MODEL_PATH; requires `onnxruntime` and
+`numpy` for the onnx backend (pip install onnxruntime).
+"""
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from logging_config import get_logger
+from services.emotion_analysis import EMOTION_LABELS, MODEL_VERSION, analyze_batch, assess_risk
+
+logger = get_logger("emotion_model")
+
+EMOTION_MODEL = os.getenv("EMOTION_MODEL", "rule-based")  # rule-based | onnx
+EMOTION_MODEL_PATH = os.getenv("EMOTION_MODEL_PATH", "")
+EMOTION_MODEL_LABELS = os.getenv("EMOTION_MODEL_LABELS", "")
+# ONNX Runtime threads per inference call; parallelism comes from the inference worker pool
+EMOTION_MODEL_THREADS = int(os.getenv("EMOTION_MODEL_THREADS", "1"))
+MODEL_BACKENDS = ("rule-based", "onnx")
+
+AnalysisResult = Tuple[str, float, str, float, str]
+
+
+def _check_contents(contents: Sequence[str]):
+    for content in contents:
+        if not content or not isinstance(content, str):
+            raise ValueError("Emotion analysis requires non-empty string content")
+
+
+class EmotionModel:
+    model_version = ""
+    # Whether callers should micro-batch requests (services/inference_server.py)
+    batched = True
+
+    def predict_batch(self, contents: Sequence[str]) -> List[AnalysisResult]:
+        raise NotImplementedError
+
+
+class RuleBasedModel(EmotionModel):
+    model_version = MODEL_VERSION
+    # A few microseconds per message: batching would only add queueing latency
+    batched = False
+
+    def predict_batch(self, contents: Sequence[str]) -> List[AnalysisResult]:
+        return analyze_batch(contents)
+
+
+class OnnxEmotionModel(EmotionModel):
+    def __init__(self, path: str, labels: Optional[Sequence[str]] = None, threads: int = EMOTION_MODEL_THREADS):
+        # Imported here, not at module level: they add ~0.2 s to every start, onnx model or not
+        try:
+            import numpy as np
+            import onnxruntime as ort
+        except ImportError:  # optional: only needed for EMOTION_MODEL=onnx
+            raise RuntimeError("EMOTION_MODEL=onnx requires onnxruntime and numpy")
+        self._np = np
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+        inputs = self.session.get_inputs()
+        if len(inputs) != 1 or inputs[0].type != "tensor(string)":
+            raise ValueError(f"{path}: expected a single string tensor input")
+        self.input_name = inputs[0].name
+        self.input_rank = len(inputs[0].shape)
+
+        probabilities = [
+            o for o in self.session.get_outputs() if o.type == "tensor(float)" and len(o.shape) == 2
+        ]
+        if not probabilities:
+            raise ValueError(f"{path}: expected a float [N, num_labels] probability output")
+        self.output_name = probabilities[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if not labels:
+            labels = [label.strip() for label in metadata.get("labels", "").split(",") if label.strip()]
+        if not labels:
+            raise ValueError(f"{path}: no label names (set model metadata 'labels' or EMOTION_MODEL_LABELS)")
+        width = probabilities[0].shape[1]
+        if isinstance(width, int) and width != len(labels):
+            raise ValueError(f"{path}: {len(labels)} labels for {width} outputs")
+        # Labels outside the app's vocabulary are stored as neutral, like the rule-based model
+        self.labels = [label if label in EMOTION_LABELS else "neutral" for label in labels]
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        version = metadata.get("version")
+        self.model_version = f"onnx-{name}" + (f"-{version}" if version else "")
+        self.model_version = self.model_version[:64]
+
+    def predict_batch(self, contents: Sequence[str]) -> List[AnalysisResult]:
+        _check_contents(contents)
+        batch = self._np.array(contents, dtype=object)
+        if self.input_rank == 2:
+            batch = batch.reshape(-1, 1)
+        probabilities = self.session.run([self.output_name], {self.input_name: batch})[0]
+        best = probabilities.argmax(axis=1)
+
+        results = []
+        for content, index, row in zip(contents, best, probabilities):
+            label = self.labels[index]
+            risk_level, risk_score, confidence = assess_risk(content.lower().strip(), label, float(row[index]))
+            results.append((label, round(confidence, 4), risk_level, risk_score, self.model_version))
+        return results
+
+
+def load_model(backend: str = EMOTION_MODEL, path: str = EMOTION_MODEL_PATH) -> EmotionModel:
+    """The configured backend, or the rule-based model if it cannot be loaded."""
+    if backend == "onnx":
+        labels = [label.strip() for label in EMOTION_MODEL_LABELS.split(",") if label.strip()]
+        try:
+            model = OnnxEmotionModel(path, labels or None)
+        except Exception as e:
+            logger.error("emotion_model.load_failed", extra={"backend": backend, "path": path, "error": str(e)})
+        else:
+            logger.info("emotion_model.loaded", extra={"model_version": model.model_version})
+            return model
+    elif backend != "rule-based":
+        logger.error("emotion_model.unknown_backend", extra={"backend": backend})
+    return RuleBasedModel()
+
+
+_model: Optional[EmotionModel] = None
+# The startup warm-up loads it on a worker thread, possibly while a chat asks for it
+_model_lock = threading.Lock()
+
+
+def get_model() -> EmotionModel:
+    """Process-wide model instance, loaded on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
+    return _model
@@ -0,0 +1,64 @@
+"""
+Fast path for list-heavy JSON endpoints.
+Returning ORM objects through `response_model=List[...]` makes FastAPI build
+one Pydantic model per row (`from_attributes`) and then encode it with the
+stdlib json encoder. These endpoints instead select only the response
+schema's columns as plain tuples, turn them into dicts and encode them with
+orjson in one call. The route keeps its `response_model` for the OpenAPI
+docs; FastAPI skips validation and serialization when a route returns a
+Response.
+
+Datetimes are encoded as ISO 8601 like Pydantic does. orjson is optional:
+without it the stdlib encoder is used, which is slower but produces the same output.
+"""
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Tuple, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def schema_fields(schema: Type[BaseModel]) -> Tuple[str, ...]:
+    return tuple(schema.model_fields)
+
+
+def schema_columns(model, schema: Type[BaseModel]) -> list:
+    """The model's columns for each field of the response schema, in schema order."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def rows_response(rows: Iterable[tuple], schema: Type[BaseModel], headers: Optional[dict] = None) -> FastJSONResponse:
+    """Response for rows selected with schema_columns(); no per-row validation."""
+    fields = schema_fields(schema)
+    return FastJSONResponse([dict(zip(fields, row)) for row in rows], headers=headers)
+
+
+def record_rows(records: Iterable[dict], schema: Type[BaseModel]) -> List[tuple]:
+    """Dicts (which may carry extra keys) as rows in schema_columns() order, for rows_response()."""
+    fields = schema_fields(schema)
+    return [tuple(record.get(name) for name in fields) for record in records]
@@ -0,0 +1,124 @@
+"""
+WebSocket frame encodings for the chat sockets, negotiated per connection.
+"json" (default): text frames, same shape as before, ISO timestamps.
+"msgpack": binary MessagePack frames with short keys, integer type codes and
+epoch-millisecond timestamps. Needs the msgpack package; without it clients
+asking for msgpack get JSON.
+Handlers build frames with datetime timestamps and send them with send_frame();
+the connection's codec decides how they go on the wire.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the compact encoding
+    msgpack = None
+
+DEFAULT_ENCODING = "json"
+
+# Integer codes for frame "type" in compact encodings
+# (append only: codes are positional)
+FRAME_TYPES = (
+    "system", "message", "ack", "error", "SESSION_ENDED", "END_SESSION",
+    "ai_message", "APPOINTMENT_BOOKED", "ping", "pong", "RISK_ALERT",
+)
+TYPE_CODES = {name: code for code, name in enumerate(FRAME_TYPES, start=1)}
+
+# Short keys for compact encodings; unknown keys pass through unchanged
+COMPACT_KEYS = {
+    "type": "t", "timestamp": "ts", "content": "c", "sender": "s", "seq": "q",
+    "message": "m", "message_id": "id", "client_id": "cid", "appointment_id": "aid",
+    "user_name": "u", "last_seq": "lq", "risk_level": "rl", "risk_score": "rs",
+    "emotion_label": "el",
+}
+FULL_KEYS = {short: key for key, short in COMPACT_KEYS.items()}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _epoch_ms(value: datetime) -> int:
+    # Timestamps in this app are naive UTC (datetime.utcnow())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, frame: dict) -> str:
+        return json.dumps(frame, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, data) -> dict:
+        return json.loads(data)
+
+    async def send(self, websocket: WebSocket, frame: dict):
+        await websocket.send_text(self.encode(frame))
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def encode(self, frame: dict) -> bytes:
+        compact = {}
+        for key, value in frame.items():
+            if key == "type":
+                value = TYPE_CODES.get(value, value)
+            elif isinstance(value, datetime):
+                value = _epoch_ms(value)
+            compact[COMPACT_KEYS.get(key, key)] = value
+        return msgpack.packb(compact)
+
+    def decode(self, data) -> dict:
+        # Clients on this encoding may still send plain JSON text frames
+        if isinstance(data, str):
+            return json.loads(data)
+        frame = {}
+        for key, value in msgpack.unpackb(data).items():
+            key = FULL_KEYS.get(key, key)
+            if key == "type" and isinstance(value, int) and 1 <= value <= len(FRAME_TYPES):
+                value = FRAME_TYPES[value - 1]
+            frame[key] = value
+        return frame
+
+    async def send(self, websocket: WebSocket, frame: dict):
+        await websocket.send_bytes(self.encode(frame))
+
+
+CODECS = {"json": JsonCodec()}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def negotiate(websocket: WebSocket, requested: Optional[str]):
+    """Pick the codec for a connection from its ?encoding= parameter (unknown or unavailable -> JSON)."""
+    codec = CODECS.get((requested or DEFAULT_ENCODING).lower(), CODECS[DEFAULT_ENCODING])
+    websocket.state.codec = codec
+    return codec
+
+
+def codec_for(websocket: WebSocket):
+    return getattr(websocket.state, "codec", None) or CODECS[DEFAULT_ENCODING]
+
+
+async def send_frame(websocket: WebSocket, frame: dict):
+    await codec_for(websocket).send(websocket, frame)
+
+
+async def receive_frame(websocket: WebSocket) -> dict:
+    """Receive one frame (text or binary) and decode it with the connection's codec."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    data = message.get("text")
+    if data is None:
+        data = message.get("bytes")
+    return codec_for(websocket).decode(data)
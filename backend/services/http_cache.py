@@ -0,0 +1,71 @@
+"""
+Conditional GET for the polled read endpoints (dashboards, /analytics,
+notifications, appointment lists and message history).
+Every write bumps per-scope counters in `cache_versions` (kept by triggers, see
+migrations.add_cache_versions), in the same transaction and whichever process
+makes it:
+  user:<user_id>                 the user's appointments and session summaries
+  appointment:<appointment_id>   its messages and their analysis (on its chat shard)
+  appointments                   any appointment
+  session_notes                  any session note (per chat shard)
+  notifications:user:<user_id>   the user's notifications
+  notifications:therapist        therapist notifications
+An endpoint's ETag is a hash of the scopes it reads and their versions, so a
+client sending it back in If-None-Match gets a 304 after a couple of primary-key
+lookups, without running the endpoint's queries or serializing anything.
+ETags are weak because GZipMiddleware may compress the body.
+"""
+import hashlib
+import os
+from typing import Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+# Clients may keep a copy but must revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def scope_versions(db: Session, scopes: Iterable[str]) -> int:
+    """Sum of the scopes' change counters (0 for scopes never written)."""
+    scopes = list(scopes)
+    if not scopes:
+        return 0
+    params = {f"s{i}": scope for i, scope in enumerate(scopes)}
+    placeholders = ", ".join(f":{name}" for name in params)
+    return db.execute(
+        text(f"SELECT total(version) FROM cache_versions WHERE scope IN ({placeholders})"), params
+    ).scalar() or 0
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the given parts; include the scope names so different users never share one."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match (a list of tags, or *)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:]
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 to return instead of the body when the client's copy is current, else None."""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
@@ -0,0 +1,218 @@
+"""
+In-process micro-batching inference server for the emotion model.
+Chat handlers await analyze(content). A collector task gathers the requests of
+all concurrent chats into batches of up to EMOTION_BATCH_MAX_SIZE, waiting at
+most EMOTION_BATCH_MAX_WAIT_MS after the first request of a batch, and runs each
+batch vectorized on a pool of EMOTION_INFERENCE_WORKERS threads.
+
+A request not answered within EMOTION_INFERENCE_TIMEOUT_MS, or whose batch
+fails, is analysed with rule-based-v1 instead, so a slow or broken model never
+stalls the chat. Models that are cheap enough to run inline (the rule-based
+one) bypass the queue entirely.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+from services.emotion_analysis import analyze as rule_based_analyze
+from services.emotion_model import AnalysisResult, EmotionModel, get_model
+from services.metrics import EMOTION_BATCH_SECONDS, EMOTION_BATCH_SIZE, EMOTION_FALLBACKS
+
+logger = get_logger("inference_server")
+
+EMOTION_BATCH_MAX_SIZE = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "32"))
+EMOTION_BATCH_MAX_WAIT_MS = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "5"))
+EMOTION_INFERENCE_WORKERS = int(os.getenv("EMOTION_INFERENCE_WORKERS", "2"))
+EMOTION_INFERENCE_TIMEOUT_MS = float(os.getenv("EMOTION_INFERENCE_TIMEOUT_MS", "200"))
+EMOTION_QUEUE_SIZE = int(os.getenv("EMOTION_QUEUE_SIZE", "10000"))
+LATENCY_SAMPLES = 1000
+
+
+def _size_bucket(size: int) -> str:
+    """Power-of-two bucket label for a batch size, to keep metric cardinality bounded."""
+    bucket = 1
+    while bucket < size:
+        bucket *= 2
+    return str(bucket)
+
+
+class BatchStats:
+    __slots__ = ("batches", "items", "seconds", "latencies_ms")
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.latencies_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+
+class InferenceServer:
+    """Micro-batches emotion analysis requests across all chats."""
+
+    def __init__(
+        self,
+        model: Optional[EmotionModel] = None,
+        max_batch_size: int = EMOTION_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMOTION_BATCH_MAX_WAIT_MS,
+        workers: int = EMOTION_INFERENCE_WORKERS,
+        timeout_ms: float = EMOTION_INFERENCE_TIMEOUT_MS,
+    ):
+        self._model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.workers = max(1, workers)
+        self.timeout = timeout_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # batch size -> model time / throughput for batches of that size
+        self._batch_stats: Dict[int, BatchStats] = {}
+        # submit -> result, including queueing
+        self._request_latencies_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.fallbacks: Dict[str, int] = {"timeout": 0, "error": 0, "overload": 0}
+
+    @property
+    def model(self) -> EmotionModel:
+        """The given model, or else the process-wide one (emotion_model.get_model), loaded on first use."""
+        if self._model is None:
+            self._model = get_model()
+        return self._model
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=EMOTION_QUEUE_SIZE)
+        self._slots = asyncio.Semaphore(self.workers)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="emotion-inference")
+        self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _fallback(self, content: str, reason: str) -> AnalysisResult:
+        self.fallbacks[reason] += 1
+        EMOTION_FALLBACKS.labels(reason).inc()
+        return rule_based_analyze(content)
+
+    async def analyze(self, content: str) -> AnalysisResult:
+        """Same contract as emotion_analysis.analyze(); raises ValueError for empty content."""
+        if not content or not isinstance(content, str):
+            raise ValueError("Emotion analysis requires non-empty string content")
+        if not self.model.batched:
+            return self.model.predict_batch([content])[0]
+
+        self.start()
+        submitted = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((content, future))
+        except asyncio.QueueFull:
+            return self._fallback(content, "overload")
+        try:
+            # On timeout the future is cancelled, so the collector skips it if it has not run yet
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return self._fallback(content, "timeout")
+        self._request_latencies_ms.append((time.perf_counter() - submitted) * 1000)
+        return result
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [(content, future) for content, future in batch if not future.done()]
+            if not batch:
+                continue
+            # Bounded in-flight batches: while all workers are busy, the next batch keeps filling
+            await self._slots.acquire()
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        contents = [content for content, _ in batch]
+        try:
+            started = time.perf_counter()
+            results = await loop.run_in_executor(self._executor, self.model.predict_batch, contents)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            logger.warning("inference.batch_failed", extra={"batch_size": len(batch), "error": str(e)})
+            for content, future in batch:
+                if not future.done():
+                    future.set_result(self._fallback(content, "error"))
+            return
+        finally:
+            self._slots.release()
+
+        self._record(len(batch), elapsed)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int, elapsed: float):
+        stats = self._batch_stats.get(size)
+        if stats is None:
+            stats = self._batch_stats[size] = BatchStats()
+        stats.batches += 1
+        stats.items += size
+        stats.seconds += elapsed
+        stats.latencies_ms.append(elapsed * 1000)
+        EMOTION_BATCH_SIZE.observe(size)
+        EMOTION_BATCH_SECONDS.labels(_size_bucket(size)).observe(elapsed)
+
+    def stats(self) -> dict:
+        def pct(samples: List[float], p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        by_size = {}
+        for size, stats in sorted(self._batch_stats.items()):
+            samples = sorted(stats.latencies_ms)
+            by_size[str(size)] = {
+                "batches": stats.batches,
+                "items_per_second": round(stats.items / stats.seconds, 1) if stats.seconds else None,
+                "latency_ms": {"mean": round(stats.seconds / stats.batches * 1000, 3),
+                               "p50": pct(samples, 0.5), "p99": pct(samples, 0.99)},
+            }
+        requests = sorted(self._request_latencies_ms)
+        return {
+            "model_version": self.model.model_version,
+            "batched": self.model.batched,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "fallbacks": dict(self.fallbacks),
+            "request_latency_ms": {"p50": pct(requests, 0.5), "p95": pct(requests, 0.95), "p99": pct(requests, 0.99)},
+            "by_batch_size": by_size,
+        }
@@ -0,0 +1,120 @@
+"""
+Full-text search over chat transcripts (SQLite FTS5, see migrations.add_message_search_index).
+Results are ranked by bm25, highlighted, scoped to the appointments a therapist
+may see (assigned to them or not yet assigned) and optionally filtered by the
+message's emotion_analysis label / risk level.
+With chat sharding every shard has its own index: search_shards() queries them
+in parallel and merges the hits by score (bm25 statistics are per shard, so
+scores from different shards are close to, not exactly, comparable).
+Archived appointments (services/archive.py) have no index; archived_in_scope()
+counts those the therapist could see, so responses can say what was not searched.
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services.chat_shards import ChatShards
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_TOKENS = 24
+
+
+def build_match_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: every word must match, a trailing * keeps prefix search."""
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", query):
+        terms.append(f'"{word}"' + ("*" if star else ""))
+    return " ".join(terms)
+
+
+def search_available(db: Session) -> bool:
+    return db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    )).first() is not None
+
+
+def archived_in_scope(db: Session, therapist_id: str) -> int:
+    """Archived appointments in the therapist's search scope, whose messages search cannot see."""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM archived_appointments x
+        JOIN appointments a ON a.id = x.appointment_id
+        WHERE a.therapist_id = :therapist_id OR a.therapist_id IS NULL
+    """), {"therapist_id": therapist_id}).scalar()
+
+
+def search_messages(
+    db: Session,
+    therapist_id: str,
+    query: str,
+    emotion_label: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[dict]:
+    """Ranked hits (best first). Fetches one extra row so callers can tell if there is another page."""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    filters = ["messages_fts MATCH :match", "(a.therapist_id = :therapist_id OR a.therapist_id IS NULL)"]
+    params = {"match": match, "therapist_id": therapist_id, "limit": limit + 1, "offset": offset,
+              "hl_start": HIGHLIGHT_START, "hl_end": HIGHLIGHT_END}
+    if emotion_label:
+        filters.append("e.emotion_label = :emotion_label")
+        params["emotion_label"] = emotion_label
+    if risk_level:
+        filters.append("e.risk_level = :risk_level")
+        params["risk_level"] = risk_level
+
+    rows = db.execute(text(f"""
+        SELECT m.id, m.appointment_id, m.seq, m.sender, m.timestamp,
+               snippet(messages_fts, 0, :hl_start, :hl_end, '...', {SNIPPET_TOKENS}) AS highlight,
+               messages_fts.rank AS rank,
+               e.emotion_label, e.risk_level
+        FROM messages_fts
+        JOIN messages m ON m.rowid = messages_fts.rowid
+        JOIN appointments a ON a.id = m.appointment_id
+        LEFT JOIN emotion_analysis e ON e.message_id = m.id
+        WHERE {" AND ".join(filters)}
+        ORDER BY messages_fts.rank
+        LIMIT :limit OFFSET :offset
+    """), params).all()
+
+    return [
+        {
+            "message_id": r.id,
+            "appointment_id": r.appointment_id,
+            "seq": r.seq,
+            "sender": r.sender,
+            "timestamp": r.timestamp,
+            "highlight": r.highlight,
+            "score": round(-r.rank, 4),
+            "emotion_label": r.emotion_label,
+            "risk_level": r.risk_level,
+        }
+        for r in rows
+    ]
+
+
+def search_shards(
+    shards: ChatShards,
+    therapist_id: str,
+    query: str,
+    emotion_label: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[dict]:
+    """search_messages() over every chat shard: each shard's top offset + limit hits, merged by score."""
+    if shards.count == 1:
+        return shards.gather(
+            lambda db: search_messages(db, therapist_id, query, emotion_label, risk_level, limit, offset)
+        )[0]
+    per_shard = shards.gather(
+        lambda db: search_messages(db, therapist_id, query, emotion_label, risk_level, offset + limit, 0)
+    )
+    hits = sorted((hit for hits in per_shard for hit in hits), key=lambda hit: hit["score"], reverse=True)
+    return hits[offset:offset + limit + 1]
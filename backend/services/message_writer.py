@@ -0,0 +1,175 @@
+"""
+Group-commit writer for appointment chat messages.
+Collects Message + EmotionAnalysis pairs from every open appointment chat for a
+few milliseconds and commits them in one transaction, so SQLite pays one fsync
+per batch instead of one per message.
+submit() resolves only after the batch holding the pair is durable, and raises
+if that pair could not be saved (the rest of the batch is unaffected).
+The writer also assigns each message its per-appointment sequence number.
+flush() waits for one appointment's pairs still in flight (e.g. before its
+session summary is computed).
+A batch is split by chat shard (services/chat_shards.py) and each part is
+committed through that shard's single database writer (services/db_writer.py),
+which can fold it into one transaction with other pending writes; the parts
+commit in parallel.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from models import Message, EmotionAnalysis
+from services.chat_shards import ChatShards
+from services.db_writer import DatabaseWriter
+
+BATCH_WINDOW_MS = float(os.getenv("MESSAGE_BATCH_WINDOW_MS", "2"))
+MAX_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "500"))
+# Upper bound on appointments whose last sequence number is kept in memory
+SEQ_CACHE_SIZE = 10000
+
+Pending = Tuple[Message, EmotionAnalysis, asyncio.Future]
+
+
+class MessageWriter:
+    """Single background task that owns all chat message commits."""
+
+    def __init__(self, shards: ChatShards, window_ms: float = BATCH_WINDOW_MS, max_batch_size: int = MAX_BATCH_SIZE):
+        self.shards = shards
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_batch_size = 0
+        # appointment_id -> last committed seq (only touched from its shard's writer thread)
+        self._last_seq: Dict[str, int] = {}
+        # appointment_id -> futures of its submitted, not yet committed pairs
+        self._in_flight: Dict[str, Set[asyncio.Future]] = {}
+
+    def start(self):
+        """Start the writer task on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Commit whatever is still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+
+    async def submit(self, message: Message, emotion: EmotionAnalysis) -> None:
+        """Queue a message and its analysis; returns once both are committed."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        in_flight = self._in_flight.setdefault(message.appointment_id, set())
+        in_flight.add(future)
+        self._queue.put_nowait((message, emotion, future))
+        try:
+            await future
+        finally:
+            in_flight.discard(future)
+            if not in_flight and self._in_flight.get(message.appointment_id) is in_flight:
+                del self._in_flight[message.appointment_id]
+
+    async def flush(self, appointment_id: str) -> None:
+        """Wait until the appointment's pairs submitted so far are committed (or have failed)."""
+        pending = list(self._in_flight.get(appointment_id, ()))
+        if pending:
+            await asyncio.wait(pending)
+
+    def _drain(self, batch: List[Pending]) -> Tuple[List[Pending], bool]:
+        """Pull queued pairs into the batch; also reports whether stop() was requested."""
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            # Give other chats a moment to join this transaction, but only when
+            # there is concurrency to gain from; a lone chat commits immediately
+            if self.window > 0 and (self._last_batch_size > 1 or not self._queue.empty()):
+                await asyncio.sleep(self.window)
+            batch, stopping = self._drain([item])
+            self._last_batch_size = len(batch)
+            await self._write_batch(batch)
+            if stopping:
+                return
+
+    async def _write_batch(self, batch: List[Pending]):
+        if not batch:
+            return
+        groups: Dict[int, List[Pending]] = {}
+        for item in batch:
+            groups.setdefault(self.shards.shard(item[0].appointment_id).index, []).append(item)
+        await asyncio.gather(*(
+            self._write_group(self.shards.shards[index].writer, group) for index, group in groups.items()
+        ))
+
+    async def _write_group(self, writer: DatabaseWriter, batch: List[Pending]):
+        pairs = [(message, emotion) for message, emotion, _ in batch]
+        try:
+            await writer.submit(lambda db: self._add(db, pairs))
+            errors: List[Optional[Exception]] = [None] * len(batch)
+        except Exception as e:
+            self._forget_seq(pairs)
+            if len(pairs) == 1:
+                errors = [e]
+            else:
+                # Retry one by one to isolate bad rows (each pair in its own savepoint)
+                errors = await self._retry(writer, pairs)
+        for (_, _, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    async def _retry(self, writer: DatabaseWriter, pairs: List[Tuple[Message, EmotionAnalysis]]) -> List[Optional[Exception]]:
+        results = await asyncio.gather(
+            *(writer.submit(lambda db, pair=pair: self._add(db, [pair])) for pair in pairs),
+            return_exceptions=True,
+        )
+        return [result if isinstance(result, Exception) else None for result in results]
+
+    def _assign_seq(self, db, message: Message):
+        last = self._last_seq.get(message.appointment_id)
+        if last is None:
+            if len(self._last_seq) >= SEQ_CACHE_SIZE:
+                self._last_seq.clear()
+            last = db.query(func.max(Message.seq)).filter(
+                Message.appointment_id == message.appointment_id
+            ).scalar() or 0
+        message.seq = last + 1
+        self._last_seq[message.appointment_id] = message.seq
+
+    def _add(self, db, pairs: List[Tuple[Message, EmotionAnalysis]]):
+        """Write unit: insert the pairs (runs on the writer thread)."""
+        try:
+            for message, emotion in pairs:
+                if message.seq is not None:
+                    # Rerun after a rolled-back attempt: the cached seq is ahead of the database
+                    self._last_seq.pop(message.appointment_id, None)
+                self._assign_seq(db, message)
+                db.add(message)
+                db.add(emotion)
+            db.flush()
+        except Exception:
+            self._forget_seq(pairs)
+            raise
+
+    def _forget_seq(self, pairs: List[Tuple[Message, EmotionAnalysis]]):
+        # Re-read from the DB next time (another worker may have written, or the write rolled back)
+        for message, _ in pairs:
+            self._last_seq.pop(message.appointment_id, None)
@@ -0,0 +1,188 @@
+"""
+Prometheus metrics for the backend, served at GET /metrics.
+Hot paths record into prometheus_client metrics directly (about 1us per event);
+per-request DB query count/time is accumulated through SQLAlchemy engine events
+into a per-request object and observed once when the request finishes.
+See benchmarks/bench_metrics.py for the per-event overhead.
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Latency buckets in seconds, 100us .. 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+WEBSOCKET_CONNECTIONS = Gauge("websocket_connections", "Open WebSocket connections", ["chat"])
+MESSAGE_RELAY_SECONDS = Histogram(
+    "chat_message_relay_seconds", "Appointment chat: message received -> committed and queued to participants",
+    buckets=LATENCY_BUCKETS,
+)
+ANALYZE_SECONDS = Histogram(
+    "emotion_analyze_seconds", "Emotion analysis of one chat message, including micro-batch queueing",
+    buckets=LATENCY_BUCKETS,
+)
+EMOTION_BATCH_SIZE = Histogram(
+    "emotion_inference_batch_size", "Messages per emotion model micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMOTION_BATCH_SECONDS = Histogram(
+    "emotion_inference_batch_seconds", "Emotion model time per micro-batch, by batch size (rounded up to a power of two)",
+    ["batch_size"], buckets=LATENCY_BUCKETS,
+)
+EMOTION_FALLBACKS = Counter(
+    "emotion_inference_fallbacks_total", "Messages analysed by rule-based-v1 instead of the configured model",
+    ["reason"],
+)
+GROQ_REQUEST_SECONDS = Histogram("groq_request_duration_seconds", "Groq chat completion latency", buckets=LATENCY_BUCKETS)
+GROQ_ERRORS = Counter("groq_request_errors_total", "Failed Groq chat completion calls")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+DB_QUERY_SECONDS_PER_REQUEST = Histogram(
+    "db_query_seconds_per_request", "Time spent in SQL statements per HTTP request", buckets=LATENCY_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_seconds", "Session commit duration (flush + COMMIT, including SQLite's journal fsync)",
+    buckets=LATENCY_BUCKETS,
+)
+DB_WRITE_BATCH_SIZE = Histogram(
+    "db_write_batch_size", "Write units per single-writer transaction", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+DB_WRITE_SECONDS = Histogram(
+    "db_write_seconds", "Write unit queued -> committed by the single writer", buckets=LATENCY_BUCKETS,
+)
+FSYNC_SECONDS = Histogram("fsync_seconds", "Explicit fsync duration (archive segments)", ["target"], buckets=LATENCY_BUCKETS)
+ASSIGNMENT_WAIT_SECONDS = Histogram(
+    "assignment_wait_seconds", "Appointment created -> therapist assigned by the scheduler", ["risk_level"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400),
+)
+ASSIGNMENT_QUEUE_DEPTH = Gauge("assignment_queue_depth", "Unassigned appointments waiting in the scheduler queue")
+ASSIGNMENT_CLAIM_CONFLICTS = Counter(
+    "assignment_claim_conflicts_total", "Claims that lost the race because the appointment was already taken",
+    ["source"],
+)
+
+
+class RequestDbStats:
+    __slots__ = ("queries", "seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        # statement text -> executions; only collected while the request is being profiled
+        self.statements: Optional[Dict[str, int]] = None
+
+
+# Set per HTTP request; worker threads get a copy of the context, so they update the same object
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def track_statements() -> Tuple[RequestDbStats, Optional[object]]:
+    """Start collecting statement texts for the current request (or a new scope, e.g. one WebSocket message).
+
+    Returns the stats object and the contextvar token to reset if a new scope was opened.
+    """
+    stats = _request_db_stats.get()
+    token = None
+    if stats is None:
+        stats = RequestDbStats()
+        token = _request_db_stats.set(stats)
+    stats.statements = {}
+    return stats, token
+
+
+def instrument_engine(engine):
+    """Count statements and time spent in them for the current request.
+
+    Hooks the dialect's do_execute* events (one dispatch per statement) rather than
+    the before/after_cursor_execute pair, which costs several times more per query.
+    """
+
+    def _record(started: float, statement: str):
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += time.perf_counter() - started
+            if stats.statements is not None:
+                stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+    @event.listens_for(engine, "do_execute")
+    def _do_execute(cursor, statement, parameters, context):
+        started = time.perf_counter()
+        cursor.execute(statement, parameters)
+        _record(started, statement)
+        return True
+
+    @event.listens_for(engine, "do_executemany")
+    def _do_executemany(cursor, statement, parameters, context):
+        started = time.perf_counter()
+        cursor.executemany(statement, parameters)
+        _record(started, statement)
+        return True
+
+    @event.listens_for(engine, "do_execute_no_params")
+    def _do_execute_no_params(cursor, statement, context):
+        started = time.perf_counter()
+        cursor.execute(statement)
+        _record(started, statement)
+        return True
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["metrics_commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    started = session.info.pop("metrics_commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency per route template plus per-request DB stats."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestDbStats()
+        token = _request_db_stats.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db_stats.reset(token)
+            route = scope.get("route")
+            # Label by template (/appointments/{appointment_id}), never the raw path
+            route_label = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_label, str(status)).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.observe(stats.queries)
+            DB_QUERY_SECONDS_PER_REQUEST.observe(stats.seconds)
+
+
+def render_metrics():
+    """(body, content type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
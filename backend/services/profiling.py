@@ -0,0 +1,227 @@
+"""
+Opt-in profiling of sampled HTTP requests and WebSocket messages.
+A sampled request runs under a stack sampler: a background thread that reads
+sys._current_frames() every PROFILE_INTERVAL_MS. It samples every thread, so
+sync endpoints running in the threadpool, bcrypt, SQLite waits and Groq calls
+all show up, and idle threads are dropped. Each profiled request also records
+its SQL statements, and any statement repeated PROFILE_REPEAT_THRESHOLD times
+is logged as a likely N+1. When a profiled request is slower than
+PROFILE_SLOW_MS its stacks are written to PROFILE_DIR in collapsed ("folded")
+format, for flamegraph.pl or speedscope, next to a JSON summary.
+
+Only one profile runs at a time; while it runs, other requests are not sampled.
+Settings can be changed at runtime through PUT /admin/profiling.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from logging_config import get_logger
+from services.metrics import track_statements
+
+logger = get_logger("profiling")
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_REPEAT_THRESHOLD = 10
+MAX_STACK_DEPTH = 64
+
+# (file name suffix, function) pairs where a thread is parked, not working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+class StackSampler:
+    """Collects folded stacks of all threads except its own until stopped."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = PROFILE_ENABLED
+        self.sample_rate = PROFILE_SAMPLE_RATE
+        self.slow_ms = PROFILE_SLOW_MS
+        self.interval_ms = PROFILE_INTERVAL_MS
+        self.directory = PROFILE_DIR
+        self._busy = threading.Lock()
+        self.profiled = 0
+        self.captured = 0
+        self.repeated_statements = 0
+
+    def settings(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval_ms,
+            "directory": self.directory,
+            "profiled": self.profiled,
+            "captured": self.captured,
+            "repeated_statements": self.repeated_statements,
+        }
+
+    def update(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+               slow_ms: Optional[float] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        logger.info("profiling.updated", extra={
+            "enabled": self.enabled, "sample_rate": self.sample_rate, "slow_ms": self.slow_ms
+        })
+
+    @contextmanager
+    def profile(self, kind: str, **details):
+        """Profile the enclosed block if this call is sampled; a no-op otherwise.
+
+        Yields the details dict, so the block can add fields (e.g. the response status).
+        """
+        if not self.enabled or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield details
+            return
+        stats, token = track_statements()
+        sampler = StackSampler(self.interval_ms / 1000)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield details
+        finally:
+            stacks = sampler.stop()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if token is not None:
+                token.var.reset(token)
+            self._busy.release()
+            self.profiled += 1
+            self._finish(kind, details, elapsed_ms, stats, stacks, sampler.samples)
+
+    def _finish(self, kind: str, details: dict, elapsed_ms: float, stats, stacks: Counter, samples: int):
+        repeated = [(s, n) for s, n in stats.statements.items() if n >= PROFILE_REPEAT_THRESHOLD]
+        if repeated:
+            self.repeated_statements += 1
+            statement, count = max(repeated, key=lambda item: item[1])
+            logger.warning("profiling.repeated_statement", extra={
+                "kind": kind, **details, "count": count, "statement": statement[:200]
+            })
+        if elapsed_ms < self.slow_ms:
+            return
+        self.captured += 1
+        summary = {
+            "kind": kind,
+            **details,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "samples": samples,
+            "interval_ms": self.interval_ms,
+            "db_queries": stats.queries,
+            "db_seconds": round(stats.seconds, 6),
+            "statements": [
+                {"count": n, "statement": s}
+                for s, n in sorted(stats.statements.items(), key=lambda item: -item[1])
+            ],
+            "captured_at": datetime.utcnow().isoformat(),
+        }
+        logger.info("profiling.slow_capture", extra={
+            "kind": kind, **details, "elapsed_ms": summary["elapsed_ms"], "db_queries": stats.queries
+        })
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, summary, stacks)
+        except RuntimeError:
+            self._write(summary, stacks)
+
+    def _write(self, summary: dict, stacks: Counter):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(
+                self.directory,
+                f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{summary['kind']}-{int(summary['elapsed_ms'])}ms",
+            )
+            with open(base + ".folded", "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            with open(base + ".json", "w") as f:
+                json.dump(summary, f, indent=2)
+            self._prune()
+        except OSError:
+            logger.exception("profiling.write_failed")
+
+    def _prune(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".json"))
+        for name in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+            stem = os.path.join(self.directory, name[:-len(".json")])
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(stem + suffix)
+                except FileNotFoundError:
+                    pass
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: profile a sampled fraction of HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with profiler.profile("http", method=scope["method"], path=scope["path"]) as details:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    details["status"] = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
@@ -0,0 +1,170 @@
+"""
+Real-time risk alert pipeline.
+The chat loop publishes committed medium/high-risk emotion_analysis results with
+a non-blocking put; a background task does everything else off the relay path:
+debounces repeat alerts per appointment (a medium -> high escalation always goes
+through) and pushes the alert to every subscribed therapist socket. A second task
+writes one notification per alert, in batches, so a slow database write never
+holds back the next alert's fan-out. End-to-end latency (commit -> alert queued to
+sockets) is tracked per alert.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from logging_config import get_logger
+from services.ws_connection import ChatConnection
+
+logger = get_logger("risk_alerts")
+
+ALERT_RISK_LEVELS = ("medium", "high")
+ALERT_DEBOUNCE_SECONDS = float(os.getenv("RISK_ALERT_DEBOUNCE_SECONDS", "300"))
+ALERT_QUEUE_SIZE = int(os.getenv("RISK_ALERT_QUEUE_SIZE", "10000"))
+LATENCY_SAMPLES = 1000
+
+_SEVERITY = {"medium": 1, "high": 2}
+
+
+class RiskAlertPipeline:
+    """In-process publisher/subscriber for risk alerts."""
+
+    def __init__(self, notify: Optional[Callable[[List[dict]], None]] = None,
+                 debounce_seconds: float = ALERT_DEBOUNCE_SECONDS):
+        # notify(alerts) persists one notification per alert; runs in a worker thread
+        self.notify = notify
+        self.debounce_seconds = debounce_seconds
+        self.subscribers: Set[ChatConnection] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Alerts already fanned out, waiting for their notification write
+        self._pending: List[dict] = []
+        self._pending_ready: Optional[asyncio.Event] = None
+        self._persist_task: Optional[asyncio.Task] = None
+        # appointment_id -> (monotonic time of last alert, severity)
+        self._last_alert: Dict[str, Tuple[float, int]] = {}
+        self._latencies_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.published = 0
+        # Alerts that reached at least one therapist socket / none (no one subscribed)
+        self.delivered = 0
+        self.undelivered = 0
+        self.debounced = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=ALERT_QUEUE_SIZE)
+        self._pending_ready = asyncio.Event()
+        self._task = loop.create_task(self._run())
+        self._persist_task = loop.create_task(self._persist())
+
+    async def stop(self):
+        """Stop fanning out, then write the notifications still pending."""
+        for task in (self._task, self._persist_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._persist_task = None
+        await self._write_pending()
+
+    def publish(self, alert: dict) -> bool:
+        """Queue an alert without waiting. Returns False if it is not alert-worthy or was dropped."""
+        if alert.get("risk_level") not in ALERT_RISK_LEVELS:
+            return False
+        self.start()
+        alert.setdefault("committed_at", time.perf_counter())
+        try:
+            self._queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def subscribe(self, conn: ChatConnection):
+        self.start()
+        self.subscribers.add(conn)
+
+    def unsubscribe(self, conn: ChatConnection):
+        self.subscribers.discard(conn)
+
+    def should_alert(self, appointment_id: str, risk_level: str, now: float) -> bool:
+        """Debounce per appointment; escalation to a higher level is never suppressed."""
+        severity = _SEVERITY[risk_level]
+        last = self._last_alert.get(appointment_id)
+        if last is not None:
+            last_time, last_severity = last
+            if now - last_time < self.debounce_seconds and severity <= last_severity:
+                return False
+        self._last_alert[appointment_id] = (now, severity)
+        return True
+
+    def latency_stats(self) -> dict:
+        samples = sorted(self._latencies_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            "published": self.published,
+            "delivered": self.delivered,
+            "undelivered": self.undelivered,
+            "debounced": self.debounced,
+            "dropped": self.dropped,
+            "subscribers": len(self.subscribers),
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(samples[-1], 3) if samples else None},
+        }
+
+    def _prune(self, now: float):
+        expired = [k for k, (t, _) in self._last_alert.items() if now - t >= self.debounce_seconds]
+        for k in expired:
+            del self._last_alert[k]
+
+    async def _run(self):
+        while True:
+            alert = await self._queue.get()
+            now = time.monotonic()
+            if len(self._last_alert) > 10000:
+                self._prune(now)
+            if not self.should_alert(alert["appointment_id"], alert["risk_level"], now):
+                self.debounced += 1
+                continue
+
+            committed_at = alert.pop("committed_at")
+            frame = {"type": "RISK_ALERT", **alert}
+            sent = [conn.send(frame) for conn in list(self.subscribers)]
+            if any(sent):
+                self._latencies_ms.append((time.perf_counter() - committed_at) * 1000)
+                self.delivered += 1
+            else:
+                self.undelivered += 1
+
+            if self.notify is not None:
+                self._pending.append(alert)
+                self._pending_ready.set()
+
+    async def _persist(self):
+        """Write the fanned-out alerts' notifications, everything pending in one call."""
+        while True:
+            await self._pending_ready.wait()
+            self._pending_ready.clear()
+            await self._write_pending()
+
+    async def _write_pending(self):
+        if not self._pending or self.notify is None:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.notify, batch)
+        except Exception:
+            logger.exception("risk_alert.notification_failed", extra={
+                "appointment_ids": sorted({alert["appointment_id"] for alert in batch})
+            })
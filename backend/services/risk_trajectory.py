@@ -0,0 +1,185 @@
+"""
+Per-appointment risk trajectory: an exponentially weighted risk score, counts
+per emotion and the last high-risk time over the user's messages, updated in
+O(1) as each analysed message is committed.
+
+State lives in memory while an appointment is in use and is written to the
+appointment_risk_state table by a background task every
+RISK_STATE_FLUSH_SECONDS (and on shutdown). An appointment seen for the first
+time with existing history is bootstrapped once from its emotion_analysis rows.
+Therapist messages are not counted: the trajectory tracks the user.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from models import AppointmentRiskState, EmotionAnalysis, Message
+from services.db_writer import DatabaseWriter
+
+logger = get_logger("risk_trajectory")
+
+# Weight of the newest message in the moving average
+RISK_EWMA_ALPHA = float(os.getenv("RISK_EWMA_ALPHA", "0.3"))
+RISK_STATE_FLUSH_SECONDS = float(os.getenv("RISK_STATE_FLUSH_SECONDS", "5"))
+# In-memory states untouched for this long are dropped after they have been persisted
+RISK_STATE_IDLE_SECONDS = float(os.getenv("RISK_STATE_IDLE_SECONDS", "600"))
+# EWMA change below this reads as "steady"
+TREND_EPSILON = 0.01
+
+
+class RiskTrajectory:
+    __slots__ = ("ewma_risk", "previous_ewma", "message_count", "emotion_counts",
+                 "last_high_risk_at", "updated_at", "dirty", "touched")
+
+    def __init__(self, ewma_risk: float = 0.0, message_count: int = 0,
+                 emotion_counts: Optional[Dict[str, int]] = None,
+                 last_high_risk_at: Optional[datetime] = None, updated_at: Optional[datetime] = None):
+        self.ewma_risk = ewma_risk
+        self.previous_ewma = ewma_risk
+        self.message_count = message_count
+        self.emotion_counts: Dict[str, int] = dict(emotion_counts or {})
+        self.last_high_risk_at = last_high_risk_at
+        self.updated_at = updated_at
+        self.dirty = False
+        self.touched = time.monotonic()
+
+    def update(self, emotion_label: str, risk_level: str, risk_score: float, timestamp: datetime,
+               alpha: float = RISK_EWMA_ALPHA):
+        self.previous_ewma = self.ewma_risk
+        if self.message_count == 0:
+            self.ewma_risk = risk_score
+        else:
+            self.ewma_risk = alpha * risk_score + (1 - alpha) * self.ewma_risk
+        self.message_count += 1
+        self.emotion_counts[emotion_label] = self.emotion_counts.get(emotion_label, 0) + 1
+        if risk_level == "high":
+            self.last_high_risk_at = timestamp
+        self.updated_at = timestamp
+        self.dirty = True
+        self.touched = time.monotonic()
+
+    def trend(self) -> str:
+        delta = self.ewma_risk - self.previous_ewma
+        if delta > TREND_EPSILON:
+            return "rising"
+        if delta < -TREND_EPSILON:
+            return "falling"
+        return "steady"
+
+    def to_dict(self) -> dict:
+        return {
+            "ewma_risk": round(self.ewma_risk, 4),
+            "trend": self.trend(),
+            "message_count": self.message_count,
+            "emotion_counts": dict(self.emotion_counts),
+            "last_high_risk_at": self.last_high_risk_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class RiskTrajectoryTracker:
+    """In-memory trajectories keyed by appointment id, persisted in the background."""
+
+    def __init__(self, writer: DatabaseWriter, in_use: Callable[[str], bool] = lambda _: False,
+                 flush_seconds: float = RISK_STATE_FLUSH_SECONDS):
+        self.writer = writer
+        # in_use(appointment_id): true while the appointment has open sockets, which keeps its state in memory
+        self.in_use = in_use
+        self.flush_seconds = flush_seconds
+        self.states: Dict[str, RiskTrajectory] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, db: Session, appointment_id: str) -> RiskTrajectory:
+        """The appointment's trajectory, from memory, the state table, or (once) its message history."""
+        state = self.states.get(appointment_id)
+        if state is not None:
+            state.touched = time.monotonic()
+            return state
+        row = db.query(AppointmentRiskState).filter(AppointmentRiskState.appointment_id == appointment_id).first()
+        if row is not None:
+            state = RiskTrajectory(row.ewma_risk, row.message_count, row.emotion_counts,
+                                   row.last_high_risk_at, row.updated_at)
+        else:
+            state = RiskTrajectory()
+            history = db.query(
+                EmotionAnalysis.emotion_label, EmotionAnalysis.risk_level, EmotionAnalysis.risk_score, Message.timestamp
+            ).join(Message, Message.id == EmotionAnalysis.message_id).filter(
+                Message.appointment_id == appointment_id, Message.sender == "user"
+            ).order_by(Message.seq)
+            for emotion_label, risk_level, risk_score, timestamp in history:
+                state.update(emotion_label, risk_level, risk_score, timestamp)
+        self.states[appointment_id] = state
+        return state
+
+    def record(self, appointment_id: str, emotion_label: str, risk_level: str, risk_score: float,
+               timestamp: datetime) -> Optional[RiskTrajectory]:
+        """O(1) update for a committed user message. The state must have been load()ed."""
+        state = self.states.get(appointment_id)
+        if state is None:
+            return None
+        state.update(emotion_label, risk_level, risk_score, timestamp)
+        self.start()
+        return state
+
+    def flush(self):
+        """Write dirty states in one transaction and drop idle ones from memory."""
+        dirty = [(appointment_id, state) for appointment_id, state in list(self.states.items()) if state.dirty]
+        if dirty:
+            rows = []
+            for appointment_id, state in dirty:
+                state.dirty = False
+                rows.append({
+                    "appointment_id": appointment_id,
+                    "ewma_risk": state.ewma_risk,
+                    "message_count": state.message_count,
+                    "emotion_counts": dict(state.emotion_counts),
+                    "last_high_risk_at": state.last_high_risk_at,
+                    "updated_at": state.updated_at,
+                })
+            statement = sqlite_insert(AppointmentRiskState.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=["appointment_id"],
+                set_={column: statement.excluded[column] for column in rows[0] if column != "appointment_id"},
+            )
+            try:
+                self.writer.run(lambda db: db.execute(statement, rows))
+            except Exception:
+                for _, state in dirty:
+                    state.dirty = True
+                raise
+
+        cutoff = time.monotonic() - RISK_STATE_IDLE_SECONDS
+        for appointment_id, state in list(self.states.items()):
+            if not state.dirty and state.touched < cutoff and not self.in_use(appointment_id):
+                del self.states[appointment_id]
+
+    def start(self):
+        if self.flush_seconds <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await loop.run_in_executor(None, self.flush)
+            except Exception as e:
+                logger.warning("risk_trajectory.flush_failed", extra={"error": str(e)})
@@ -0,0 +1,222 @@
+"""
+Session summaries, materialized when a therapist ends a session (END_SESSION
+frame or POST /appointments/{id}/end-session): start/end time, message counts per
+sender, the emotion histogram and the average / peak risk of the user's messages.
+main waits for the session's messages still in the group-commit writer first, and
+recomputes the summary if a message sent before the end still commits after it.
+The user dashboards read these rows; only appointments without a summary (still
+open, or completed before summaries existed) are aggregated from messages.
+Archiving an appointment summarizes it first, since its messages leave the hot tables.
+Summaries live in the primary database; the messages they aggregate are read on
+the appointment's chat shard (services/chat_shards.py).
+
+Backfill completed appointments that have no summary yet (run from backend/):
+    python -m services.session_summary [--limit 10000]
+"""
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from models import Appointment, EmotionAnalysis, Message, SessionSummary
+from services.chat_shards import ChatShards, open_chat_shards
+from services.db_writer import DatabaseWriter
+
+logger = get_logger("session_summary")
+
+RISK_LEVEL_ORDER = ("low", "medium", "high")
+
+
+def session_summary_values(db: Session, appointment_id: str, ended_at: Optional[datetime] = None) -> Optional[dict]:
+    """Aggregate the appointment's messages into summary row values (None if there is no such appointment)."""
+    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    if appointment is None:
+        return None
+    rows = db.query(
+        Message.sender,
+        EmotionAnalysis.emotion_label,
+        EmotionAnalysis.risk_level,
+        func.count(Message.id),
+        func.sum(EmotionAnalysis.risk_score),
+        func.max(EmotionAnalysis.risk_score),
+        func.min(Message.timestamp),
+        func.max(Message.timestamp),
+    ).outerjoin(EmotionAnalysis, EmotionAnalysis.message_id == Message.id).filter(
+        Message.appointment_id == appointment_id
+    ).group_by(Message.sender, EmotionAnalysis.emotion_label, EmotionAnalysis.risk_level).all()
+
+    counts = {"user": 0, "therapist": 0}
+    emotion_counts: Dict[str, int] = {}
+    risk_level_counts = dict.fromkeys(RISK_LEVEL_ORDER, 0)
+    high_risk_count = 0
+    risk_sum = 0.0
+    peak_score, peak_level = 0.0, "low"
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+    for sender, emotion_label, risk_level, count, score_sum, score_max, min_ts, max_ts in rows:
+        counts[sender] = counts.get(sender, 0) + count
+        first_at = min_ts if first_at is None or (min_ts and min_ts < first_at) else first_at
+        last_at = max_ts if last_at is None or (max_ts and max_ts > last_at) else last_at
+        if risk_level == "high":
+            high_risk_count += count
+        if sender != "user" or emotion_label is None:
+            continue
+        emotion_counts[emotion_label] = emotion_counts.get(emotion_label, 0) + count
+        risk_level_counts[risk_level] = risk_level_counts.get(risk_level, 0) + count
+        risk_sum += score_sum or 0.0
+        if score_max is not None and (score_max > peak_score or (
+                score_max == peak_score and RISK_LEVEL_ORDER.index(risk_level) > RISK_LEVEL_ORDER.index(peak_level))):
+            peak_score, peak_level = score_max, risk_level
+
+    analysed = sum(emotion_counts.values())
+    return {
+        "appointment_id": appointment_id,
+        "started_at": first_at or appointment.created_at,
+        "ended_at": ended_at or last_at or datetime.utcnow(),
+        "user_message_count": counts["user"],
+        "therapist_message_count": counts["therapist"],
+        "emotion_counts": emotion_counts,
+        "risk_level_counts": risk_level_counts,
+        "high_risk_count": high_risk_count,
+        "avg_risk_score": round(risk_sum / analysed, 4) if analysed else 0.0,
+        "peak_risk_score": peak_score,
+        "peak_risk_level": peak_level,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def save_session_summary(db: Session, values: dict):
+    """Upsert a summary row (idempotent); the caller commits."""
+    statement = sqlite_insert(SessionSummary.__table__).values(**values)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["appointment_id"],
+        set_={k: statement.excluded[k] for k in values if k != "appointment_id"},
+    ))
+
+
+def summarize_session_job(shards: ChatShards, writer: DatabaseWriter, appointment_id: str, ended_at: datetime):
+    """Background-task entry point: aggregate on the appointment's shard, upsert through the primary writer.
+    Failures are logged (the session is already ended)."""
+    db = shards.read_session(appointment_id)
+    try:
+        values = session_summary_values(db, appointment_id, ended_at)
+        db.close()
+        if values is not None:
+            writer.run(lambda w: save_session_summary(w, values))
+    except Exception:
+        logger.exception("session_summary.failed", extra={"appointment_id": appointment_id})
+    finally:
+        db.close()
+
+
+class UserSessionStats:
+    """Message statistics over a user's appointments, for the dashboards.
+
+    Per-month figures are keyed by the session's start month for summarized
+    appointments and by the message month for the rest.
+    """
+
+    def __init__(self):
+        self.emotion_counts: Dict[str, int] = defaultdict(int)  # user messages
+        self.risk_level_counts: Dict[str, int] = dict.fromkeys(RISK_LEVEL_ORDER, 0)  # user messages
+        self.high_risk_count = 0  # either sender
+        self.monthly_risk_sum: Dict[str, float] = defaultdict(float)
+        self.monthly_messages: Dict[str, int] = defaultdict(int)
+        self.monthly_emotions: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _add(self, month: str, emotion_label: str, risk_level: str, count: int, risk_sum: float):
+        self.emotion_counts[emotion_label] += count
+        self.risk_level_counts[risk_level or "low"] = self.risk_level_counts.get(risk_level or "low", 0) + count
+        self.monthly_risk_sum[month] += risk_sum
+        self.monthly_messages[month] += count
+        self.monthly_emotions[month][emotion_label] += count
+
+
+def _live_session_rows(db: Session, appointment_ids: List[str]) -> list:
+    """Per (sender, month, emotion, risk level) counts over the appointments' messages on one shard."""
+    month_expr = func.strftime("%Y-%m", Message.timestamp)
+    return db.query(
+        Message.sender,
+        month_expr,
+        EmotionAnalysis.emotion_label,
+        EmotionAnalysis.risk_level,
+        func.count(EmotionAnalysis.analysis_id),
+        func.sum(EmotionAnalysis.risk_score),
+    ).join(EmotionAnalysis, EmotionAnalysis.message_id == Message.id).filter(
+        Message.appointment_id.in_(appointment_ids)
+    ).group_by(Message.sender, month_expr, EmotionAnalysis.emotion_label, EmotionAnalysis.risk_level).all()
+
+
+def user_session_stats(db: Session, appointment_ids: List[str], shards: ChatShards) -> UserSessionStats:
+    stats = UserSessionStats()
+    if not appointment_ids:
+        return stats
+
+    summarized = set()
+    for summary in db.query(SessionSummary).filter(SessionSummary.appointment_id.in_(appointment_ids)):
+        summarized.add(summary.appointment_id)
+        stats.high_risk_count += summary.high_risk_count
+        month = summary.started_at.strftime("%Y-%m")
+        analysed = sum(summary.emotion_counts.values())
+        stats.monthly_risk_sum[month] += summary.avg_risk_score * analysed
+        stats.monthly_messages[month] += analysed
+        for label, count in summary.emotion_counts.items():
+            stats.emotion_counts[label] += count
+            stats.monthly_emotions[month][label] += count
+        for level, count in summary.risk_level_counts.items():
+            stats.risk_level_counts[level] = stats.risk_level_counts.get(level, 0) + count
+
+    remaining = [a for a in appointment_ids if a not in summarized]
+    # Open sessions: aggregated on every shard holding one, in parallel
+    for rows in shards.gather_by_appointment(remaining, _live_session_rows):
+        for sender, month, emotion_label, risk_level, count, risk_sum in rows:
+            if risk_level == "high":
+                stats.high_risk_count += count
+            if sender == "user":
+                stats._add(month or "", emotion_label, risk_level, count, risk_sum or 0.0)
+    return stats
+
+
+def unsummarized_completed(db: Session, limit: int) -> List[str]:
+    return [row.id for row in db.query(Appointment.id).outerjoin(
+        SessionSummary, SessionSummary.appointment_id == Appointment.id
+    ).filter(Appointment.status == "completed", SessionSummary.appointment_id.is_(None)).limit(limit)]
+
+
+def main(argv: Optional[List[str]] = None):
+    from database import SessionLocal
+    from logging_config import configure_logging
+
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description="Backfill session summaries for completed appointments")
+    parser.add_argument("--limit", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    shards = open_chat_shards()
+    db = SessionLocal()
+    try:
+        ids = unsummarized_completed(db, args.limit)
+        for appointment_id in ids:
+            chat_db = shards.read_session(appointment_id)
+            try:
+                # End time of old sessions is unknown: the last message stands in for it
+                values = session_summary_values(chat_db, appointment_id)
+            finally:
+                chat_db.close()
+            if values is not None:
+                save_session_summary(db, values)
+            db.commit()
+        print(json.dumps({"summarized": len(ids)}))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
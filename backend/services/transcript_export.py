@@ -0,0 +1,255 @@
+"""
+Streaming export of chat transcripts joined with emotion_analysis and appointments.
+Rows are read in fixed-size chunks from a streaming cursor and encoded chunk by
+chunk (CSV text, or Parquet row groups when pyarrow is installed), so memory use
+does not grow with the size of the export. With chat sharding
+(services/chat_shards.py) every shard is streamed at once and the streams are
+merged, keeping the export in (appointment_id, seq) order. Appointments moved to
+cold storage (services/archive.py) are read back one frame at a time and merged
+into the same stream, so archiving never removes a transcript from the export.
+
+CLI (run from backend/):
+    python -m services.transcript_export --format csv --out transcripts.csv \
+        [--date-from 2025-01-01] [--date-to 2025-02-01] [--appointment-id ID ...]
+"""
+import argparse
+import csv
+import heapq
+import importlib.util
+import io
+import itertools
+import sys
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from models import Appointment, ArchivedAppointment, Message, EmotionAnalysis
+from services.archive import read_archived_messages
+from services.chat_shards import ChatShards, open_chat_shards
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ("csv", "parquet")
+
+EXPORT_COLUMNS = (
+    ("message_id", Message.id),
+    ("appointment_id", Message.appointment_id),
+    ("seq", Message.seq),
+    ("sender", Message.sender),
+    ("content", Message.content),
+    ("timestamp", Message.timestamp),
+    ("emotion_label", EmotionAnalysis.emotion_label),
+    ("confidence_score", EmotionAnalysis.confidence_score),
+    ("risk_level", EmotionAnalysis.risk_level),
+    ("risk_score", EmotionAnalysis.risk_score),
+    ("model_version", EmotionAnalysis.model_version),
+    ("user_id", Appointment.user_id),
+    ("therapist_id", Appointment.therapist_id),
+    ("appointment_status", Appointment.status),
+    ("created_from", Appointment.created_from),
+)
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+
+def parquet_available() -> bool:
+    # Checked without importing: pyarrow takes ~0.1 s to import and is only needed for Parquet exports
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class ExportQuery(NamedTuple):
+    hot: Select          # messages still in the chat tables, in (appointment_id, seq) order
+    archived: Select     # archived appointments that may have messages in range, by appointment_id
+    date_from: Optional[datetime]
+    date_to: Optional[datetime]
+
+
+def export_query(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    appointment_ids: Optional[Sequence[str]] = None,
+) -> ExportQuery:
+    stmt = (
+        select(*[column for _, column in EXPORT_COLUMNS])
+        .select_from(Message)
+        .join(Appointment, Appointment.id == Message.appointment_id)
+        .outerjoin(EmotionAnalysis, EmotionAnalysis.message_id == Message.id)
+        # Rows an interrupted archive run left behind are exported from the archive copy
+        .where(Message.appointment_id.not_in(select(ArchivedAppointment.appointment_id)))
+    )
+    archived = (
+        select(ArchivedAppointment.appointment_id, Appointment.user_id, Appointment.therapist_id,
+               Appointment.status, Appointment.created_from)
+        .join(Appointment, Appointment.id == ArchivedAppointment.appointment_id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(Message.timestamp >= date_from)
+        # Archived only after its last message
+        archived = archived.where(ArchivedAppointment.archived_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Message.timestamp <= date_to)
+        # No message predates its appointment
+        archived = archived.where(Appointment.created_at <= date_to)
+    if appointment_ids:
+        stmt = stmt.where(Message.appointment_id.in_(list(appointment_ids)))
+        archived = archived.where(ArchivedAppointment.appointment_id.in_(list(appointment_ids)))
+    # Walks ix_messages_appointment_seq, so the export is stable and needs no sort buffer
+    return ExportQuery(stmt.order_by(Message.appointment_id, Message.seq),
+                       archived.order_by(ArchivedAppointment.appointment_id), date_from, date_to)
+
+
+def iter_row_chunks(db: Session, stmt, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+    for partition in result.partitions(chunk_size):
+        yield [tuple(row) for row in partition]
+
+
+def iter_archived_rows(db: Session, archived: list, date_from: Optional[datetime],
+                       date_to: Optional[datetime]) -> Iterator[tuple]:
+    """Export rows of archived appointments, decompressing one appointment's frame at a time."""
+    for appointment_id, user_id, therapist_id, status, created_from in archived:
+        for record in read_archived_messages(db, appointment_id):
+            timestamp = datetime.fromisoformat(record["timestamp"]) if record["timestamp"] else None
+            if date_from is not None and (timestamp is None or timestamp < date_from):
+                continue
+            if date_to is not None and (timestamp is None or timestamp > date_to):
+                continue
+            yield (record["id"], appointment_id, record["seq"], record["sender"], record["content"], timestamp,
+                   record["emotion_label"], record["confidence_score"], record["risk_level"],
+                   record["risk_score"], record["model_version"], user_id, therapist_id, status, created_from)
+
+
+def iter_merged_chunks(shards: ChatShards, query: ExportQuery,
+                       chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """Row chunks from every shard and the archive, merged by appointment_id (an appointment lives in one place)."""
+    sessions = [shard.read_session_factory() for shard in shards.shards]
+    try:
+        # The index is in the primary, which every shard session can read
+        archived = sessions[0].execute(query.archived).all()
+        if len(sessions) == 1 and not archived:
+            yield from iter_row_chunks(sessions[0], query.hot, chunk_size)
+            return
+        streams = [itertools.chain.from_iterable(iter_row_chunks(db, query.hot, chunk_size)) for db in sessions]
+        if archived:
+            archive_db = shards.shards[0].read_session_factory()
+            sessions.append(archive_db)
+            streams.append(iter_archived_rows(archive_db, archived, query.date_from, query.date_to))
+        merged = heapq.merge(*streams, key=lambda row: row[1])
+        while True:
+            rows = list(itertools.islice(merged, chunk_size))
+            if not rows:
+                return
+            yield rows
+    finally:
+        for db in sessions:
+            db.close()
+
+
+def iter_csv(shards: ChatShards, query: ExportQuery, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in iter_merged_chunks(shards, query, chunk_size):
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator between row groups."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ("message_id", pa.string()), ("appointment_id", pa.string()), ("seq", pa.int64()),
+        ("sender", pa.string()), ("content", pa.string()), ("timestamp", pa.timestamp("us")),
+        ("emotion_label", pa.string()), ("confidence_score", pa.float64()), ("risk_level", pa.string()),
+        ("risk_score", pa.float64()), ("model_version", pa.string()), ("user_id", pa.string()),
+        ("therapist_id", pa.string()), ("appointment_status", pa.string()), ("created_from", pa.string()),
+    ])
+
+
+def iter_parquet(shards: ChatShards, query: ExportQuery, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """One Parquet row group per chunk; requires pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # optional dependency
+        raise RuntimeError("Parquet export requires pyarrow")
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in iter_merged_chunks(shards, query, chunk_size):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(shards: ChatShards, fmt: str, query: ExportQuery,
+                chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    if fmt == "parquet":
+        return iter_parquet(shards, query, chunk_size)
+    return iter_csv(shards, query, chunk_size)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export chat transcripts with emotion analytics")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", default="-", help="output file (default: stdout, CSV only)")
+    parser.add_argument("--date-from", type=datetime.fromisoformat)
+    parser.add_argument("--date-to", type=datetime.fromisoformat)
+    parser.add_argument("--appointment-id", action="append", dest="appointment_ids")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet export requires pyarrow (pip install pyarrow)")
+    if args.format == "parquet" and args.out == "-":
+        parser.error("Parquet export needs --out")
+
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        query = export_query(args.date_from, args.date_to, args.appointment_ids)
+        for data in iter_export(open_chat_shards(), args.format, query, args.chunk_size):
+            out.write(data)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
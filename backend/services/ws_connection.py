@@ -0,0 +1,116 @@
+"""
+Per-socket connection wrapper for the chat WebSockets.
+Outgoing frames go into a bounded queue drained by a dedicated writer task, so
+a slow client never blocks whoever is sending to it; a client whose queue
+overflows, or whose send stalls past the send timeout, is evicted (closed).
+receive() enforces an idle timeout and answers client heartbeats
+({"type": "ping"} -> {"type": "pong"}) without surfacing them to the handler.
+Transport-level ping/pong is handled by uvicorn (--ws-ping-interval/--ws-ping-timeout).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from services.frame_codec import send_frame, receive_frame
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "120"))
+
+# Close codes
+CLOSE_IDLE = 1001          # going away
+CLOSE_SLOW_CONSUMER = 1013  # try again later
+CLOSE_REPLACED = 4000      # same role reconnected on another socket
+
+
+class ChatConnection:
+    """One accepted chat WebSocket with its own bounded send queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, on_evict: Optional[Callable[["ChatConnection"], None]] = None,
+                 queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.on_evict = on_evict
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def send(self, frame: dict) -> bool:
+        """Queue a frame without waiting; evicts the client if its queue is full."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.evict(CLOSE_SLOW_CONSUMER, "Slow consumer")
+            return False
+
+    async def send_wait(self, frame: dict):
+        """Queue a frame, waiting for room instead of evicting (bulk replay)."""
+        if not self.closed:
+            await self.queue.put(frame)
+
+    async def receive(self) -> dict:
+        """Next application frame; raises asyncio.TimeoutError after the idle timeout."""
+        while True:
+            timeout = IDLE_TIMEOUT_SECONDS if IDLE_TIMEOUT_SECONDS > 0 else None
+            data = await asyncio.wait_for(receive_frame(self.websocket), timeout)
+            self.last_seen = time.monotonic()
+            if isinstance(data, dict) and data.get("type") == "ping":
+                self.send({"type": "pong", "timestamp": datetime.utcnow()})
+                continue
+            return data
+
+    def evict(self, code: int, reason: str):
+        """Drop the client: stop writing, close the socket and notify the owner."""
+        if self.closed:
+            return
+        self.closed = True
+        if asyncio.current_task() is not self._writer:
+            self._writer.cancel()
+        asyncio.get_running_loop().create_task(self._close(code, reason))
+        if self.on_evict is not None:
+            self.on_evict(self)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        """Flush queued frames, then close."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await asyncio.wait_for(self.queue.join(), SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._writer.cancel()
+        await self._close(code, reason)
+
+    def stop(self):
+        """Socket is already gone (client disconnected): just stop the writer."""
+        self.closed = True
+        self._writer.cancel()
+
+    async def _close(self, code: int, reason: str):
+        try:
+            if self.websocket.application_state != WebSocketState.DISCONNECTED:
+                await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        while True:
+            frame = await self.queue.get()
+            try:
+                await asyncio.wait_for(send_frame(self.websocket, frame), SEND_TIMEOUT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.evict(CLOSE_SLOW_CONSUMER, "Send failed")
+                return
+            finally:
+                self.queue.task_done()
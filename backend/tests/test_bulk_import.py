@@ -0,0 +1,93 @@
+"""
+Bulk import (services/bulk_import.py) against a throwaway SQLite database.
+Run from backend/:  python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# database reads DATABASE_URL at import: point it at a fresh file first
+_tmp = tempfile.mkdtemp(prefix="neurosupport-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["CHAT_SHARDS"] = "0"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from database import SessionLocal, engine  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models import Appointment, Message  # noqa: E402
+from services.bulk_import import import_ndjson  # noqa: E402
+from services.chat_shards import open_chat_shards  # noqa: E402
+
+migrate(engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _lines(*records) -> list:
+    return [json.dumps(r) for r in records]
+
+
+def test_mixed_utc_offsets_are_stored_as_naive_utc(db):
+    lines = _lines(
+        {"type": "appointment", "id": "tz-apt", "user_name": "Ann", "created_at": "2024-05-01T12:00:00+02:00"},
+        {"type": "message", "id": "tz-1", "appointment_id": "tz-apt", "sender": "user",
+         "content": "hello", "timestamp": "2024-05-01T10:05:00"},
+        {"type": "message", "id": "tz-2", "appointment_id": "tz-apt", "sender": "therapist",
+         "content": "hi Ann", "timestamp": "2024-05-01T12:01:00+02:00"},
+        {"type": "message", "id": "tz-3", "appointment_id": "tz-apt", "sender": "user",
+         "content": "thanks", "timestamp": "2024-05-01T10:10:00Z"},
+    )
+    report = import_ndjson(db, lines, open_chat_shards(count=0))
+
+    assert report["rejected"] == 0, report["errors"]
+    assert report["appointments_inserted"] == 1
+    assert report["messages_inserted"] == 3
+    assert db.get(Appointment, "tz-apt").created_at == datetime(2024, 5, 1, 10, 0)
+    stored = db.query(Message.id, Message.seq, Message.timestamp).filter(
+        Message.appointment_id == "tz-apt"
+    ).order_by(Message.seq).all()
+    assert [(m.id, m.timestamp) for m in stored] == [
+        ("tz-2", datetime(2024, 5, 1, 10, 1)),
+        ("tz-1", datetime(2024, 5, 1, 10, 5)),
+        ("tz-3", datetime(2024, 5, 1, 10, 10)),
+    ]
+
+
+def test_failed_shard_write_only_rejects_its_messages(db, monkeypatch):
+    import services.bulk_import as bulk_import
+
+    lines = _lines(
+        {"type": "appointment", "id": "imp1", "user_name": "Ben"},
+        {"type": "message", "id": "imp1-1", "appointment_id": "imp1", "sender": "user",
+         "content": "first", "timestamp": "2024-05-01T10:00:00"},
+        {"type": "message", "id": "imp1-2", "appointment_id": "imp1", "sender": "user",
+         "content": "second", "timestamp": "2024-05-01T10:01:00"},
+    )
+    shards = open_chat_shards(count=0)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("shard unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(bulk_import, "_import_messages", fail)
+        report = import_ndjson(db, lines, shards)
+    assert report["appointments_inserted"] == 1
+    assert report["messages_inserted"] == 0
+    assert report["rejected"] == 2
+    assert "lines 2, 3 not imported" in report["errors"][0]["error"]
+    assert db.get(Appointment, "imp1") is not None
+
+    rerun = import_ndjson(db, lines, shards)
+    assert rerun["appointments_skipped"] == 1
+    assert rerun["messages_inserted"] == 2
+    assert rerun["rejected"] == 0
@@ -88,6 +88,13 @@ export default function UserAppointmentChatPage() {
       `ws://localhost:8000/ws/appointment-chat/${appointmentId}?role=user`
     )
 
+    // Heartbeat so the server does not close the socket as idle
+    const heartbeat = setInterval(() => {
+      if (websocket.readyState === WebSocket.OPEN) {
+        websocket.send(JSON.stringify({ type: 'ping' }))
+      }
+    }, 30000)
+
     websocket.onopen = () => {
       console.log('Connected to appointment chat as USER')
       setIsConnected(true)
@@ -95,6 +102,7 @@ export default function UserAppointmentChatPage() {
 
     websocket.onmessage = (event) => {
       const data = JSON.parse(event.data)
+      if (data.type === 'pong') return
       
       // Check for SESSION_ENDED event
       if (data.type === 'SESSION_ENDED') {
@@ -116,12 +124,14 @@ export default function UserAppointmentChatPage() {
 
     websocket.onclose = () => {
       console.log('Disconnected from appointment chat')
+      clearInterval(heartbeat)
       setIsConnected(false)
     }
 
     setWs(websocket)
 
     return () => {
+      clearInterval(heartbeat)
       websocket.close()
     }
   }, [appointmentId])
@@ -3,7 +3,7 @@
 import { useState, useEffect, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import Link from 'next/link'
-import { getAuthHeaders, isAuthenticated, isUser } from '../lib/auth'
+import { getAuthHeaders, getAuthToken, isAuthenticated, isUser } from '../lib/auth'
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
@@ -18,7 +18,10 @@ interface AIMessage {
 const getWsUrl = (sessionId: string) => {
   if (typeof window === 'undefined') return `ws://localhost:8000/ws/ai-chat/${sessionId}`
   const host = window.location.hostname
-  return `ws://${host}:8000/ws/ai-chat/${sessionId}`
+  // Signed-in users book appointments under their account rather than the typed name
+  const token = isAuthenticated() && isUser() ? getAuthToken() : null
+  const query = token ? `?token=${encodeURIComponent(token)}` : ''
+  return `ws://${host}:8000/ws/ai-chat/${sessionId}${query}`
 }
 
 export default function ChatbotPage() {
@@ -75,6 +78,13 @@ export default function ChatbotPage() {
     setConnectionStatus('connecting')
     setConnectionError(null)
 
+    // Heartbeat so the server does not close the socket as idle
+    const heartbeat = setInterval(() => {
+      if (websocket.readyState === WebSocket.OPEN) {
+        websocket.send(JSON.stringify({ type: 'ping' }))
+      }
+    }, 30000)
+
     websocket.onopen = () => {
       setConnectionStatus('connected')
       setConnectionError(null)
@@ -83,6 +93,7 @@ export default function ChatbotPage() {
     websocket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data)
+        if (data.type === 'pong') return
         if (data.type === 'APPOINTMENT_BOOKED') {
           setMessages(prev => [...prev, {
             type: 'ai_message',
@@ -110,6 +121,7 @@ export default function ChatbotPage() {
     }
 
     websocket.onclose = (event) => {
+      clearInterval(heartbeat)
       setWs(null)
       if (event.code !== 1000) {
         setConnectionStatus('error')
@@ -119,6 +131,7 @@ export default function ChatbotPage() {
 
     setWs(websocket)
     return () => {
+      clearInterval(heartbeat)
       websocket.close()
     }
   }, [nameSubmitted, sessionId])
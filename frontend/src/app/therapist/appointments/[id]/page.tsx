@@ -129,6 +129,13 @@ export default function TherapistAppointmentChatPage() {
       `ws://localhost:8000/ws/appointment-chat/${appointmentId}?role=therapist`
     )
 
+    // Heartbeat so the server does not close the socket as idle
+    const heartbeat = setInterval(() => {
+      if (websocket.readyState === WebSocket.OPEN) {
+        websocket.send(JSON.stringify({ type: 'ping' }))
+      }
+    }, 30000)
+
     websocket.onopen = () => {
       console.log('Connected to appointment chat as THERAPIST')
       setIsConnected(true)
@@ -136,6 +143,7 @@ export default function TherapistAppointmentChatPage() {
 
     websocket.onmessage = (event) => {
       const data = JSON.parse(event.data)
+      if (data.type === 'pong') return
       
       // Check for SESSION_ENDED event
       if (data.type === 'SESSION_ENDED') {
@@ -157,12 +165,14 @@ export default function TherapistAppointmentChatPage() {
 
     websocket.onclose = () => {
       console.log('Disconnected from appointment chat')
+      clearInterval(heartbeat)
       setIsConnected(false)
     }
 
     setWs(websocket)
 
     return () => {
+      clearInterval(heartbeat)
       websocket.close()
     }
   }, [appointmentId])
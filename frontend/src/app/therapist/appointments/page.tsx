@@ -1,6 +1,6 @@
 'use client'
 
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import Link from 'next/link'
 import NotificationBell from '../../components/NotificationBell'
@@ -15,10 +15,22 @@ interface Appointment {
   created_at: string
 }
 
+interface QueuePage {
+  items: Appointment[]
+  next_cursor: string | null
+  head_cursor: string | null
+}
+
+const QUEUE_URL = 'http://localhost:8000/appointments/queue'
+const PAGE_SIZE = 50
+
 export default function TherapistAppointmentsListPage() {
   const router = useRouter()
   const [appointments, setAppointments] = useState<Appointment[]>([])
   const [isLoading, setIsLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
+  const polling = useRef(true)
 
   useEffect(() => {
     // Check authentication
@@ -27,22 +39,34 @@ export default function TherapistAppointmentsListPage() {
       return
     }
 
+    polling.current = true
     fetchAppointments()
+    return () => {
+      polling.current = false
+    }
   }, [router])
 
+  const fetchQueue = async (params: Record<string, string>): Promise<QueuePage | null> => {
+    const query = new URLSearchParams({ limit: String(PAGE_SIZE), ...params })
+    const response = await fetch(`${QUEUE_URL}?${query}`, {
+      headers: getAuthHeaders(),
+    })
+
+    if (response.status === 401) {
+      router.push('/login')
+      return null
+    }
+
+    return response.json()
+  }
+
   const fetchAppointments = async () => {
     try {
-      const response = await fetch('http://localhost:8000/appointments/all', {
-        headers: getAuthHeaders(),
-      })
-      
-      if (response.status === 401) {
-        router.push('/login')
-        return
-      }
-      
-      const data = await response.json()
-      setAppointments(data)
+      const page = await fetchQueue({})
+      if (!page) return
+      setAppointments(page.items)
+      setNextCursor(page.next_cursor)
+      if (page.head_cursor) pollNewAppointments(page.head_cursor)
     } catch (error) {
       console.error('Error fetching appointments:', error)
     } finally {
@@ -50,6 +74,38 @@ export default function TherapistAppointmentsListPage() {
     }
   }
 
+  // Long-poll for appointments created after the newest one shown
+  const pollNewAppointments = async (headCursor: string) => {
+    while (polling.current) {
+      try {
+        const page = await fetchQueue({ newer_than: headCursor, wait: '25' })
+        if (!page) return
+        if (page.items.length > 0) {
+          setAppointments((current) => [...page.items, ...current])
+        }
+        headCursor = page.head_cursor || headCursor
+      } catch (error) {
+        console.error('Error polling appointments:', error)
+        await new Promise((resolve) => setTimeout(resolve, 5000))
+      }
+    }
+  }
+
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setIsLoadingMore(true)
+    try {
+      const page = await fetchQueue({ cursor: nextCursor })
+      if (!page) return
+      setAppointments((current) => [...current, ...page.items])
+      setNextCursor(page.next_cursor)
+    } catch (error) {
+      console.error('Error fetching appointments:', error)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const getStatusColor = (status: string) => {
     switch (status) {
       case 'scheduled':
@@ -134,6 +190,15 @@ export default function TherapistAppointmentsListPage() {
                 </div>
               </Link>
             ))}
+            {nextCursor && (
+              <button
+                onClick={loadMore}
+                disabled={isLoadingMore}
+                className="w-full py-3 text-teal-700 font-semibold hover:text-teal-900 disabled:text-gray-400"
+              >
+                {isLoadingMore ? 'Loading...' : 'Load older appointments'}
+              </button>
+            )}
           </div>
         )}
       </div>